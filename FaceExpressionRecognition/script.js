@@ -1,27 +1,142 @@
 const video = document.getElementById('video')
 
-// Array global para almacenar emociones
+const ML_SERVICE_URL = 'http://localhost:5000'
+// Cada cuánto se envían al servicio las emociones recolectadas durante la grabación
+const EMOTION_BATCH_INTERVAL_MS = 2000
+
+// Emociones recolectadas que aún no se enviaron al servicio
 window.emotionResults = [];
 window._collectingEmotions = false;
+window._emotionSessionId = null;
+
+// Reintentos al cerrar la sesión: intentos y espera inicial (se duplica en cada intento)
+const EMOTION_FINISH_ATTEMPTS = 6
+const EMOTION_RETRY_DELAY_MS = 500
+
+let emotionUploads = Promise.resolve();
+
+const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+
+// 429 (cola de gráficas llena), 5xx o sin respuesta: vale la pena reintentar
+function isRetryable(status) {
+  return status === 429 || status >= 500;
+}
+
+// Espera antes del siguiente intento: Retry-After si el servicio lo indica
+function retryDelay(response, attempt) {
+  const retryAfter = response ? Number(response.headers.get('Retry-After')) : NaN;
+  const backoff = EMOTION_RETRY_DELAY_MS * 2 ** attempt;
+  return Number.isFinite(retryAfter) && retryAfter > 0 ? Math.max(retryAfter * 1000, backoff) : backoff;
+}
+
+// Envía las emociones pendientes como un batch NDJSON (una medición por línea).
+// Los envíos se encadenan para que lleguen en orden. Devuelve el status HTTP
+// (0 sin respuesta), o 200 si no había nada que enviar.
+function flushEmotionBatch() {
+  const upload = emotionUploads.then(async () => {
+    const sessionId = window._emotionSessionId;
+    if (!sessionId || window.emotionResults.length === 0) return 200;
+
+    const batch = window.emotionResults;
+    window.emotionResults = [];
+    let response = null;
+    try {
+      response = await fetch(`${ML_SERVICE_URL}/emotion-sessions/${sessionId}/frames`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/x-ndjson' },
+        body: batch.map(frame => JSON.stringify(frame)).join('\n')
+      });
+      if (!response.ok) throw new Error(`HTTP ${response.status}`);
+      return response.status;
+    } catch (e) {
+      // Se reintenta con el siguiente batch
+      window.emotionResults = batch.concat(window.emotionResults);
+      console.error('Error enviando emociones:', e);
+      return response ? response.status : 0;
+    }
+  });
+  emotionUploads = upload;
+  return upload;
+}
+
+setInterval(() => {
+  if (window._collectingEmotions) flushEmotionBatch();
+}, EMOTION_BATCH_INTERVAL_MS)
+
+// Envía las emociones que faltan y cierra la sesión, reintentando con espera creciente.
+// La sesión solo se olvida cuando el envío y el cierre se confirmaron.
+async function finishEmotionSession() {
+  const sessionId = window._emotionSessionId;
+  let flushed = false;
+
+  for (let attempt = 0; attempt < EMOTION_FINISH_ATTEMPTS; attempt++) {
+    let response = null;
+    if (!flushed) {
+      const status = await flushEmotionBatch();
+      flushed = status >= 200 && status < 300;
+      if (!flushed && status !== 0 && !isRetryable(status)) break;
+    }
+
+    if (flushed) {
+      try {
+        response = await fetch(`${ML_SERVICE_URL}/emotion-sessions/${sessionId}/finish`, {
+          method: 'POST'
+        });
+        // 409: la sesión ya estaba cerrada (se perdió la respuesta de un intento anterior)
+        if (response.ok || response.status === 409) {
+          window._emotionSessionId = null;
+          return true;
+        }
+        if (!isRetryable(response.status)) break;
+        console.warn(`Cierre de la sesión de emociones pendiente (HTTP ${response.status}); reintentando`);
+      } catch (e) {
+        console.error('Error cerrando la sesión de emociones:', e);
+      }
+    }
+
+    await sleep(retryDelay(response, attempt));
+  }
+
+  // La sesión sigue abierta en el servicio: se reintenta al volver a grabar
+  console.error(`No se pudo cerrar la sesión de emociones ${sessionId}`);
+  return false;
+}
 
 // Iniciar la recolección de emociones
-window.startEmotionCollection = function() {
+window.startEmotionCollection = async function() {
+  // Una sesión anterior que no se pudo cerrar: enviar lo que quede antes de empezar otra
+  if (window._emotionSessionId) await finishEmotionSession();
+
   window.emotionResults = [];
   window._collectingEmotions = true;
+  window._emotionSessionId = null;
+  try {
+    const response = await fetch(`${ML_SERVICE_URL}/emotion-sessions`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ metadata: { source: 'FaceExpressionRecognition' } })
+    });
+    window._emotionSessionId = (await response.json()).session_id;
+  } catch (e) {
+    // Sin sesión las emociones se acumulan y se envían todas juntas al terminar
+    console.error('Error abriendo la sesión de emociones:', e);
+  }
 }
 // Detener y enviar emociones al backend
 window.stopEmotionCollectionAndSend = async function() {
   window._collectingEmotions = false;
-  if (window.emotionResults.length > 0) {
-    try {
-      await fetch('http://localhost:5000/save-emotions', {
+  try {
+    if (window._emotionSessionId) {
+      await finishEmotionSession();
+    } else if (window.emotionResults.length > 0) {
+      await fetch(`${ML_SERVICE_URL}/save-emotions`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ emotions: window.emotionResults })
       });
-    } catch (e) {
-      console.error('Error enviando emociones:', e);
     }
+  } catch (e) {
+    console.error('Error enviando emociones:', e);
   }
 }
 
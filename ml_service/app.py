@@ -1,11 +1,29 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, g, request, jsonify, send_file
 from flask_cors import CORS
-from nutrition_model import NutritionModel
+from nutrition_model import MODEL_TYPES, NutritionModel, model_type_label
+from model_bundle import BUNDLE_FILENAME
+from knn_index import KNN_INDEX_FILENAME
+from batcher import MicroBatcher
+from food_aggregation import default_aggregator
+from food_catalog import UnknownFoodError
+from plate_sessions import PlateSessionStore
+from emotion_graphs import EmotionGraphRenderer, RendererBusy, RendererUnavailable
+from emotion_store import EMOTION_KEYS, EmotionStore, UnknownSessionError, frames_to_array, parse_ndjson_frames
+from emotion_analytics import ANALYTICS_FILENAME, FRAME_RATE_HZ, GROUP_BY_OPTIONS, EmotionAnalytics
+from training_jobs import TrainingJobManager
+from metrics import CONTENT_TYPE, HTTP_REQUEST_SECONDS, HTTP_REQUESTS, REGISTRY, observe_stage, time_stage
+import argparse
+import logging
 import os
+import sqlite3
+import sys
 import threading
 import time
-import json
-import subprocess
+import numpy as np
+
+# Nivel de log del servicio (DEBUG muestra las trazas de cada predicción)
+logging.basicConfig(level=os.environ.get('ML_LOG_LEVEL', 'WARNING').upper(),
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
 
 app = Flask(__name__)
 
@@ -18,8 +36,163 @@ CORS(app, origins=['http://localhost:5173', 'http://127.0.0.1:5173'],
 # Instancia global del modelo
 nutrition_model = NutritionModel()
 
-# Variable para controlar el estado del entrenamiento
-training_status = {'status': 'not_started', 'progress': 0, 'message': ''}
+def predict_total_rows(rows, model_type):
+    """
+    Predice filas de totales (N, 6) ya validadas; los errores se propagan al micro-batcher,
+    que reintenta los platos uno a uno
+    """
+    with time_stage('featurize', model_type):
+        features = nutrition_model.totals_to_features(np.asarray(rows, dtype=np.float64))
+    return nutrition_model.predict_features(features, model_type)
+
+# Agrupa las peticiones /predict concurrentes en un solo forward pass
+# (ML_BATCH_WINDOW_MS=0 lo desactiva)
+prediction_batcher = MicroBatcher(
+    predict_total_rows,
+    window_ms=float(os.environ.get('ML_BATCH_WINDOW_MS', 2)),
+    max_batch=int(os.environ.get('ML_BATCH_MAX_ITEMS', 64))
+)
+
+_model_lock = threading.Lock()
+_last_bundle_check = 0.0
+
+def publish_model(new_model):
+    """
+    Intercambia de forma atómica el modelo que sirve las predicciones
+    
+    Las peticiones en curso terminan con la instancia anterior; las nuevas usan new_model.
+    """
+    global nutrition_model
+    nutrition_model = new_model
+    print(f"✅ Modelo publicado (versión {new_model.model_version})")
+
+# Los entrenamientos corren en un proceso aparte y publican el modelo al terminar
+training_jobs = TrainingJobManager(
+    model_factory=NutritionModel,
+    on_model_ready=publish_model,
+    model_path=nutrition_model.model_path
+)
+
+# Platos en construcción para la puntuación incremental (añadir/quitar un alimento)
+plate_sessions = PlateSessionStore(
+    model_getter=lambda: nutrition_model,
+    ttl=float(os.environ.get('ML_PLATE_TTL_SECONDS', 1800)),
+    max_sessions=int(os.environ.get('ML_PLATE_MAX_SESSIONS', 10000))
+)
+
+# Gráficas de emociones: pool de procesos persistente con un límite de trabajos pendientes
+emotion_graphs = EmotionGraphRenderer(
+    workers=int(os.environ.get('ML_EMOTION_GRAPH_WORKERS', 1)),
+    max_pending=int(os.environ.get('ML_EMOTION_GRAPH_MAX_PENDING', 16)),
+    max_points=int(os.environ.get('ML_EMOTION_GRAPH_MAX_POINTS', 1000)),
+    method=os.environ.get('ML_EMOTION_GRAPH_DOWNSAMPLING', 'lttb')
+)
+
+# Sesiones de emociones en archivos float32 de solo anexado (ML_EMOTION_STORE cambia el directorio)
+emotion_store = EmotionStore()
+
+# Agregados por ventana de las sesiones, actualizados al ingerir (analytics.sqlite3 junto al almacén).
+# La base se abre en el primer uso, en cada proceso worker, no al importar app
+emotion_analytics = EmotionAnalytics(os.path.join(emotion_store.root, ANALYTICS_FILENAME))
+
+# Máximo de mediciones por batch NDJSON en /emotion-sessions/<id>/frames
+EMOTION_MAX_BATCH_FRAMES = int(os.environ.get('ML_EMOTION_MAX_BATCH_FRAMES', 10000))
+
+def ensure_model_available():
+    """
+    Carga el modelo si aún no está cargado; si no existe, lanza un entrenamiento en segundo plano
+    
+    Returns:
+        None si el modelo está listo, o una respuesta 503 con el trabajo de entrenamiento
+    """
+    if nutrition_model.neural_network is not None:
+        return None
+    
+    with _model_lock:
+        if nutrition_model.neural_network is None:
+            print("🔄 Modelos no encontrados, intentando cargarlos...")
+            new_model = NutritionModel()
+            if new_model.load_models():
+                publish_model(new_model)
+    
+    if nutrition_model.neural_network is not None:
+        return None
+    
+    if not training_jobs.is_training():
+        print("🔄 Iniciando entrenamiento automático en segundo plano...")
+        training_jobs.start()
+    
+    return jsonify({
+        'error': 'Los modelos no están entrenados; entrenamiento en curso',
+        'status': training_jobs.latest().to_dict()
+    }), 503
+
+def current_training_status():
+    """
+    Estado del último entrenamiento (o 'not_started' si no se ha entrenado en este proceso)
+    """
+    job = training_jobs.latest()
+    if job is None:
+        return {'status': 'not_started', 'progress': 0, 'message': ''}
+    
+    return job.to_dict()
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """
+    Cuenta la petición y su latencia por endpoint y model_type
+    """
+    # La regla de la ruta (no la URL) mantiene acotado el número de series
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    model_type = g.get('model_type', '')
+    HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method,
+                      status=response.status_code, model_type=model_type)
+    if 'request_start' in g:
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - g.request_start,
+                                     endpoint=endpoint, model_type=model_type)
+    return response
+
+def parse_json_body():
+    """
+    Lee el cuerpo JSON de la petición y devuelve (datos, segundos que tardó el parseo)
+    """
+    started = time.perf_counter()
+    data = request.get_json(silent=True)
+    return data, time.perf_counter() - started
+
+def timed_jsonify(model_type, payload):
+    with time_stage('serialize', model_type):
+        return jsonify(payload)
+
+@app.before_request
+def refresh_model_if_stale():
+    """
+    Recarga el modelo si otro proceso (p. ej. otro worker de serve.py) publicó un paquete nuevo
+    """
+    global _last_bundle_check
+    
+    now = time.time()
+    if now - _last_bundle_check < 1.0 or nutrition_model.bundle_mtime is None:
+        return
+    _last_bundle_check = now
+    
+    bundle_path = os.path.join(nutrition_model.model_path, BUNDLE_FILENAME)
+    try:
+        if os.path.getmtime(bundle_path) == nutrition_model.bundle_mtime:
+            return
+    except OSError:
+        return
+    
+    with _model_lock:
+        if os.path.getmtime(bundle_path) == nutrition_model.bundle_mtime:
+            return  # Otro hilo ya lo recargó
+        new_model = NutritionModel()
+        if new_model.load_models():
+            publish_model(new_model)
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -35,72 +208,65 @@ def health_check():
 @app.route('/train', methods=['POST'])
 def train_models():
     """
-    Endpoint para entrenar los modelos de ML
+    Endpoint para entrenar los modelos de ML en un proceso en segundo plano
     """
-    global training_status
+    data = request.get_json(silent=True) or {}
+    
+    # chunksize opcional: entrenar leyendo el dataset por bloques (datasets que no caben en memoria)
+    chunksize = data.get('chunksize')
+    if chunksize is not None and (isinstance(chunksize, bool) or not isinstance(chunksize, int) or chunksize <= 0):
+        return jsonify({'error': '"chunksize" debe ser un entero positivo'}), 400
     
-    if training_status['status'] == 'training':
+    try:
+        job = training_jobs.start(chunksize=chunksize)
+    except RuntimeError as e:
         return jsonify({
-            'error': 'El entrenamiento ya está en progreso',
-            'status': training_status
+            'error': str(e),
+            'status': training_jobs.latest().to_dict()
         }), 400
     
-    # Iniciar entrenamiento en hilo separado
-    def train_thread():
-        global training_status
-        training_status = {'status': 'training', 'progress': 0, 'message': 'Iniciando entrenamiento...'}
-        
-        try:
-            training_status['message'] = 'Cargando datos...'
-            training_status['progress'] = 10
-            
-            # Entrenar modelos
-            training_status['message'] = 'Entrenando modelos...'
-            training_status['progress'] = 30
-            
-            success = nutrition_model.train_all_models()
-            
-            if success:
-                training_status['message'] = 'Cargando modelos entrenados...'
-                training_status['progress'] = 80
-                
-                # Cargar modelos después del entrenamiento
-                nutrition_model.load_models()
-                
-                training_status = {
-                    'status': 'completed',
-                    'progress': 100,
-                    'message': 'Entrenamiento completado exitosamente'
-                }
-            else:
-                training_status = {
-                    'status': 'failed',
-                    'progress': 0,
-                    'message': 'Error durante el entrenamiento'
-                }
-                
-        except Exception as e:
-            training_status = {
-                'status': 'failed',
-                'progress': 0,
-                'message': f'Error: {str(e)}'
-            }
-    
-    # Iniciar hilo de entrenamiento
-    thread = threading.Thread(target=train_thread)
-    thread.start()
-    
     return jsonify({
         'message': 'Entrenamiento iniciado',
-        'status': training_status
+        'job_id': job.id,
+        'status': job.to_dict()
     })
 
 @app.route('/training-status', methods=['GET'])
 def get_training_status():
     """
-    Endpoint para obtener el estado del entrenamiento
+    Endpoint para obtener el estado del último entrenamiento
+    """
+    return jsonify(current_training_status())
+
+@app.route('/training-jobs/<job_id>', methods=['GET'])
+def get_training_job(job_id):
+    """
+    Endpoint para obtener el estado de un trabajo de entrenamiento
+    """
+    job = training_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Trabajo de entrenamiento no encontrado'}), 404
+    
+    return jsonify(job.to_dict())
+
+@app.route('/training-jobs/<job_id>/cancel', methods=['POST'])
+def cancel_training_job(job_id):
+    """
+    Endpoint para cancelar un trabajo de entrenamiento en curso
     """
-    return jsonify(training_status)
+    if not training_jobs.cancel(job_id):
+        return jsonify({'error': 'El trabajo no existe o ya terminó'}), 400
+    
+    return jsonify({
+        'message': 'Cancelación solicitada',
+        'status': training_jobs.get(job_id).to_dict()
+    })
+
+def invalid_model_type(model_type):
+    return jsonify({
+        'error': f'model_type no válido: {model_type!r}',
+        'model_types': list(MODEL_TYPES)
+    }), 400
 
 @app.route('/predict', methods=['POST'])
 def predict_dish():
@@ -108,48 +274,65 @@ def predict_dish():
     Endpoint para predecir la clasificación nutricional de un plato
     """
     try:
-        data = request.json
+        data, parse_seconds = parse_json_body()
         
         if not data:
             return jsonify({'error': 'No se proporcionaron datos'}), 400
         
-        # Verificar si los modelos están cargados
-        if nutrition_model.neural_network is None:
-            print("🔄 Modelos no encontrados, iniciando entrenamiento automático...")
-            if not nutrition_model.load_models():
-                # Si load_models retorna False, necesitamos entrenar
-                print("🔄 Entrenando modelos automáticamente...")
-                try:
-                    success = nutrition_model.train_all_models()
-                    if not success:
-                        return jsonify({
-                            'error': 'Error al entrenar los modelos automáticamente'
-                        }), 500
-                    print("✅ Modelos entrenados exitosamente")
-                except Exception as e:
-                    return jsonify({
-                        'error': f'Error durante el entrenamiento automático: {str(e)}'
-                    }), 500
+        # Verificar si los modelos están cargados (si no, se entrenan en segundo plano)
+        unavailable = ensure_model_available()
+        if unavailable is not None:
+            return unavailable
         
         # Obtener tipo de modelo (por defecto neural)
         model_type = data.get('model_type', 'neural')
+        g.model_type = model_type_label(model_type)
+        observe_stage('parse', g.model_type, parse_seconds)
+        if model_type not in MODEL_TYPES:
+            return invalid_model_type(model_type)
         
         if 'nutrition' in data:
             # Predicción basada en datos nutricionales directos
             nutrition_data = data['nutrition']
-            prediction = nutrition_model.predict_dish_health(nutrition_data, model_type)
             
-        elif 'foods' in data:
-            # Predicción basada en lista de alimentos
-            foods = data['foods']
-            prediction = nutrition_model.predict_from_food_list(foods, model_type)
+        elif 'foods' in data or 'food_ids' in data:
+            # Predicción basada en lista de alimentos, o en ids del catálogo (lista o id -> cantidad)
+            try:
+                with time_stage('aggregate', model_type):
+                    nutrition_data = nutrition_model.calculate_total_nutrition(data.get('food_ids', data.get('foods')))
+            except UnknownFoodError as e:
+                return jsonify({'error': str(e), 'unknown_food_ids': e.food_ids}), 400
+            except (TypeError, ValueError) as e:
+                # Cantidades o valores nutricionales no numéricos
+                return jsonify({'error': f'Alimentos inválidos: {str(e)}'}), 400
             
         else:
             return jsonify({
-                'error': 'Debe proporcionar "nutrition" o "foods" en la petición'
+                'error': 'Debe proporcionar "nutrition", "foods" o "food_ids" en la petición'
             }), 400
         
-        return jsonify({
+        # Validar el plato en esta petición, antes de que se agrupe con las de otros clientes
+        if not isinstance(nutrition_data, dict):
+            return jsonify({'error': '"nutrition" debe ser un objeto'}), 400
+        try:
+            with time_stage('aggregate', model_type):
+                totals = default_aggregator.to_matrix([nutrition_data])[0]
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': f'Datos nutricionales inválidos: {str(e)}'}), 400
+        
+        try:
+            prediction = prediction_batcher.predict(totals, model_type)
+        except Exception as e:
+            # Misma respuesta que predict_dish_health: 200 con la clasificación 'Error'
+            print(f"❌ Error en predicción: {e}")
+            prediction = {
+                'classification': 'Error',
+                'confidence': 0.0,
+                'model_used': model_type,
+                'error': str(e)
+            }
+
+        return timed_jsonify(model_type, {
             'prediction': prediction,
             'timestamp': time.time()
         })
@@ -165,62 +348,83 @@ def predict_batch():
     Endpoint para predecir múltiples platos
     """
     try:
-        data = request.json
+        data, parse_seconds = parse_json_body()
         
         if not data or 'dishes' not in data:
             return jsonify({'error': 'Debe proporcionar una lista de "dishes"'}), 400
         
-        # Verificar si los modelos están cargados
-        if nutrition_model.neural_network is None:
-            print("🔄 Modelos no encontrados, iniciando entrenamiento automático...")
-            if not nutrition_model.load_models():
-                # Si load_models retorna False, necesitamos entrenar
-                print("🔄 Entrenando modelos automáticamente...")
-                try:
-                    success = nutrition_model.train_all_models()
-                    if not success:
-                        return jsonify({
-                            'error': 'Error al entrenar los modelos automáticamente'
-                        }), 500
-                    print("✅ Modelos entrenados exitosamente")
-                except Exception as e:
-                    return jsonify({
-                        'error': f'Error durante el entrenamiento automático: {str(e)}'
-                    }), 500
+        # Verificar si los modelos están cargados (si no, se entrenan en segundo plano)
+        unavailable = ensure_model_available()
+        if unavailable is not None:
+            return unavailable
         
         dishes = data['dishes']
         model_type = data.get('model_type', 'neural')
-        predictions = []
+        g.model_type = model_type_label(model_type)
+        observe_stage('parse', g.model_type, parse_seconds)
+        if model_type not in MODEL_TYPES:
+            return invalid_model_type(model_type)
+        predictions = [None] * len(dishes)
+        
+        def format_error(i, message):
+            predictions[i] = {
+                'dish_index': i,
+                'prediction': {
+                    'classification': 'Error',
+                    'confidence': 0.0,
+                    'error': message
+                }
+            }
         
+        # Separar los platos con totales ya calculados de los que traen su lista de alimentos
+        nutrition_indices, nutrition_rows = [], []
+        plate_indices, plates = [], []
         for i, dish in enumerate(dishes):
+            if isinstance(dish, dict) and isinstance(dish.get('nutrition'), dict):
+                nutrition_indices.append(i)
+                nutrition_rows.append(dish['nutrition'])
+            elif isinstance(dish, dict) and isinstance(dish.get('foods'), list):
+                plate_indices.append(i)
+                plates.append(dish['foods'])
+            elif isinstance(dish, dict) and isinstance(dish.get('food_ids'), (list, dict)):
+                plate_indices.append(i)
+                plates.append(dish['food_ids'])
+            else:
+                format_error(i, 'Formato de datos inválido')
+        
+        # Matriz de totales (n_platos, 6) con una sola agregación vectorizada para todos los platos
+        # (los platos con ids se resuelven como cantidades @ tabla del catálogo)
+        with time_stage('aggregate', model_type):
             try:
-                if 'nutrition' in dish:
-                    prediction = nutrition_model.predict_dish_health(dish['nutrition'], model_type)
-                elif 'foods' in dish:
-                    prediction = nutrition_model.predict_from_food_list(dish['foods'], model_type)
-                else:
-                    prediction = {
-                        'classification': 'Error',
-                        'confidence': 0.0,
-                        'error': 'Formato de datos inválido'
-                    }
-                
-                predictions.append({
-                    'dish_index': i,
-                    'prediction': prediction
-                })
-                
-            except Exception as e:
-                predictions.append({
-                    'dish_index': i,
-                    'prediction': {
-                        'classification': 'Error',
-                        'confidence': 0.0,
-                        'error': str(e)
-                    }
-                })
+                batch_indices = nutrition_indices + plate_indices
+                totals = np.vstack([
+                    default_aggregator.to_matrix(nutrition_rows),
+                    nutrition_model.plate_totals(plates)
+                ])
+            except (TypeError, ValueError, UnknownFoodError):
+                # Algún plato trae valores no numéricos: agregarlos uno a uno para aislar el error
+                batch_indices, rows = [], []
+                pending = ([(i, row, False) for i, row in zip(nutrition_indices, nutrition_rows)] +
+                           [(i, plate, True) for i, plate in zip(plate_indices, plates)])
+                for i, dish, is_plate in pending:
+                    try:
+                        if is_plate:
+                            rows.append(nutrition_model.plate_totals([dish])[0])
+                        else:
+                            rows.append(default_aggregator.to_matrix([dish])[0])
+                        batch_indices.append(i)
+                    except (TypeError, ValueError, UnknownFoodError) as e:
+                        format_error(i, str(e))
+                totals = np.array(rows, dtype=np.float64).reshape(-1, 6)
         
-        return jsonify({
+        batch_predictions = nutrition_model.predict_totals(totals, model_type)
+        for i, prediction in zip(batch_indices, batch_predictions):
+            predictions[i] = {
+                'dish_index': i,
+                'prediction': prediction
+            }
+        
+        return timed_jsonify(model_type, {
             'predictions': predictions,
             'timestamp': time.time()
         })
@@ -230,6 +434,112 @@ def predict_batch():
             'error': f'Error en la predicción batch: {str(e)}'
         }), 500
 
+def plate_not_found(plate_id):
+    return jsonify({'error': f'Plato {plate_id} no encontrado o caducado'}), 404
+
+@app.route('/plates', methods=['POST'])
+def create_plate():
+    """
+    Crea un plato vacío para ir añadiendo y quitando alimentos de a uno
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        
+        unavailable = ensure_model_available()
+        if unavailable is not None:
+            return unavailable
+        
+        # Alimentos iniciales opcionales: lista de ids o id -> cantidad
+        food_ids = data.get('food_ids') or {}
+        if not isinstance(food_ids, (list, dict)):
+            return jsonify({'error': '"food_ids" debe ser una lista de ids o un mapa id -> cantidad'}), 400
+        
+        try:
+            session = plate_sessions.create(data.get('model_type', 'neural'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        g.model_type = model_type_label(session.model_type)
+        items = food_ids.items() if isinstance(food_ids, dict) else ((food_id, 1) for food_id in food_ids)
+        try:
+            for food_id, quantity in items:
+                plate_sessions.update(session, food_id=food_id, delta=quantity, score=False)
+            plate_sessions.rescore(session)
+        except (UnknownFoodError, ValueError, TypeError) as e:
+            plate_sessions.delete(session.id)
+            response = {'error': str(e)}
+            if isinstance(e, UnknownFoodError):
+                response['unknown_food_ids'] = e.food_ids
+            return jsonify(response), 400
+        except Exception:
+            plate_sessions.delete(session.id)
+            raise
+        
+        return jsonify(session.to_dict(plate_sessions.ttl)), 201
+        
+    except Exception as e:
+        return jsonify({
+            'error': f'Error creando el plato: {str(e)}'
+        }), 500
+
+@app.route('/plates/<plate_id>/foods', methods=['POST'])
+def update_plate(plate_id):
+    """
+    Añade (delta > 0) o quita (delta < 0) un alimento y devuelve la nueva clasificación
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        
+        session = plate_sessions.get(plate_id)
+        if session is None:
+            return plate_not_found(plate_id)
+        
+        unavailable = ensure_model_available()
+        if unavailable is not None:
+            return unavailable
+        
+        delta = data.get('delta', 1)
+        if isinstance(delta, bool) or not isinstance(delta, (int, float)):
+            return jsonify({'error': '"delta" debe ser un número'}), 400
+        
+        plate_sessions.update(session,
+                              food_id=data.get('food_id'),
+                              food=data.get('food'),
+                              delta=delta,
+                              model_type=data.get('model_type'))
+        g.model_type = model_type_label(session.model_type)
+        
+        return jsonify(session.to_dict(plate_sessions.ttl))
+        
+    except UnknownFoodError as e:
+        return jsonify({'error': str(e), 'unknown_food_ids': e.food_ids}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({
+            'error': f'Error actualizando el plato: {str(e)}'
+        }), 500
+
+@app.route('/plates/<plate_id>', methods=['GET'])
+def get_plate(plate_id):
+    """
+    Devuelve los totales y la última clasificación de un plato
+    """
+    session = plate_sessions.get(plate_id)
+    if session is None:
+        return plate_not_found(plate_id)
+    
+    return jsonify(session.to_dict(plate_sessions.ttl))
+
+@app.route('/plates/<plate_id>', methods=['DELETE'])
+def delete_plate(plate_id):
+    """
+    Descarta un plato
+    """
+    if not plate_sessions.delete(plate_id):
+        return plate_not_found(plate_id)
+    
+    return jsonify({'plate_id': plate_id, 'deleted': True})
+
 @app.route('/model-info', methods=['GET'])
 def get_model_info():
     """
@@ -240,7 +550,11 @@ def get_model_info():
         models_loaded = {
             'neural_network': nutrition_model.neural_network is not None,
             'knn_model': nutrition_model.knn_model is not None,
+            'knn_index': nutrition_model.knn_index is not None,
+            'neural_int8': 'int8' in nutrition_model.quantized_networks,
+            'neural_fp16': 'fp16' in nutrition_model.quantized_networks,
             'svm_model': nutrition_model.svm_model is not None,
+            'svm_probabilities': bool(getattr(nutrition_model.svm_model, 'probability', False)),
             'label_encoder': nutrition_model.label_encoder is not None,
             'scaler': nutrition_model.scaler is not None
         }
@@ -256,9 +570,9 @@ def get_model_info():
             model_files = {
                 'neural_network.h5': os.path.exists(os.path.join(nutrition_model.model_path, 'neural_network.h5')),
                 'knn_model.pkl': os.path.exists(os.path.join(nutrition_model.model_path, 'knn_model.pkl')),
+                KNN_INDEX_FILENAME: os.path.exists(os.path.join(nutrition_model.model_path, KNN_INDEX_FILENAME)),
                 'svm_model.pkl': os.path.exists(os.path.join(nutrition_model.model_path, 'svm_model.pkl')),
-                'label_encoder.pkl': os.path.exists(os.path.join(nutrition_model.model_path, 'label_encoder.pkl')),
-                'scaler.pkl': os.path.exists(os.path.join(nutrition_model.model_path, 'scaler.pkl'))
+                BUNDLE_FILENAME: os.path.exists(os.path.join(nutrition_model.model_path, BUNDLE_FILENAME))
             }
         
         return jsonify({
@@ -266,7 +580,13 @@ def get_model_info():
             'model_files': model_files,
             'available_classes': available_classes,
             'model_path': nutrition_model.model_path,
-            'training_status': training_status
+            'model_version': nutrition_model.model_version,
+            'ensemble_weights': nutrition_model.ensemble_weights,
+            'prediction_cache': nutrition_model.prediction_cache.stats(),
+            'override_rules': nutrition_model.override_rules.stats(),
+            'micro_batching': prediction_batcher.stats(),
+            'plate_sessions': plate_sessions.stats(),
+            'training_status': current_training_status()
         })
         
     except Exception as e:
@@ -274,15 +594,24 @@ def get_model_info():
             'error': f'Error obteniendo información del modelo: {str(e)}'
         }), 500
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Endpoint con las métricas del servicio en formato de texto de Prometheus
+    """
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
 @app.route('/load-models', methods=['POST'])
 def load_models():
     """
     Endpoint para cargar modelos entrenados
     """
     try:
-        success = nutrition_model.load_models()
+        new_model = NutritionModel()
+        success = new_model.load_models()
         
         if success:
+            publish_model(new_model)
             return jsonify({
                 'message': 'Modelos cargados exitosamente',
                 'models_loaded': True
@@ -298,10 +627,52 @@ def load_models():
             'error': f'Error cargando modelos: {str(e)}'
         }), 500
 
+def parse_session_metadata(data, source):
+    """
+    metadata opcional de una sesión de emociones (tags: lista de etiquetas para /emotion-analytics)
+    
+    Returns:
+        tupla (metadata, None) o (None, respuesta 400)
+    """
+    metadata = data.get('metadata') or {}
+    if not isinstance(metadata, dict):
+        return None, (jsonify({'error': '"metadata" debe ser un objeto'}), 400)
+    
+    tags = metadata.get('tags', [])
+    if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+        return None, (jsonify({'error': '"metadata.tags" debe ser una lista de textos'}), 400)
+    
+    return {'source': source, **metadata}, None
+
+def update_emotion_analytics(session_id, update):
+    """
+    Aplica una actualización de los agregados sin hacer fallar la ingesta
+    
+    Las mediciones ya están guardadas: si SQLite falla, los agregados se reconstruyen
+    después con `python emotion_analytics.py --rebuild`.
+    """
+    try:
+        update()
+    except sqlite3.Error as e:
+        print(f"⚠️ No se pudieron actualizar los agregados de la sesión {session_id}: {e}")
+
+def register_emotion_session(session_id, metadata):
+    created_at = emotion_store.session_info(session_id).get('created_at')
+    update_emotion_analytics(session_id, lambda: emotion_analytics.register_session(session_id, metadata, created_at))
+
+def append_emotion_values(session_id, values):
+    start = emotion_store.append(session_id, values)
+    update_emotion_analytics(session_id, lambda: emotion_analytics.ingest(session_id, start, values))
+
+def renderer_busy(message):
+    response = jsonify({'error': message})
+    response.headers['Retry-After'] = '1'
+    return response, 429
+
 @app.route('/save-emotions', methods=['POST', 'OPTIONS'])
 def save_emotions():
     """
-    Recibe un array de emociones, lo guarda como JSON y genera una gráfica en emotion_results
+    Recibe un array de emociones, lo guarda como una sesión del almacén y encola su gráfica
     """
     # Manejar peticiones OPTIONS (preflight)
     if request.method == 'OPTIONS':
@@ -312,59 +683,201 @@ def save_emotions():
         return response
     
     try:
-        print("=== RECIBIENDO PETICIÓN DE EMOCIONES ===")
-        data = request.get_json()
-        print(f"Datos recibidos: {data}")
+        data = request.get_json(silent=True) or {}
         
         emotions = data.get('emotions')
         if not emotions or not isinstance(emotions, list):
             print("❌ Error: No se recibieron emociones válidas")
             return jsonify({'error': 'No se recibieron emociones válidas'}), 400
-
-        print(f"✅ {len(emotions)} emociones recibidas correctamente")
-
-        # Crear carpeta de resultados si no existe
-        results_dir = os.path.join(os.path.dirname(__file__), '../FaceExpressionRecognition/emotion_results')
-        os.makedirs(results_dir, exist_ok=True)
-        print(f"📁 Directorio de resultados: {results_dir}")
-
-        # Guardar JSON con timestamp
-        import datetime
-        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-        json_path = os.path.join(results_dir, f'emotions_{timestamp}.json')
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(emotions, f, ensure_ascii=False)
-        print(f"✅ JSON guardado en: {json_path}")
-
-        # Llamar al script de graficado
-        output_path = os.path.join(results_dir, f'graph_{timestamp}.png')
-        print(f"📊 Generando gráfica en: {output_path}")
         
         try:
-            subprocess.run([
-                'python',
-                os.path.join(os.path.dirname(__file__), '../FaceExpressionRecognition/draw_expressions.py'),
-                json_path,
-                output_path
-            ], check=True)
-            print("✅ Gráfica generada exitosamente")
-        except subprocess.CalledProcessError as e:
-            print(f"❌ Error generando gráfica: {e}")
-            # Continúa aunque falle la gráfica
-
+            values = frames_to_array(emotions)
+        except ValueError as e:
+            return jsonify({'error': f'Emociones inválidas: {e}'}), 400
+        
+        metadata, error = parse_session_metadata(data, 'save-emotions')
+        if error is not None:
+            return error
+        
+        print(f"✅ {len(emotions)} emociones recibidas correctamente")
+        
+        # Sesión nueva (uuid: dos sesiones en el mismo segundo ya no se pisan); las emociones
+        # se guardan siempre, aunque la cola de gráficas esté llena
+        session_id = emotion_store.create_session(metadata)
+        register_emotion_session(session_id, metadata)
+        append_emotion_values(session_id, values)
+        
         result = {
-            'message': 'Emociones y gráfica guardadas',
-            'json': json_path,
-            'graph': output_path,
+            'message': 'Emociones guardadas; gráfica en cola',
+            'session_id': session_id,
+            'data': emotion_store.frames_path(session_id),
+            'graph': emotion_store.graph_path(session_id),
             'count': len(emotions),
-            'timestamp': timestamp
+            'timestamp': time.strftime('%Y%m%d_%H%M%S')
         }
-        print(f"✅ Proceso completado: {result}")
+        
+        # Encolar la gráfica (se genera desde la matriz ya parseada, sin esperar al PNG)
+        try:
+            job = emotion_graphs.submit(values, EMOTION_KEYS, result['graph'])
+        except (RendererBusy, RendererUnavailable) as e:
+            # Las emociones ya están guardadas: la sesión queda abierta y la gráfica se pide
+            # más tarde cerrándola con POST /emotion-sessions/<session_id>/finish
+            result.update({'message': 'Emociones guardadas; gráfica pendiente',
+                           'graph_job_id': None, 'graph_status': 'pending', 'graph_error': str(e),
+                           'finish_url': f'/emotion-sessions/{session_id}/finish'})
+            response = jsonify(result)
+            response.headers['Retry-After'] = '1'
+            return response, 202
+        
+        emotion_store.finish_session(session_id, graph_job_id=job.id)
+        update_emotion_analytics(session_id, lambda: emotion_analytics.finish_session(session_id))
+        result.update({'graph_job_id': job.id, 'graph_status': job.status})
         return jsonify(result)
     except Exception as e:
         print(f"❌ Error general: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/emotion-sessions', methods=['POST'])
+def create_emotion_session():
+    """
+    Abre una sesión de emociones para enviar sus mediciones por batches mientras se graba
+    """
+    data = request.get_json(silent=True) or {}
+    
+    metadata, error = parse_session_metadata(data, 'stream')
+    if error is not None:
+        return error
+    
+    session_id = emotion_store.create_session(metadata)
+    register_emotion_session(session_id, metadata)
+    return jsonify(emotion_store.session_info(session_id)), 201
+
+def open_emotion_session(session_id):
+    """
+    Datos de una sesión que aún acepta mediciones, o una respuesta de error (404/409)
+    """
+    try:
+        info = emotion_store.session_info(session_id)
+    except UnknownSessionError as e:
+        return None, (jsonify({'error': str(e)}), 404)
+    
+    if info.get('finished_at') is not None:
+        return None, (jsonify({'error': 'La sesión ya está cerrada'}), 409)
+    
+    return info, None
+
+@app.route('/emotion-sessions/<session_id>/frames', methods=['POST'])
+def append_emotion_frames(session_id):
+    """
+    Añade un batch de mediciones en NDJSON (un objeto de face-api por línea) a una sesión abierta
+    
+    El cuerpo se lee y valida línea a línea sin cargarlo entero; si alguna línea no es
+    válida no se añade ninguna medición del batch.
+    """
+    info, error = open_emotion_session(session_id)
+    if error is not None:
+        return error
+    
+    try:
+        values = parse_ndjson_frames(request.stream, EMOTION_MAX_BATCH_FRAMES)
+    except OverflowError as e:
+        return jsonify({'error': str(e)}), 413
+    except ValueError as e:
+        return jsonify({'error': f'Mediciones inválidas: {e}'}), 400
+    
+    append_emotion_values(session_id, values)
+    
+    return jsonify({
+        'session_id': session_id,
+        'appended': len(values),
+        'frames': emotion_store.frame_count(session_id)
+    })
+
+@app.route('/emotion-sessions/<session_id>/finish', methods=['POST'])
+def finish_emotion_session(session_id):
+    """
+    Cierra la sesión y encola su gráfica a partir de las mediciones ya guardadas
+    """
+    info, error = open_emotion_session(session_id)
+    if error is not None:
+        return error
+    
+    graph = {'graph': emotion_store.graph_path(session_id), 'graph_job_id': None, 'graph_status': 'skipped'}
+    if info['frames'] > 0:
+        try:
+            job = emotion_graphs.submit_file(emotion_store.frames_path(session_id), EMOTION_KEYS,
+                                             graph['graph'], info['frames'])
+        except RendererBusy as e:
+            return renderer_busy(str(e))  # La sesión sigue abierta: el cliente reintenta el cierre
+        except RendererUnavailable as e:
+            return jsonify({'error': str(e)}), 503
+        graph.update({'graph_job_id': job.id, 'graph_status': job.status})
+    
+    emotion_store.finish_session(session_id, graph_job_id=graph['graph_job_id'])
+    update_emotion_analytics(session_id, lambda: emotion_analytics.finish_session(session_id))
+    
+    info = emotion_store.session_info(session_id)
+    info.update(graph)
+    return jsonify(info)
+
+@app.route('/emotion-sessions/<session_id>', methods=['GET'])
+def get_emotion_session(session_id):
+    """
+    Endpoint con los datos de una sesión de emociones (?frames=true incluye las mediciones)
+    """
+    try:
+        info = emotion_store.session_info(session_id)
+        if request.args.get('frames', '').lower() in ('1', 'true'):
+            info['emotions'] = emotion_store.to_records(session_id)
+    except UnknownSessionError as e:
+        return jsonify({'error': str(e)}), 404
+    
+    return jsonify(info)
+
+@app.route('/emotion-analytics', methods=['GET'])
+def get_emotion_analytics():
+    """
+    Endpoint de consulta sobre los agregados precalculados de las sesiones de emociones
+    
+    Parámetros (query string): emotion (repetible), tag (repetible; sesiones con todas),
+    days o since/until (timestamps), session_id, group_by (session, day, tag, window), limit
+    """
+    try:
+        since = request.args.get('since', type=float)
+        days = request.args.get('days', type=float)
+        if days is not None:
+            since = max(since or 0.0, time.time() - days * 86400)
+        
+        results = emotion_analytics.query(
+            emotions=[emotion for value in request.args.getlist('emotion') for emotion in value.split(',') if emotion] or None,
+            tags=request.args.getlist('tag'),
+            since=since,
+            until=request.args.get('until', type=float),
+            session_id=request.args.get('session_id'),
+            group_by=request.args.get('group_by'),
+            limit=request.args.get('limit', default=1000, type=int)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e), 'group_by_options': list(GROUP_BY_OPTIONS)}), 400
+    except sqlite3.Error as e:
+        return jsonify({'error': f'Error consultando los agregados: {str(e)}'}), 500
+    
+    return jsonify({
+        'results': results,
+        'window_seconds': emotion_analytics.window_frames / FRAME_RATE_HZ
+    })
+
+@app.route('/emotion-jobs/<job_id>', methods=['GET'])
+def get_emotion_job(job_id):
+    """
+    Endpoint para consultar el estado de una gráfica de emociones encolada
+    """
+    job = emotion_graphs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Trabajo de gráfica no encontrado'}), 404
+    
+    return jsonify(job.to_dict())
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({
@@ -373,10 +886,23 @@ def not_found(error):
             '/health',
             '/train',
             '/training-status',
+            '/training-jobs/<job_id>',
+            '/training-jobs/<job_id>/cancel',
             '/predict',
             '/predict-batch',
+            '/plates',
+            '/plates/<plate_id>',
+            '/plates/<plate_id>/foods',
             '/model-info',
-            '/load-models'
+            '/metrics',
+            '/load-models',
+            '/save-emotions',
+            '/emotion-sessions',
+            '/emotion-sessions/<session_id>',
+            '/emotion-sessions/<session_id>/frames',
+            '/emotion-sessions/<session_id>/finish',
+            '/emotion-analytics',
+            '/emotion-jobs/<job_id>'
         ]
     }), 404
 
@@ -388,6 +914,16 @@ def internal_error(error):
     }), 500
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='ComidaVentura ML Service')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='Muestra el desglose del tiempo de importación y de carga del modelo, y termina')
+    args = parser.parse_args()
+    
+    if args.profile_startup:
+        from startup_profile import print_startup_profile
+        print_startup_profile(nutrition_model)
+        sys.exit(0)
+    
     print("🚀 Iniciando ComidaVentura ML Service...")
     print("📊 Intentando cargar modelos existentes...")
     
@@ -397,16 +933,9 @@ if __name__ == '__main__':
             print("✅ Modelos cargados exitosamente")
         else:
             print("⚠️  No se encontraron modelos entrenados")
-            print("� Iniciando entrenamiento automático...")
-            try:
-                success = nutrition_model.train_all_models()
-                if success:
-                    print("✅ Modelos entrenados automáticamente")
-                else:
-                    print("❌ Error en el entrenamiento automático")
-            except Exception as train_error:
-                print(f"❌ Error durante el entrenamiento: {train_error}")
-                print("�💡 Usa el endpoint /train para entrenar manualmente")
+            print("🔄 Iniciando entrenamiento automático en segundo plano...")
+            job = training_jobs.start()
+            print(f"💡 Consulta el progreso en /training-jobs/{job.id}")
     except Exception as e:
         print(f"⚠️  Error al cargar modelos: {e}")
         print("💡 Usa el endpoint /train para entrenar los modelos")
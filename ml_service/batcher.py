@@ -0,0 +1,148 @@
+"""
+Agrupación dinámica (micro-batching) de peticiones de predicción
+
+Las peticiones /predict de un solo plato que llegan a la vez desde varios
+clientes se acumulan durante una ventana corta (p. ej. 2 ms o 64 platos) y se
+evalúan con una única llamada batch al modelo; cada llamante recibe su propio
+resultado a través de un Future.
+
+Cada plato debe validarse (agregarse a su fila de totales) antes de encolarse,
+en el hilo de su petición: así un dato inválido solo falla en esa petición. Si
+aun así la llamada batch falla, los platos se reintentan uno a uno para que el
+error llegue solo al que lo provoca.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Coalescedor de predicciones con un hilo de fondo por proceso
+    """
+
+    def __init__(self, predict_fn, window_ms=2.0, max_batch=64):
+        """
+        Args:
+            predict_fn: función (items, model_type) -> lista de resultados
+            window_ms: tiempo máximo que espera el primer plato de un batch antes de evaluarse
+            max_batch: número de platos que dispara la evaluación sin esperar la ventana
+        """
+        self.predict_fn = predict_fn
+        self.window = window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+        self.retried_batches = 0
+
+    @property
+    def enabled(self):
+        return self.window > 0 and self.max_batch > 1
+
+    def _ensure_worker(self):
+        # Los hilos no sobreviven a un fork: cada proceso worker arranca el suyo
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+
+        with self._lock:
+            if self._pid != pid:
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._run, args=(self._queue,),
+                                                name='prediction-batcher', daemon=True)
+                self._thread.start()
+                self._pid = pid
+
+    def submit(self, item, model_type='neural'):
+        """
+        Encola un plato ya validado y devuelve un Future con su predicción
+        """
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, model_type, future))
+        return future
+
+    def predict(self, item, model_type='neural', timeout=None):
+        """
+        Encola un plato ya validado y espera su predicción
+        """
+        if not self.enabled:
+            return self.predict_fn([item], model_type)[0]
+
+        return self.submit(item, model_type).result(timeout=timeout)
+
+    def _collect(self, pending):
+        """
+        Espera el primer plato y acumula más hasta cerrar la ventana o llenar el batch
+        """
+        batch = [pending.get()]
+        deadline = time.perf_counter() + self.window
+
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self, pending):
+        while True:
+            batch = self._collect(pending)
+
+            by_model = {}
+            for item, model_type, future in batch:
+                by_model.setdefault(model_type, []).append((item, future))
+
+            for model_type, entries in by_model.items():
+                try:
+                    results = self.predict_fn([item for item, _ in entries], model_type)
+                except Exception as e:
+                    if len(entries) == 1:
+                        entries[0][1].set_exception(e)
+                    else:
+                        self._predict_one_by_one(entries, model_type)
+                    continue
+
+                for (_, future), result in zip(entries, results):
+                    future.set_result(result)
+
+                with self._lock:
+                    self.batches += 1
+                    self.items += len(entries)
+                    self.largest_batch = max(self.largest_batch, len(entries))
+
+    def _predict_one_by_one(self, entries, model_type):
+        # El batch falló: cada plato por separado, para que el error llegue solo a quien lo provoca
+        for item, future in entries:
+            try:
+                future.set_result(self.predict_fn([item], model_type)[0])
+            except Exception as e:
+                future.set_exception(e)
+
+        with self._lock:
+            self.retried_batches += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'window_ms': self.window * 1000.0,
+                'max_batch': self.max_batch,
+                'batches': self.batches,
+                'items': self.items,
+                'largest_batch': self.largest_batch,
+                'retried_batches': self.retried_batches,
+                'avg_batch_size': self.items / self.batches if self.batches else 0.0
+            }
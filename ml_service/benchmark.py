@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Benchmarks reproducibles de los caminos críticos del servicio ML
+
+Mide latencia p50/p99, throughput y memoria pico (RSS) de:
+  - predict_dish_health por backend (neural / neural_int8 / neural_fp16 / knn / svm / ensemble)
+  - predict_from_food_list con platos de 1 a 1000 alimentos
+  - /predict y /predict-batch a través del cliente de pruebas de Flask
+  - load_models en frío (intérprete nuevo por repetición)
+  - train_all_models con datasets sintéticos de 60 a 1M filas
+
+Los resultados se escriben en JSON para comparar ejecuciones:
+    python benchmark.py --output bench_actual.json
+    python benchmark.py --output bench_nuevo.json --compare bench_actual.json
+
+Los entrenamientos se ejecutan en un directorio temporal para no tocar los modelos reales.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+
+SERVICE_DIR = os.path.dirname(os.path.abspath(__file__))
+NUTRIENT_KEYS = ['Calorias', 'Proteinas', 'Carbohidratos', 'Grasas', 'Fibra', 'Azucar']
+NUTRIENT_MAX = np.array([900, 60, 120, 50, 15, 50], dtype=np.float64)
+DATASET_LABELS = ['Muy Saludable', 'Saludable', 'Moderadamente Saludable', 'Poco Saludable']
+
+
+def peak_rss_mb():
+    """
+    Memoria residente pico del proceso actual en MB (None si no está disponible)
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KB; macOS, bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def summarize(name, latencies, items_per_call=1, **params):
+    """
+    Resume una lista de latencias (segundos por llamada) en un registro de resultados
+    """
+    latencies = np.asarray(latencies, dtype=np.float64)
+    total = latencies.sum()
+    return {
+        'name': name,
+        'params': params,
+        'iterations': int(len(latencies)),
+        'p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'p99_ms': float(np.percentile(latencies, 99) * 1000),
+        'mean_ms': float(latencies.mean() * 1000),
+        'throughput_per_s': float(len(latencies) * items_per_call / total) if total > 0 else None,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def time_calls(fn, inputs, warmup=5):
+    """
+    Ejecuta fn sobre cada entrada y devuelve la latencia de cada llamada
+    """
+    for item in inputs[:warmup]:
+        fn(item)
+
+    latencies = []
+    for item in inputs:
+        start = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def random_nutrition(rng, n):
+    """
+    Genera n dicts de nutrición aleatorios (distintos, para no medir la caché)
+    """
+    values = rng.uniform(0, 1, size=(n, len(NUTRIENT_KEYS))) * NUTRIENT_MAX
+    return [dict(zip(NUTRIENT_KEYS, row.round(2).tolist())) for row in values]
+
+
+def synthetic_dataset(path, n_rows, seed=42):
+    """
+    Escribe un CSV sintético con el mismo esquema que comidaventura_dataset.csv
+    """
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    values = rng.uniform(0, 1, size=(n_rows, len(NUTRIENT_KEYS))) * NUTRIENT_MAX
+    calorias, proteinas, _, grasas, fibra, azucar = values.T
+
+    # Puntuación simple para obtener cuatro clases con algo de estructura
+    score = proteinas / 60 + fibra / 15 - grasas / 50 - azucar / 50 - calorias / 900
+    labels = np.digitize(score, np.quantile(score, [0.25, 0.5, 0.75]))
+    df = pd.DataFrame(values.round(2), columns=NUTRIENT_KEYS)
+    df.insert(0, 'ID_Plato', np.arange(1, n_rows + 1))
+    df['Clasificacion_Nutricional'] = np.array(DATASET_LABELS)[::-1][labels]
+    df.to_csv(path, index=False)
+
+
+def run_isolated(code, cwd):
+    """
+    Ejecuta código Python en un intérprete nuevo y devuelve el JSON que imprime en su última línea
+    """
+    env = dict(os.environ, PYTHONPATH=SERVICE_DIR + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    result = subprocess.run([sys.executable, '-c', code], cwd=cwd, env=env,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else 'error')
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+ISOLATED_PEAK_RSS = '''
+import resource, sys
+def _peak():
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return max(own, children) / scale
+'''
+
+
+def bench_backends(model, rng, iterations):
+    results = []
+    inputs = random_nutrition(rng, iterations)
+    for model_type in ('neural', 'neural_int8', 'neural_fp16', 'knn', 'svm', 'ensemble'):
+        probe = model.predict_dish_health(inputs[0], model_type)
+        if probe['classification'] == 'Error':
+            print(f"⚠️ Backend {model_type} no disponible: {probe.get('error')}")
+            continue
+        latencies = time_calls(lambda n: model.predict_dish_health(n, model_type), inputs)
+        results.append(summarize('predict_dish_health', latencies, model_type=model_type))
+    return results
+
+
+def bench_food_list(model, rng, iterations, plate_sizes):
+    results = []
+    for plate_size in plate_sizes:
+        plates = [random_nutrition(rng, plate_size) for _ in range(max(10, iterations // plate_size))]
+        latencies = time_calls(lambda foods: model.predict_from_food_list(foods), plates)
+        results.append(summarize('predict_from_food_list', latencies, plate_size=plate_size))
+    return results
+
+
+def bench_endpoints(rng, iterations, batch_sizes, concurrency):
+    import app as app_module
+
+    if not app_module.nutrition_model.load_models():
+        print("⚠️ No hay modelo entrenado; se omiten los benchmarks de endpoints")
+        return []
+
+    # Sin caché, para medir el camino completo de la petición
+    app_module.nutrition_model.prediction_cache.maxsize = 0
+    client = app_module.app.test_client()
+    batcher = app_module.prediction_batcher
+    results = []
+
+    # /predict secuencial sin micro-batching (latencia de una petición aislada)
+    window = batcher.window
+    batcher.window = 0
+    inputs = random_nutrition(rng, iterations)
+    latencies = time_calls(lambda n: client.post('/predict', json={'nutrition': n}), inputs)
+    results.append(summarize('/predict', latencies, micro_batching=False, concurrency=1))
+    batcher.window = window
+
+    # /predict concurrente con micro-batching
+    if batcher.enabled and concurrency > 1:
+        inputs = random_nutrition(rng, iterations)
+        latencies = [None] * len(inputs)
+
+        def worker(offset):
+            thread_client = app_module.app.test_client()
+            for i in range(offset, len(inputs), concurrency):
+                start = time.perf_counter()
+                thread_client.post('/predict', json={'nutrition': inputs[i]})
+                latencies[i] = time.perf_counter() - start
+
+        threads = [threading.Thread(target=worker, args=(t,)) for t in range(concurrency)]
+        batches_before = batcher.stats()['batches']
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        record = summarize('/predict', latencies, micro_batching=True, concurrency=concurrency)
+        record['forward_passes'] = batcher.stats()['batches'] - batches_before
+        results.append(record)
+
+    for batch_size in batch_sizes:
+        bodies = [{'dishes': [{'nutrition': n} for n in random_nutrition(rng, batch_size)]}
+                  for _ in range(max(5, iterations // batch_size))]
+        latencies = time_calls(lambda body: client.post('/predict-batch', json=body), bodies, warmup=1)
+        results.append(summarize('/predict-batch', latencies, items_per_call=batch_size, batch_size=batch_size))
+
+    return results
+
+
+def bench_cold_start(repeats):
+    code = ISOLATED_PEAK_RSS + '''
+import json, time
+start = time.perf_counter()
+from nutrition_model import NutritionModel
+imported = time.perf_counter()
+ok = NutritionModel().load_models()
+loaded = time.perf_counter()
+print(json.dumps({'ok': ok, 'import_s': imported - start, 'total_s': loaded - start, 'peak_rss_mb': _peak()}))
+'''
+    runs = [run_isolated(code, SERVICE_DIR) for _ in range(repeats)]
+    if not all(run['ok'] for run in runs):
+        print("⚠️ load_models falló en el arranque en frío")
+    record = summarize('load_models_cold_start', [run['total_s'] for run in runs])
+    record['import_p50_ms'] = float(np.median([run['import_s'] for run in runs]) * 1000)
+    record['peak_rss_mb'] = max(run['peak_rss_mb'] for run in runs)
+    return [record]
+
+
+def bench_training(train_sizes, parallel):
+    results = []
+    for n_rows in train_sizes:
+        with tempfile.TemporaryDirectory(prefix='comidaventura_bench_') as workdir:
+            csv_path = os.path.join(workdir, 'dataset.csv')
+            synthetic_dataset(csv_path, n_rows)
+            code = ISOLATED_PEAK_RSS + f'''
+import json, time
+from nutrition_model import NutritionModel
+model = NutritionModel(model_path='models/')
+start = time.perf_counter()
+ok = model.train_all_models({csv_path!r}, parallel={parallel!r})
+elapsed = time.perf_counter() - start
+print(json.dumps({{'ok': ok, 'elapsed_s': elapsed, 'stages': model.training_report, 'peak_rss_mb': _peak()}}))
+'''
+            print(f"🏋️ Entrenando con {n_rows} filas sintéticas...")
+            run = run_isolated(code, workdir)
+
+        record = summarize('train_all_models', [run['elapsed_s']], items_per_call=n_rows,
+                           rows=n_rows, parallel=parallel)
+        record['stage_times'] = run['stages']
+        record['peak_rss_mb'] = run['peak_rss_mb']
+        results.append(record)
+    return results
+
+
+def result_key(record):
+    return record['name'] + json.dumps(record['params'], sort_keys=True)
+
+
+def compare(results, baseline_path, threshold=0.10):
+    """
+    Imprime la variación de p50 frente a una ejecución anterior y marca regresiones
+    """
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {result_key(r): r for r in json.load(f)['results']}
+
+    regressions = 0
+    print(f"\n📊 Comparación con {baseline_path} (umbral {threshold:.0%}):")
+    for record in results:
+        previous = baseline.get(result_key(record))
+        if previous is None or not previous['p50_ms']:
+            continue
+        change = record['p50_ms'] / previous['p50_ms'] - 1
+        flag = '❌' if change > threshold else '✅'
+        regressions += change > threshold
+        print(f"{flag} {record['name']:<26}{json.dumps(record['params']):<45}"
+              f"{previous['p50_ms']:>10.3f} → {record['p50_ms']:>10.3f} ms ({change:+.1%})")
+    return regressions
+
+
+def parse_sizes(text):
+    return [int(float(size)) for size in text.split(',') if size]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks del servicio ML de ComidaVentura')
+    parser.add_argument('--output', default='bench_results.json', help='Archivo JSON de resultados')
+    parser.add_argument('--compare', help='JSON de una ejecución anterior para detectar regresiones')
+    parser.add_argument('--iterations', type=int, default=500, help='Llamadas por benchmark de latencia')
+    parser.add_argument('--plate-sizes', default='1,10,100,1000', help='Alimentos por plato')
+    parser.add_argument('--batch-sizes', default='1,100,1000,10000', help='Platos por petición /predict-batch')
+    parser.add_argument('--concurrency', type=int, default=16, help='Hilos para /predict concurrente')
+    parser.add_argument('--cold-starts', type=int, default=5, help='Repeticiones de arranque en frío')
+    parser.add_argument('--train-sizes', default='60,1000,10000',
+                        help='Filas de los datasets sintéticos (p. ej. 60,1e4,1e5,1e6)')
+    parser.add_argument('--sequential-training', action='store_true', help='Entrenar sin pool de procesos')
+    parser.add_argument('--skip', default='', help='Secciones a omitir: backends,food_list,endpoints,cold_start,training')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    os.chdir(SERVICE_DIR)
+    sys.path.insert(0, SERVICE_DIR)
+    skip = set(args.skip.split(','))
+    rng = np.random.default_rng(args.seed)
+    results = []
+
+    from nutrition_model import NutritionModel
+
+    # Sin caché, para medir el modelo y no los aciertos de caché
+    model = NutritionModel(cache_size=0)
+    model_loaded = model.load_models()
+    if not model_loaded:
+        print("⚠️ No hay modelo entrenado; se omiten los benchmarks de predicción")
+
+    if model_loaded and 'backends' not in skip:
+        results += bench_backends(model, rng, args.iterations)
+    if model_loaded and 'food_list' not in skip:
+        results += bench_food_list(model, rng, args.iterations, parse_sizes(args.plate_sizes))
+    if 'endpoints' not in skip:
+        results += bench_endpoints(rng, args.iterations, parse_sizes(args.batch_sizes), args.concurrency)
+    if 'cold_start' not in skip:
+        results += bench_cold_start(args.cold_starts)
+    if 'training' not in skip:
+        results += bench_training(parse_sizes(args.train_sizes), parallel=not args.sequential_training)
+
+    print(f"\n{'benchmark':<26}{'parámetros':<45}{'p50 ms':>10}{'p99 ms':>10}{'items/s':>12}{'RSS MB':>9}")
+    for record in results:
+        throughput = record['throughput_per_s'] or 0
+        rss = record['peak_rss_mb'] or 0
+        print(f"{record['name']:<26}{json.dumps(record['params']):<45}"
+              f"{record['p50_ms']:>10.3f}{record['p99_ms']:>10.3f}{throughput:>12.1f}{rss:>9.1f}")
+
+    report = {
+        'created_at': datetime.datetime.now().isoformat(),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'model_version': model.model_version,
+        'results': results
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n✅ Resultados guardados en {args.output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""
+Fixtures compartidas de las pruebas del servicio de ML
+
+Las pruebas no necesitan model.h5 ni el paquete de models/: la red neuronal se
+sustituye por un NumpyMLP con pesos aleatorios fijos, con la misma forma que la
+red real (9 características de entrada, 4 clases de salida).
+"""
+
+import numpy as np
+import pytest
+from nutrition_model import CLASS_LABELS, EXPECTED_FEATURE_COLS, NutritionModel
+from numpy_mlp import NumpyMLP
+
+
+def random_network(seed=0, hidden=16):
+    rng = np.random.default_rng(seed)
+    return NumpyMLP(
+        [rng.normal(size=(len(EXPECTED_FEATURE_COLS), hidden)), rng.normal(size=(hidden, len(CLASS_LABELS)))],
+        [rng.normal(size=hidden), rng.normal(size=len(CLASS_LABELS))],
+        ['relu', 'softmax']
+    )
+
+
+def make_model(tmp_path, cache_size=4096):
+    model = NutritionModel(model_path=str(tmp_path / 'models'), cache_size=cache_size)
+    model.neural_network = random_network()
+    return model
+
+
+@pytest.fixture
+def model(tmp_path):
+    return make_model(tmp_path)
+
+
+@pytest.fixture
+def uncached_model(tmp_path):
+    # Sin caché: cada predicción pasa de verdad por la red
+    return make_model(tmp_path, cache_size=0)
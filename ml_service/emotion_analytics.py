@@ -0,0 +1,330 @@
+"""
+Agregados precalculados de las sesiones de emociones
+
+Al ingerir mediciones (/save-emotions o los batches de /emotion-sessions) se
+actualizan en SQLite unos resúmenes por ventana de DEFAULT_WINDOW_FRAMES mediciones:
+suma y máximo de cada emoción y número de mediciones en las que cada emoción fue
+la dominante. De ahí salen la media, el máximo y la emoción dominante de cada
+ventana y el tiempo pasado en cada estado, combinables entre ventanas, sesiones
+y días sin volver a leer las mediciones.
+
+Las sesiones se etiquetan con metadata.tags (p. ej. ["verduras", "almuerzo"]),
+de modo que /emotion-analytics responde preguntas como «media de 'happy' en las
+sesiones con verduras de la última semana» sumando unas pocas filas.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from emotion_store import EMOTION_KEYS, EmotionStore
+
+ANALYTICS_FILENAME = 'analytics.sqlite3'
+
+# Frecuencia aproximada de muestreo del frontend (una medición cada 100 ms)
+FRAME_RATE_HZ = 10.0
+
+# Mediciones por ventana (5 segundos a 10 Hz)
+DEFAULT_WINDOW_FRAMES = 50
+
+GROUP_BY_OPTIONS = ('session', 'day', 'tag', 'window')
+
+_SUM_COLUMNS = [f'sum_{key}' for key in EMOTION_KEYS]
+_MAX_COLUMNS = [f'max_{key}' for key in EMOTION_KEYS]
+_DOMINANT_COLUMNS = [f'dominant_{key}' for key in EMOTION_KEYS]
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    finished_at REAL,
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS sessions_created_at ON sessions (created_at);
+CREATE TABLE IF NOT EXISTS session_tags (
+    session_id TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (session_id, tag)
+);
+CREATE INDEX IF NOT EXISTS session_tags_tag ON session_tags (tag);
+CREATE TABLE IF NOT EXISTS windows (
+    session_id TEXT NOT NULL,
+    window_index INTEGER NOT NULL,
+    frames INTEGER NOT NULL,
+    {', '.join(f'{column} REAL NOT NULL' for column in _SUM_COLUMNS + _MAX_COLUMNS)},
+    {', '.join(f'{column} INTEGER NOT NULL' for column in _DOMINANT_COLUMNS)},
+    PRIMARY KEY (session_id, window_index)
+);
+"""
+
+# Un batch puede empezar o terminar a mitad de ventana: se suma a lo que ya había
+_UPSERT_WINDOW = f"""
+INSERT INTO windows (session_id, window_index, frames, {', '.join(_SUM_COLUMNS + _MAX_COLUMNS + _DOMINANT_COLUMNS)})
+VALUES ({', '.join(['?'] * (3 + 3 * len(EMOTION_KEYS)))})
+ON CONFLICT (session_id, window_index) DO UPDATE SET
+    frames = frames + excluded.frames,
+    {', '.join(f'{column} = {column} + excluded.{column}' for column in _SUM_COLUMNS + _DOMINANT_COLUMNS)},
+    {', '.join(f'{column} = MAX({column}, excluded.{column})' for column in _MAX_COLUMNS)}
+"""
+
+
+def window_rollups(start, values, window_frames):
+    """
+    Resume un batch de mediciones por ventana, sin recorrerlas una a una
+
+    Args:
+        start: posición en la sesión de la primera medición del batch
+        values: matriz (n, 7) en el orden de EMOTION_KEYS
+        window_frames: mediciones por ventana
+
+    Returns:
+        tupla (índices de ventana, mediciones, sumas, máximos, mediciones como dominante),
+        una fila por ventana que toca el batch
+    """
+    values = np.nan_to_num(np.asarray(values, dtype=np.float64).reshape(-1, len(EMOTION_KEYS)), nan=0.0)
+    window_ids = (start + np.arange(len(values))) // window_frames
+    boundaries = np.flatnonzero(np.r_[True, window_ids[1:] != window_ids[:-1]])
+
+    sums = np.add.reduceat(values, boundaries, axis=0)
+    maxima = np.maximum.reduceat(values, boundaries, axis=0)
+    dominant = np.eye(len(EMOTION_KEYS), dtype=np.int64)[np.argmax(values, axis=1)]
+    dominant_counts = np.add.reduceat(dominant, boundaries, axis=0)
+    frames = np.diff(np.r_[boundaries, len(values)])
+
+    return window_ids[boundaries], frames, sums, maxima, dominant_counts
+
+
+class EmotionAnalytics:
+    """
+    Agregados por ventana y por sesión en SQLite, actualizados al ingerir
+    """
+
+    def __init__(self, path=None, window_frames=DEFAULT_WINDOW_FRAMES):
+        """
+        Args:
+            path: archivo SQLite (por defecto analytics.sqlite3 en el directorio del almacén de emociones)
+            window_frames: mediciones por ventana; si la base ya existe se usa el valor con que se creó
+        """
+        self.path = path or os.path.join(EmotionStore().root, ANALYTICS_FILENAME)
+        self._requested_window_frames = window_frames
+        self._window_frames = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        # Una conexión por hilo y por proceso (las conexiones SQLite no sobreviven a un fork).
+        # Nada se abre al construir el objeto: el archivo se crea en el primer uso, ya en el worker
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')  # Lecturas sin bloquear las escrituras
+            self._local.connection = connection
+            self._local.pid = pid
+            if self._window_frames is None:
+                self._create_schema(connection)
+        return self._local.connection
+
+    def _create_schema(self, connection):
+        with self._lock:
+            if self._window_frames is not None:
+                return
+            with connection:
+                connection.executescript(_SCHEMA)
+                connection.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('window_frames', ?)",
+                                   (str(self._requested_window_frames),))
+            self._window_frames = int(connection.execute(
+                "SELECT value FROM meta WHERE key = 'window_frames'").fetchone()[0])
+
+    @property
+    def window_frames(self):
+        """
+        Mediciones por ventana (la de la base si ya existía)
+        """
+        self._connection()
+        return self._window_frames
+
+    def register_session(self, session_id, metadata=None, created_at=None):
+        metadata = metadata or {}
+        tags = metadata.get('tags') or []
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                'INSERT OR IGNORE INTO sessions (session_id, created_at, source) VALUES (?, ?, ?)',
+                (session_id, created_at if created_at is not None else time.time(), metadata.get('source')))
+            connection.executemany('INSERT OR IGNORE INTO session_tags (session_id, tag) VALUES (?, ?)',
+                                   [(session_id, str(tag)) for tag in tags])
+
+    def ingest(self, session_id, start, values):
+        """
+        Suma un batch de mediciones a los agregados de sus ventanas
+
+        Args:
+            start: posición en la sesión de la primera medición (EmotionStore.append la devuelve)
+        """
+        if len(values) == 0:
+            return
+
+        window_ids, frames, sums, maxima, dominant = window_rollups(start, values, self.window_frames)
+        rows = [
+            (session_id, int(window_id), int(count), *window_sums.tolist(), *window_maxima.tolist(),
+             *window_dominant.tolist())
+            for window_id, count, window_sums, window_maxima, window_dominant
+            in zip(window_ids, frames, sums, maxima, dominant)
+        ]
+        connection = self._connection()
+        with connection:
+            connection.executemany(_UPSERT_WINDOW, rows)
+
+    def finish_session(self, session_id, finished_at=None):
+        connection = self._connection()
+        with connection:
+            connection.execute('UPDATE sessions SET finished_at = ? WHERE session_id = ?',
+                               (finished_at if finished_at is not None else time.time(), session_id))
+
+    def rebuild(self, store, session_ids=None):
+        """
+        Recalcula los agregados de las sesiones del almacén leyendo sus mediciones
+
+        Útil para sesiones importadas o guardadas antes de existir los agregados, o si
+        una actualización falló. Por defecto solo procesa las sesiones que faltan.
+
+        Args:
+            session_ids: sesiones a recalcular aunque ya existan (None: solo las que faltan)
+
+        Returns:
+            número de sesiones procesadas
+        """
+        connection = self._connection()
+        known = {row[0] for row in connection.execute('SELECT session_id FROM sessions')}
+        rebuilt = 0
+
+        for info in store.sessions():
+            session_id = info['session_id']
+            if session_ids is None and session_id in known:
+                continue
+            if session_ids is not None and session_id not in session_ids:
+                continue
+
+            with connection:
+                connection.execute('DELETE FROM windows WHERE session_id = ?', (session_id,))
+                connection.execute('DELETE FROM session_tags WHERE session_id = ?', (session_id,))
+                connection.execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
+            self.register_session(session_id, info.get('metadata'), info.get('created_at'))
+            self.ingest(session_id, 0, store.read(session_id))
+            if info.get('finished_at') is not None:
+                self.finish_session(session_id, info['finished_at'])
+            rebuilt += 1
+
+        return rebuilt
+
+    def query(self, emotions=None, tags=(), since=None, until=None, session_id=None, group_by=None,
+              limit=1000):
+        """
+        Combina los agregados de las ventanas que cumplen los filtros
+
+        Args:
+            emotions: emociones a devolver (por defecto todas)
+            tags: solo sesiones con todas estas etiquetas
+            since, until: rango (timestamps) de creación de las sesiones
+            session_id: solo esta sesión
+            group_by: None (un único resultado), 'session', 'day', 'tag' o 'window' (ventanas de una sesión)
+            limit: máximo de grupos devueltos
+
+        Returns:
+            lista de dicts con sesiones, mediciones, segundos, media y máximo por emoción,
+            segundos como emoción dominante y emoción dominante
+        """
+        emotions = list(emotions or EMOTION_KEYS)
+        unknown = [emotion for emotion in emotions if emotion not in EMOTION_KEYS]
+        if unknown:
+            raise ValueError(f"Emociones desconocidas: {', '.join(unknown)}")
+        if group_by is not None and group_by not in GROUP_BY_OPTIONS:
+            raise ValueError(f"group_by debe ser uno de: {', '.join(GROUP_BY_OPTIONS)}")
+        if group_by == 'window' and session_id is None:
+            raise ValueError("group_by='window' necesita session_id")
+
+        joins, conditions, parameters = [], [], []
+        group_key = {
+            None: 'NULL',
+            'session': 'w.session_id',
+            'day': "date(s.created_at, 'unixepoch', 'localtime')",
+            'tag': 't.tag',
+            'window': 'w.window_index'
+        }[group_by]
+        if group_by == 'tag':
+            joins.append('JOIN session_tags t ON t.session_id = w.session_id')
+
+        for tag in tags:
+            conditions.append('w.session_id IN (SELECT session_id FROM session_tags WHERE tag = ?)')
+            parameters.append(tag)
+        if since is not None:
+            conditions.append('s.created_at >= ?')
+            parameters.append(since)
+        if until is not None:
+            conditions.append('s.created_at < ?')
+            parameters.append(until)
+        if session_id is not None:
+            conditions.append('w.session_id = ?')
+            parameters.append(session_id)
+
+        sql = f"""
+            SELECT {group_key}, COUNT(DISTINCT w.session_id), SUM(w.frames),
+                   {', '.join(f'SUM(w.{column})' for column in _SUM_COLUMNS)},
+                   {', '.join(f'MAX(w.{column})' for column in _MAX_COLUMNS)},
+                   {', '.join(f'SUM(w.{column})' for column in _DOMINANT_COLUMNS)}
+            FROM windows w
+            JOIN sessions s ON s.session_id = w.session_id
+            {' '.join(joins)}
+            {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+            {'GROUP BY 1 ORDER BY 1' if group_by is not None else ''}
+            LIMIT ?
+        """
+        rows = self._connection().execute(sql, parameters + [limit]).fetchall()
+
+        k = len(EMOTION_KEYS)
+        results = []
+        for row in rows:
+            key, sessions, frames = row[:3]
+            if not frames:
+                continue  # Sin ventanas que cumplan los filtros
+            sums = dict(zip(EMOTION_KEYS, row[3:3 + k]))
+            maxima = dict(zip(EMOTION_KEYS, row[3 + k:3 + 2 * k]))
+            dominant = dict(zip(EMOTION_KEYS, row[3 + 2 * k:3 + 3 * k]))
+
+            result = {
+                'sessions': sessions,
+                'frames': frames,
+                'seconds': frames / FRAME_RATE_HZ,
+                'mean': {emotion: sums[emotion] / frames for emotion in emotions},
+                'max': {emotion: maxima[emotion] for emotion in emotions},
+                'time_in_state_seconds': {emotion: dominant[emotion] / FRAME_RATE_HZ for emotion in emotions},
+                'dominant': max(EMOTION_KEYS, key=lambda emotion: sums[emotion])
+            }
+            if group_by == 'window':
+                result['start_seconds'] = key * self.window_frames / FRAME_RATE_HZ
+            if group_by is not None:
+                result[group_by] = key
+            results.append(result)
+
+        return results
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Calcula los agregados de las sesiones de emociones guardadas')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='Recalcular todas las sesiones (por defecto solo las que faltan)')
+    parser.add_argument('--store', help='Directorio del almacén de emociones')
+    args = parser.parse_args()
+
+    store = EmotionStore(args.store)
+    analytics = EmotionAnalytics(os.path.join(store.root, ANALYTICS_FILENAME))
+    session_ids = {info['session_id'] for info in store.sessions()} if args.rebuild else None
+    print(f"✅ {analytics.rebuild(store, session_ids)} sesiones procesadas ({analytics.path})")
@@ -0,0 +1,238 @@
+"""
+Generación asíncrona de las gráficas de emociones
+
+Las gráficas se generan en un pool de procesos persistente en lugar de lanzar un
+intérprete nuevo por petición: cada worker importa matplotlib (backend Agg) y
+draw_expressions una sola vez al arrancar y recibe las emociones como una matriz
+float32 ya parseada. /save-emotions encola el trabajo y responde enseguida con
+un job id; el estado se consulta en /emotion-jobs/<job_id>.
+
+Como mucho max_pending trabajos esperan a la vez: por encima de ese límite la
+petición se rechaza (429) en lugar de acumular gráficas sin fin.
+"""
+
+import importlib
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+DRAW_EXPRESSIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'FaceExpressionRecognition')
+
+
+class RendererBusy(RuntimeError):
+    """
+    Hay demasiadas gráficas pendientes; el cliente debe reintentar más tarde
+    """
+
+
+class RendererUnavailable(RuntimeError):
+    """
+    El pool de procesos no pudo arrancar o se rompió
+    """
+
+
+def _init_worker():
+    # Un hilo de BLAS por worker y matplotlib ya importado con el backend Agg
+    for variable in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ.setdefault(variable, '1')
+
+    import matplotlib
+    matplotlib.use('Agg')
+
+    # Precargar draw_expressions (y con él pyplot) antes de recibir la primera gráfica
+    sys.path.insert(0, os.path.abspath(DRAW_EXPRESSIONS_DIR))
+    importlib.import_module('draw_expressions')
+
+
+def _render(values, columns, output_path, plot_options):
+    import draw_expressions
+
+    started = time.perf_counter()
+    draw_expressions.draw_expressions(values, columns, output_path, **plot_options)
+    return time.perf_counter() - started
+
+
+def _render_file(frames_path, columns, output_path, plot_options):
+    # Sesión ya guardada en disco (filas float32 de ancho fijo): se lee aquí, no en el servidor
+    import numpy as np
+
+    values = np.fromfile(frames_path, dtype='<f4')
+    values = values[:len(values) - len(values) % len(columns)].reshape(-1, len(columns))
+    return _render(values, columns, output_path, plot_options)
+
+
+class EmotionGraphJob:
+    """
+    Estado de una gráfica encolada
+    """
+
+    def __init__(self, output_path, count):
+        self.id = uuid.uuid4().hex
+        self.output_path = output_path
+        self.count = count
+        self.created_at = time.time()
+        self.finished_at = None
+        self.render_seconds = None
+        self.error = None
+        self.future = None
+
+    @property
+    def status(self):
+        if self.finished_at is None:
+            return 'rendering' if self.future is not None and self.future.running() else 'queued'
+        return 'failed' if self.error is not None else 'done'
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'graph': self.output_path,
+            'count': self.count,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+            'render_seconds': self.render_seconds,
+            'error': self.error
+        }
+
+
+class EmotionGraphRenderer:
+    """
+    Pool de procesos que genera las gráficas, con límite de trabajos pendientes
+    """
+
+    def __init__(self, workers=1, max_pending=16, max_jobs=1000, max_points=1000, method='lttb'):
+        """
+        Args:
+            workers: procesos que generan gráficas en paralelo
+            max_pending: trabajos en cola o en curso a partir de los que se rechazan nuevos
+            max_jobs: trabajos terminados que se recuerdan para consultar su estado
+            max_points: puntos como máximo por emoción en cada gráfica (0 dibuja todos)
+            method: reducción de puntos de las sesiones largas, 'lttb' o 'minmax'
+        """
+        self.plot_options = {'max_points': max_points, 'method': method}
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.max_jobs = max_jobs
+        self._pool = None
+        self._pid = None
+        self._jobs = OrderedDict()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.rendered = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def _ensure_pool(self):
+        # Los pools no sobreviven a un fork: cada proceso worker de serve.py crea el suyo
+        pid = os.getpid()
+        if self._pool is None or self._pid != pid:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=_init_worker)
+            self._pid = pid
+        return self._pool
+
+    @property
+    def busy(self):
+        return self._pending >= self.max_pending
+
+    def submit(self, values, columns, output_path):
+        """
+        Encola una gráfica y devuelve su trabajo sin esperar a que termine
+
+        Args:
+            values: matriz float32 (n_mediciones, n_emociones)
+            columns: nombre de cada columna
+            output_path: PNG de salida
+
+        Raises:
+            RendererBusy si ya hay max_pending gráficas pendientes
+            RendererUnavailable si el pool no puede aceptar trabajos
+        """
+        return self._submit(_render, (values, list(columns), output_path, self.plot_options),
+                            output_path, len(values))
+
+    def submit_file(self, frames_path, columns, output_path, count=None):
+        """
+        Encola la gráfica de una sesión guardada como filas float32 (emotion_store)
+
+        El worker lee el archivo directamente: las mediciones no pasan por el servidor.
+        """
+        return self._submit(_render_file, (frames_path, list(columns), output_path, self.plot_options),
+                            output_path, count)
+
+    def _submit(self, fn, args, output_path, count):
+        job = EmotionGraphJob(output_path, count)
+
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise RendererBusy(f'Hay {self._pending} gráficas pendientes; reintenta más tarde')
+
+            try:
+                pool = self._ensure_pool()
+                job.future = pool.submit(fn, *args)
+            except (BrokenProcessPool, RuntimeError, OSError) as e:
+                self._pool = None  # Se vuelve a crear en el siguiente intento
+                raise RendererUnavailable(f'No se pudo encolar la gráfica: {e}')
+
+            self._pending += 1
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+
+        job.future.add_done_callback(lambda future: self._finish(job, future, pool))
+        return job
+
+    def _finish(self, job, future, pool):
+        broken = False
+        if future.cancelled():
+            job.error = 'Gráfica cancelada al apagar el servicio'
+        else:
+            try:
+                job.render_seconds = future.result()
+            except BrokenProcessPool as e:
+                broken = True
+                job.error = f'El proceso de graficado terminó inesperadamente: {e}'
+            except Exception as e:
+                job.error = str(e)
+        job.finished_at = time.time()
+
+        with self._lock:
+            self._pending -= 1
+            if job.error is None:
+                self.rendered += 1
+            else:
+                self.failed += 1
+                print(f"❌ Error generando gráfica {job.output_path}: {job.error}")
+            if broken and self._pool is pool:
+                self._pool = None  # Se vuelve a crear en el siguiente intento
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_points': self.plot_options['max_points'],
+                'method': self.plot_options['method'],
+                'pending': self._pending,
+                'max_pending': self.max_pending,
+                'rendered': self.rendered,
+                'failed': self.failed,
+                'rejected': self.rejected
+            }
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
@@ -0,0 +1,325 @@
+"""
+Almacenamiento compacto de las sesiones de emociones
+
+Cada sesión se guarda como un archivo binario de filas float32 de ancho fijo (una
+fila por medición, una columna por emoción en el orden de EMOTION_KEYS): 28 bytes
+por medición frente a los ~200 de un objeto JSON que repite los siete nombres.
+Los datos se leen con np.memmap, sin parsear, y cada emoción es una columna de
+la matriz.
+
+Las escrituras son solo de anexado (O_APPEND) y cada batch de filas se escribe
+con una única llamada a os.write, así que varios procesos o hilos pueden añadir
+mediciones a la vez sin bloqueos. Las sesiones se identifican con un uuid (dos
+sesiones en el mismo segundo ya no se pisan) y se registran en index.jsonl, un
+índice también de solo anexado con una línea JSON por evento.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+import numpy as np
+
+# Emociones que devuelve face-api, en el orden de las columnas
+EMOTION_KEYS = ['neutral', 'happy', 'sad', 'angry', 'fearful', 'disgusted', 'surprised']
+
+ROW_DTYPE = np.dtype('<f4')
+ROW_BYTES = ROW_DTYPE.itemsize * len(EMOTION_KEYS)
+
+INDEX_FILENAME = 'index.jsonl'
+SESSIONS_DIRNAME = 'sessions'
+FRAMES_SUFFIX = '.f32'
+
+STORE_ENV = 'ML_EMOTION_STORE'
+DEFAULT_STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                                  'FaceExpressionRecognition', 'emotion_results')
+
+_SESSION_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+def frame_to_row(frame, out):
+    """
+    Escribe en out (vector de 7) las emociones de una medición de face-api; las que faltan quedan como NaN
+
+    Raises:
+        ValueError si la medición no es un objeto o trae valores no numéricos
+    """
+    if not isinstance(frame, dict):
+        raise ValueError('no es un objeto')
+    try:
+        out[:] = [frame.get(key, np.nan) for key in EMOTION_KEYS]
+    except (TypeError, ValueError):
+        raise ValueError('tiene valores no numéricos')
+
+
+def frames_to_array(frames):
+    """
+    Convierte la lista de mediciones de face-api en una matriz float32 (n_mediciones, 7)
+
+    Raises:
+        ValueError si alguna medición no es válida
+    """
+    rows = np.full((len(frames), len(EMOTION_KEYS)), np.nan, dtype=ROW_DTYPE)
+    for i, frame in enumerate(frames):
+        try:
+            frame_to_row(frame, rows[i])
+        except ValueError as e:
+            raise ValueError(f'la medición {i} {e}')
+    return rows
+
+
+def parse_ndjson_frames(lines, max_frames):
+    """
+    Lee mediciones en NDJSON (un objeto JSON por línea) y las devuelve como matriz float32
+
+    Las líneas se convierten en filas a medida que se leen, así que la memoria
+    depende del número de mediciones (28 bytes cada una) y no del tamaño del texto.
+
+    Args:
+        lines: iterable de líneas en bytes o str (p. ej. el stream de la petición)
+        max_frames: máximo de mediciones aceptadas en un batch
+
+    Raises:
+        ValueError con el número de línea si alguna no es válida
+        OverflowError si hay más de max_frames mediciones
+    """
+    rows = np.empty((min(max_frames, 1024), len(EMOTION_KEYS)), dtype=ROW_DTYPE)
+    count = 0
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        if count == max_frames:
+            raise OverflowError(f'El batch supera el máximo de {max_frames} mediciones')
+        if count == len(rows):
+            rows = np.resize(rows, (min(max_frames, 2 * len(rows)), len(EMOTION_KEYS)))
+        try:
+            frame_to_row(json.loads(line), rows[count])
+        except ValueError as e:
+            raise ValueError(f'Línea {line_number}: {e}')
+        count += 1
+    return rows[:count]
+
+
+class UnknownSessionError(KeyError):
+    """
+    La sesión de emociones no existe en el almacén
+    """
+
+    def __init__(self, session_id):
+        super().__init__(f"Sesión de emociones no encontrada: {session_id}")
+        self.session_id = session_id
+
+    def __str__(self):
+        return self.args[0]
+
+
+class EmotionStore:
+    """
+    Sesiones de emociones en archivos float32 de solo anexado, con un índice JSONL
+    """
+
+    def __init__(self, root=None):
+        self.root = os.path.abspath(root or os.environ.get(STORE_ENV) or DEFAULT_STORE_PATH)
+        self.sessions_dir = os.path.join(self.root, SESSIONS_DIRNAME)
+        self.index_path = os.path.join(self.root, INDEX_FILENAME)
+        self._dirs_ready = False  # Los directorios se crean en la primera escritura, no al importar app
+
+        # Vista en memoria del índice; se pone al día leyendo solo las líneas nuevas
+        self._sessions = {}
+        self._index_offset = 0
+        self._lock = threading.Lock()
+
+    def frames_path(self, session_id):
+        if not isinstance(session_id, str) or not _SESSION_ID.match(session_id):
+            raise UnknownSessionError(session_id)
+        return os.path.join(self.sessions_dir, session_id + FRAMES_SUFFIX)
+
+    def graph_path(self, session_id):
+        return os.path.join(self.root, f'graph_{session_id}.png')
+
+    def _ensure_dirs(self):
+        if not self._dirs_ready:
+            os.makedirs(self.sessions_dir, exist_ok=True)
+            self._dirs_ready = True
+
+    @staticmethod
+    def _append(path, data):
+        """
+        Añade data al final del archivo y devuelve la posición en la que terminó la escritura
+        """
+        # Una sola escritura con O_APPEND: el sistema operativo la coloca al final del
+        # archivo de forma atómica aunque otros procesos escriban a la vez
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            view = memoryview(data)
+            while view:
+                written = os.write(fd, view)
+                view = view[written:]
+            return os.lseek(fd, 0, os.SEEK_CUR)
+        finally:
+            os.close(fd)
+
+    def _log_event(self, session_id, event, **fields):
+        record = {'session_id': session_id, 'event': event, 'time': time.time(), **fields}
+        self._ensure_dirs()
+        self._append(self.index_path, (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+
+    def create_session(self, metadata=None):
+        """
+        Registra una sesión nueva y devuelve su id
+
+        Args:
+            metadata: dict opcional que se guarda en el índice (p. ej. origen o usuario)
+        """
+        session_id = uuid.uuid4().hex
+        self._ensure_dirs()
+        open(self.frames_path(session_id), 'ab').close()
+        self._log_event(session_id, 'created', columns=EMOTION_KEYS, dtype=ROW_DTYPE.str,
+                        metadata=metadata or {})
+        return session_id
+
+    def append(self, session_id, values):
+        """
+        Añade mediciones al final de la sesión
+
+        Args:
+            values: matriz (n_mediciones, 7) en el orden de EMOTION_KEYS
+
+        Returns:
+            posición en la sesión de la primera fila añadida (exacta aunque otros
+            procesos añadan mediciones a la vez)
+        """
+        path = self.frames_path(session_id)
+        if not os.path.exists(path):
+            raise UnknownSessionError(session_id)
+
+        rows = np.ascontiguousarray(values, dtype=ROW_DTYPE).reshape(-1, len(EMOTION_KEYS))
+        if not len(rows):
+            return self.frame_count(session_id)
+        end = self._append(path, rows.tobytes())
+        return (end - rows.nbytes) // ROW_BYTES
+
+    def finish_session(self, session_id, **fields):
+        """
+        Marca la sesión como cerrada en el índice (no se aceptan más mediciones)
+        """
+        self._log_event(session_id, 'finished', **fields)
+
+    def frame_count(self, session_id):
+        path = self.frames_path(session_id)
+        try:
+            return os.path.getsize(path) // ROW_BYTES  # Una fila a medio escribir no se cuenta
+        except OSError:
+            raise UnknownSessionError(session_id)
+
+    def read(self, session_id, start=0, stop=None):
+        """
+        Mediciones de la sesión como matriz (n, 7) de solo lectura mapeada en memoria
+
+        Args:
+            start, stop: rango de filas (por defecto toda la sesión)
+        """
+        count = self.frame_count(session_id)
+        start, stop, _ = slice(start, stop).indices(count)
+        if stop <= start:
+            return np.empty((0, len(EMOTION_KEYS)), dtype=ROW_DTYPE)
+
+        return np.memmap(self.frames_path(session_id), dtype=ROW_DTYPE, mode='r',
+                         offset=start * ROW_BYTES, shape=(stop - start, len(EMOTION_KEYS)))
+
+    def to_records(self, session_id):
+        """
+        Mediciones como lista de dicts (el formato JSON anterior); las emociones que faltan son None
+        """
+        return [{key: (None if value != value else value) for key, value in zip(EMOTION_KEYS, row)}
+                for row in self.read(session_id).tolist()]
+
+    def _refresh_index(self):
+        try:
+            with open(self.index_path, 'rb') as f:
+                f.seek(self._index_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+
+        end = data.rfind(b'\n') + 1  # Una línea sin terminar se lee en la próxima pasada
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            session = self._sessions.setdefault(record['session_id'], {'session_id': record['session_id']})
+            event = record.pop('event', None)
+            record_time = record.pop('time', None)
+            if event == 'created':
+                session['created_at'] = record_time
+            else:
+                session[f'{event}_at'] = record_time
+            session.update({key: value for key, value in record.items() if key != 'session_id'})
+        self._index_offset += end
+
+    def session_info(self, session_id):
+        """
+        Datos del índice de la sesión más su número de mediciones
+        """
+        with self._lock:
+            self._refresh_index()
+            info = self._sessions.get(session_id)
+            info = dict(info) if info is not None else None
+        if info is None:
+            raise UnknownSessionError(session_id)
+
+        info['frames'] = self.frame_count(session_id)
+        return info
+
+    def sessions(self, since=None):
+        """
+        Sesiones registradas en el índice (las más recientes al final)
+
+        Args:
+            since: timestamp opcional; solo sesiones creadas desde entonces
+        """
+        with self._lock:
+            self._refresh_index()
+            sessions = [dict(info) for info in self._sessions.values()]
+        if since is not None:
+            sessions = [info for info in sessions if (info.get('created_at') or 0) >= since]
+        return sessions
+
+    def import_json(self, json_path):
+        """
+        Convierte un archivo emotions_<timestamp>.json del formato anterior en una sesión
+
+        Returns:
+            id de la sesión creada
+        """
+        with open(json_path, encoding='utf-8') as f:
+            frames = json.load(f)
+        if isinstance(frames, dict):
+            frames = frames.get('emotions', [])
+
+        values = np.array([[frame.get(key, np.nan) for key in EMOTION_KEYS] for frame in frames],
+                          dtype=ROW_DTYPE).reshape(-1, len(EMOTION_KEYS))
+        session_id = self.create_session({'source': os.path.basename(json_path)})
+        self.append(session_id, values)
+        return session_id
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Importa sesiones de emociones en formato JSON al almacén compacto')
+    parser.add_argument('json_files', nargs='+', help='Archivos emotions_<timestamp>.json')
+    parser.add_argument('--store', help='Directorio del almacén (por defecto: FaceExpressionRecognition/emotion_results)')
+    args = parser.parse_args()
+
+    store = EmotionStore(args.store)
+    for path in args.json_files:
+        session_id = store.import_json(path)
+        frames = store.frame_count(session_id)
+        print(f"✅ {path}: {frames} mediciones -> sesión {session_id} "
+              f"({os.path.getsize(path) / 1024:.0f} KB -> {frames * ROW_BYTES / 1024:.0f} KB)")
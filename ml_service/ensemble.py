@@ -0,0 +1,137 @@
+"""
+Ensemble de la red neuronal, KNN y SVM
+
+El model_type 'ensemble' construye la matriz de características una sola vez y
+pasa el mismo batch por los tres backends, cada uno en un hilo del pool (el
+trabajo pesado de NumPy y scikit-learn libera el GIL), así que la latencia se
+acerca a la del backend más lento y no a la suma de los tres. Las probabilidades
+por clase (softmax de la red, fracción de votos de KNN y SVM calibrado) se
+combinan con una media ponderada y después se aplican las reglas de ajuste.
+
+Los pesos se configuran con NutritionModel(ensemble_weights=...) o con la
+variable de entorno ML_ENSEMBLE_WEIGHTS, p. ej. "neural=0.5,knn=0.25,svm=0.25".
+Un peso 0 deja fuera ese backend. Como red puede usarse una variante cuantizada
+("neural_int8=0.5,knn=0.25,svm=0.25").
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from quantization import NEURAL_VARIANTS
+
+ENSEMBLE_MODEL_TYPE = 'ensemble'
+
+ENSEMBLE_WEIGHTS_ENV = 'ML_ENSEMBLE_WEIGHTS'
+DEFAULT_ENSEMBLE_WEIGHTS = {'neural': 0.5, 'knn': 0.25, 'svm': 0.25}
+
+ENSEMBLE_BACKENDS = tuple(NEURAL_VARIANTS) + ('knn', 'svm')
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def parse_weights(spec):
+    """
+    Pesos del ensemble a partir de un dict o de un texto "backend=peso,..."
+
+    Returns:
+        dict backend -> peso (solo los pesos positivos), normalizado para sumar 1
+
+    Raises:
+        ValueError si algún backend no existe, algún peso no es numérico o negativo,
+        o no queda ningún peso positivo
+    """
+    if isinstance(spec, str):
+        weights = {}
+        for item in spec.split(','):
+            if not item.strip():
+                continue
+            backend, separator, value = item.partition('=')
+            if not separator:
+                raise ValueError(f"Peso del ensemble sin '=': {item.strip()}")
+            try:
+                weights[backend.strip()] = float(value)
+            except ValueError:
+                raise ValueError(f"Peso del ensemble no numérico: {item.strip()}")
+    else:
+        weights = {backend: float(value) for backend, value in dict(spec).items()}
+
+    unknown = [backend for backend in weights if backend not in ENSEMBLE_BACKENDS]
+    if unknown:
+        raise ValueError(f"Backends desconocidos en el ensemble: {', '.join(unknown)} "
+                         f"(disponibles: {', '.join(ENSEMBLE_BACKENDS)})")
+    if any(value < 0 for value in weights.values()):
+        raise ValueError("Los pesos del ensemble no pueden ser negativos")
+    if sum(1 for backend in weights if backend in NEURAL_VARIANTS and weights[backend] > 0) > 1:
+        raise ValueError("El ensemble admite una sola variante de la red neuronal")
+
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("El ensemble necesita al menos un peso positivo")
+    return {backend: value / total for backend, value in weights.items() if value > 0}
+
+
+def default_weights():
+    """
+    Pesos de ML_ENSEMBLE_WEIGHTS o, si no está definida, DEFAULT_ENSEMBLE_WEIGHTS
+    """
+    spec = os.environ.get(ENSEMBLE_WEIGHTS_ENV)
+    return parse_weights(spec if spec else DEFAULT_ENSEMBLE_WEIGHTS)
+
+
+def expand_classes(probabilities, classes, n_classes):
+    """
+    Reordena las columnas de probabilidades de un clasificador al orden de las etiquetas
+
+    Los modelos de scikit-learn devuelven una columna por clase vista al entrenar
+    (classes_, índices de etiqueta); las clases que no vio quedan con probabilidad 0.
+
+    Returns:
+        matriz (N, n_classes)
+    """
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    expanded = np.zeros((len(probabilities), n_classes), dtype=np.float64)
+    expanded[:, np.asarray(classes, dtype=int)] = probabilities
+    return expanded
+
+
+def combine(probabilities, weights):
+    """
+    Media ponderada de las probabilidades de cada backend
+
+    Args:
+        probabilities: dict backend -> matriz (N, n_clases) en el orden de las etiquetas
+        weights: dict backend -> peso (sumando 1)
+
+    Returns:
+        tupla (label_indices, confidences, matriz combinada)
+    """
+    combined = sum(weights[backend] * matrix for backend, matrix in probabilities.items())
+    label_indices = np.argmax(combined, axis=1)
+    return label_indices, combined[np.arange(len(combined)), label_indices], combined
+
+
+def run_backends(fn, backends):
+    """
+    Ejecuta fn(backend) para cada backend en el pool de hilos del ensemble
+
+    Returns:
+        dict backend -> resultado (la primera excepción se propaga)
+    """
+    global _executor, _executor_pid
+
+    if len(backends) == 1:
+        return {backends[0]: fn(backends[0])}
+
+    # El pool no sobrevive a un fork: cada proceso worker de serve.py crea el suyo
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=len(ENSEMBLE_BACKENDS),
+                                           thread_name_prefix='ensemble')
+            _executor_pid = os.getpid()
+        executor = _executor
+
+    futures = {backend: executor.submit(fn, backend) for backend in backends}
+    return {backend: future.result() for backend, future in futures.items()}
@@ -0,0 +1,106 @@
+"""
+Agregación columnar de la información nutricional de los alimentos de un plato
+
+Los alimentos llegan con distintas grafías de las claves (las del dataset CSV,
+como 'Calorias', o las del frontend, como 'calories'). Cada esquema de claves
+distinto se resuelve una sola vez; después cada alimento se copia a una fila de
+una matriz (n_alimentos × n_nutrientes) y los totales se obtienen con una única
+suma vectorizada, también para listas de platos.
+"""
+
+import numpy as np
+
+# Orden de las columnas de nutrientes (claves del dataset CSV)
+NUTRIENT_KEYS = ['Calorias', 'Proteinas', 'Carbohidratos', 'Grasas', 'Fibra', 'Azucar']
+
+# Grafías aceptadas por nutriente, en orden de preferencia
+NUTRIENT_ALIASES = {
+    'Calorias': ('Calorias', 'calories', 'calorie'),
+    'Proteinas': ('Proteinas', 'protein', 'proteins'),
+    'Carbohidratos': ('Carbohidratos', 'carbs', 'carbohydrates', 'carbohidratos'),
+    'Grasas': ('Grasas', 'fat', 'fats', 'grasas'),
+    'Fibra': ('Fibra', 'fiber', 'fibra'),
+    'Azucar': ('Azucar', 'sugar', 'azucar')
+}
+
+# Valores por alimento cuando un plato no trae ningún dato nutricional reconocible
+DEFAULT_NUTRITION_PER_FOOD = np.array([200, 10, 30, 8, 3, 5], dtype=np.float64)
+
+
+class FoodAggregator:
+    """
+    Normaliza el esquema de los alimentos y suma sus nutrientes de forma vectorizada
+    """
+
+    def __init__(self, aliases=None, default_per_food=DEFAULT_NUTRITION_PER_FOOD):
+        aliases = aliases or NUTRIENT_ALIASES
+        self.nutrient_keys = list(aliases)
+        self._aliases = [aliases[key] for key in self.nutrient_keys]
+        self.default_per_food = np.asarray(default_per_food, dtype=np.float64)
+        self._schemas = {}  # tupla de claves del alimento -> clave elegida por nutriente
+
+    def _resolve_schema(self, keys):
+        """
+        Devuelve, para un esquema de claves, la clave a leer de cada nutriente (o None)
+        """
+        schema = self._schemas.get(keys)
+        if schema is None:
+            present = set(keys)
+            schema = tuple(next((alias for alias in aliases if alias in present), None)
+                           for aliases in self._aliases)
+            self._schemas[keys] = schema
+        return schema
+
+    def to_matrix(self, foods):
+        """
+        Convierte una lista de alimentos en una matriz (n_alimentos, n_nutrientes)
+        """
+        matrix = np.zeros((len(foods), len(self.nutrient_keys)), dtype=np.float64)
+        for i, food in enumerate(foods):
+            schema = self._resolve_schema(tuple(food))
+            matrix[i] = [food[key] or 0 if key is not None else 0 for key in schema]
+        return matrix
+
+    def _apply_defaults(self, totals, food_counts):
+        # Platos sin ningún dato reconocible: estimación basada en el número de alimentos
+        empty = ~totals.any(axis=1)
+        if empty.any():
+            totals[empty] = np.outer(food_counts[empty], self.default_per_food)
+        return totals
+
+    def aggregate(self, foods):
+        """
+        Suma los nutrientes de un plato
+
+        Returns:
+            np.ndarray (n_nutrientes,) con los totales en el orden de NUTRIENT_KEYS
+        """
+        return self.aggregate_plates([foods])[0]
+
+    def aggregate_plates(self, plates):
+        """
+        Suma los nutrientes de varios platos con una sola reducción vectorizada
+
+        Args:
+            plates: lista de platos, cada uno una lista de alimentos
+
+        Returns:
+            np.ndarray (n_platos, n_nutrientes) con los totales de cada plato
+        """
+        food_counts = np.array([len(plate) for plate in plates], dtype=np.int64)
+        totals = np.zeros((len(plates), len(self.nutrient_keys)), dtype=np.float64)
+
+        non_empty = food_counts > 0
+        if non_empty.any():
+            matrix = self.to_matrix([food for plate in plates for food in plate])
+            starts = np.concatenate(([0], np.cumsum(food_counts)[:-1]))
+            totals[non_empty] = np.add.reduceat(matrix, starts[non_empty], axis=0)
+
+        return self._apply_defaults(totals, food_counts)
+
+    def totals_to_dict(self, totals):
+        return {key: float(value) for key, value in zip(self.nutrient_keys, totals)}
+
+
+# Instancia compartida: la caché de esquemas es pequeña y se reutiliza entre peticiones
+default_aggregator = FoodAggregator()
@@ -0,0 +1,165 @@
+"""
+Catálogo de alimentos indexado por id
+
+Carga una sola vez los alimentos de src/data/foods.ts (los mismos que muestra el
+frontend) en una tabla NumPy (n_alimentos × nutrientes) con un índice id -> fila.
+Así los clientes pueden enviar los platos como listas de ids o mapas
+id -> cantidad, y los totales se obtienen como cantidades @ tabla en lugar de
+recibir y sumar el diccionario nutricional completo de cada alimento.
+
+La variable de entorno ML_FOOD_CATALOG permite usar otro archivo: un .ts con el
+mismo formato que foods.ts o un .json con una lista de {"id", "nutrition"}
+(por ejemplo, la respuesta de GET /api/foods del servidor Node).
+"""
+
+import json
+import os
+import re
+import threading
+import numpy as np
+from food_aggregation import default_aggregator
+
+FOOD_CATALOG_ENV = 'ML_FOOD_CATALOG'
+DEFAULT_CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                    '..', 'src', 'data', 'foods.ts')
+
+# Cada alimento de foods.ts: id: '...' seguido (dentro del mismo objeto) de nutrition: { ... }
+_TS_FOOD_PATTERN = re.compile(r"id:\s*['\"]([^'\"]+)['\"][^{}]*?nutrition:\s*\{([^}]*)\}")
+_TS_FIELD_PATTERN = re.compile(r"(\w+)\s*:\s*(-?\d+(?:\.\d+)?)")
+
+
+class UnknownFoodError(KeyError):
+    """
+    Algún id del plato no existe en el catálogo
+    """
+
+    def __init__(self, food_ids):
+        self.food_ids = sorted(set(food_ids))
+        super().__init__(f"Alimentos desconocidos: {', '.join(self.food_ids)}")
+
+    def __str__(self):
+        return self.args[0]
+
+
+class FoodCatalog:
+    """
+    Tabla de nutrientes por alimento con acceso por id
+    """
+
+    def __init__(self, food_ids, nutrients, source=None):
+        """
+        Args:
+            food_ids: lista de ids, en el orden de las filas de nutrients
+            nutrients: matriz (n_alimentos, 6) en el orden de NUTRIENT_KEYS
+            source: ruta de la que se cargó el catálogo (informativo)
+        """
+        self.food_ids = list(food_ids)
+        self.index = {food_id: i for i, food_id in enumerate(self.food_ids)}
+        self.nutrients = np.asarray(nutrients, dtype=np.float64).reshape(len(self.food_ids), -1)
+        self.nutrients.setflags(write=False)
+        self.source = source
+
+    def __len__(self):
+        return len(self.food_ids)
+
+    def __contains__(self, food_id):
+        return food_id in self.index
+
+    @classmethod
+    def from_foods_ts(cls, path):
+        with open(path, encoding='utf-8') as f:
+            source = f.read()
+
+        food_ids, rows = [], []
+        for food_id, nutrition in _TS_FOOD_PATTERN.findall(source):
+            food_ids.append(food_id)
+            rows.append({key: float(value) for key, value in _TS_FIELD_PATTERN.findall(nutrition)})
+
+        return cls(food_ids, default_aggregator.to_matrix(rows), source=path)
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path, encoding='utf-8') as f:
+            foods = json.load(f)
+
+        # Admite una lista de alimentos o un mapa nombre -> alimento (como foodMapping en server.js)
+        if isinstance(foods, dict):
+            foods = list(foods.values())
+
+        food_ids = [food['id'] for food in foods]
+        rows = [food.get('nutrition', food) for food in foods]
+        return cls(food_ids, default_aggregator.to_matrix(rows), source=path)
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or os.environ.get(FOOD_CATALOG_ENV) or DEFAULT_CATALOG_PATH
+        if path.endswith('.json'):
+            return cls.from_json(path)
+        return cls.from_foods_ts(path)
+
+    def quantity_matrix(self, plates):
+        """
+        Convierte platos de ids en una matriz (n_platos, n_alimentos) de cantidades
+
+        Args:
+            plates: lista de platos; cada plato es una lista de ids (los repetidos
+                    cuentan varias veces) o un dict id -> cantidad
+
+        Raises:
+            UnknownFoodError si algún id no está en el catálogo
+        """
+        rows, cols, quantities, unknown = [], [], [], []
+        for plate_index, plate in enumerate(plates):
+            items = plate.items() if isinstance(plate, dict) else ((food_id, 1) for food_id in plate)
+            for food_id, quantity in items:
+                column = self.index.get(food_id)
+                if column is None:
+                    unknown.append(str(food_id))
+                    continue
+                rows.append(plate_index)
+                cols.append(column)
+                quantities.append(quantity)
+
+        if unknown:
+            raise UnknownFoodError(unknown)
+
+        counts = np.zeros((len(plates), len(self.food_ids)), dtype=np.float64)
+        np.add.at(counts, (np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)),
+                  np.asarray(quantities, dtype=np.float64))
+        return counts
+
+    def plate_totals(self, plates):
+        """
+        Totales nutricionales (n_platos, 6) de platos expresados como ids
+        """
+        return self.quantity_matrix(plates) @ self.nutrients
+
+    def totals(self, plate):
+        return self.plate_totals([plate])[0]
+
+
+_default_catalog = None
+_default_catalog_lock = threading.Lock()
+
+
+def is_id_plate(plate):
+    """
+    True si el plato viene como mapa id -> cantidad o como lista de ids
+    """
+    if isinstance(plate, dict):
+        return True
+    return bool(plate) and all(isinstance(food, str) for food in plate)
+
+
+def get_default_catalog():
+    """
+    Catálogo compartido, cargado la primera vez que se necesita
+    """
+    global _default_catalog
+    if _default_catalog is None:
+        with _default_catalog_lock:
+            if _default_catalog is None:
+                _default_catalog = FoodCatalog.load()
+                print(f"📚 Catálogo de alimentos cargado: {len(_default_catalog)} alimentos "
+                      f"({_default_catalog.source})")
+    return _default_catalog
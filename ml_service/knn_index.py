@@ -0,0 +1,89 @@
+"""
+Índice espacial para el backend KNN
+
+En lugar de recorrer todo el conjunto de referencia en cada consulta, los platos
+de entrenamiento se guardan en un KD-tree (o ball tree si hay muchas
+características) construido al entrenar y guardado junto a knn_model.pkl. Las
+consultas se hacen por batches y la confianza es la fracción de vecinos que
+votan por la clase ganadora, en lugar de un valor fijo.
+"""
+
+import numpy as np
+
+KNN_INDEX_FILENAME = 'knn_index.pkl'
+
+# Con más dimensiones que esto un KD-tree pierde eficacia frente a un ball tree
+KD_TREE_MAX_FEATURES = 15
+
+
+class KNNIndex:
+    """
+    Árbol de vecinos más cercanos con votación por mayoría
+    """
+
+    def __init__(self, X, y, n_neighbors=5, leaf_size=40, algorithm='auto'):
+        """
+        Args:
+            X: matriz (n_muestras, n_características) de referencia
+            y: etiquetas codificadas de cada muestra
+            n_neighbors: vecinos que votan en cada consulta
+            leaf_size: tamaño de hoja del árbol
+            algorithm: 'kd_tree', 'ball_tree' o 'auto' (según el número de características)
+        """
+        from sklearn.neighbors import BallTree, KDTree
+
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y)
+        if algorithm == 'auto':
+            algorithm = 'kd_tree' if X.shape[1] <= KD_TREE_MAX_FEATURES else 'ball_tree'
+
+        self.algorithm = algorithm
+        self.tree = (KDTree if algorithm == 'kd_tree' else BallTree)(X, leaf_size=leaf_size)
+        self.classes_, self.labels = np.unique(y, return_inverse=True)  # labels: posición en classes_
+        self.n_neighbors = max(1, min(n_neighbors, len(X)))
+        self.n_samples, self.n_features = X.shape
+
+    def vote_fractions(self, X, batch_size=8192):
+        """
+        Fracción de los k vecinos de cada fila que pertenece a cada clase
+
+        Returns:
+            np.ndarray (n_filas, n_clases) en el orden de classes_
+        """
+        X = np.asarray(X, dtype=np.float64)
+        fractions = np.empty((len(X), len(self.classes_)), dtype=np.float64)
+
+        for start in range(0, len(X), batch_size):
+            neighbors = self.tree.query(X[start:start + batch_size], k=self.n_neighbors,
+                                        return_distance=False)
+            votes = self.labels[neighbors]  # (batch, k) posiciones de clase
+            counts = np.zeros((len(votes), len(self.classes_)), dtype=np.float64)
+            np.add.at(counts, (np.arange(len(votes))[:, None], votes), 1)
+            fractions[start:start + batch_size] = counts / self.n_neighbors
+
+        return fractions
+
+    def query(self, X, batch_size=8192):
+        """
+        Clase más votada y su fracción de votos para cada fila
+
+        Returns:
+            tupla (etiquetas codificadas, confianzas)
+        """
+        fractions = self.vote_fractions(X, batch_size)
+        winners = np.argmax(fractions, axis=1)  # En empate gana la clase menor, como en sklearn
+        return self.classes_[winners], fractions[np.arange(len(fractions)), winners]
+
+    def predict(self, X):
+        return self.query(X)[0]
+
+    def predict_proba(self, X):
+        return self.vote_fractions(X)
+
+    def stats(self):
+        return {
+            'algorithm': self.algorithm,
+            'samples': int(self.n_samples),
+            'features': int(self.n_features),
+            'n_neighbors': int(self.n_neighbors)
+        }
@@ -0,0 +1,196 @@
+"""
+Métricas del servicio en formato de texto de Prometheus
+
+Contadores e histogramas en memoria, sin dependencias externas, que se exponen
+en GET /metrics:
+
+  - peticiones HTTP y su latencia por endpoint y model_type;
+  - tiempo de cada etapa de una predicción (parse, aggregate, featurize, cache,
+    forward, combine, rules, serialize) por model_type;
+  - platos clasificados y aciertos de la caché de predicciones por model_type.
+
+Cada proceso lleva sus propias métricas: con varios workers (serve.py) cada
+scrape devuelve las del worker que atiende la petición.
+"""
+
+import bisect
+import threading
+import time
+
+# Límites superiores (segundos) de los buckets de latencia: de 0.1 ms a 10 s
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_series(key, value) for key, value in items)
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    """
+    Valor que solo crece (peticiones, platos clasificados...)
+    """
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _render_series(self, key, value):
+        return f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+
+
+class _StageTimer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Histogram(_Metric):
+    """
+    Distribución de duraciones en buckets acumulativos, con suma y recuento
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # [recuento por bucket (el último es +Inf), suma, recuento total]
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, **labels):
+        """
+        Context manager que observa la duración del bloque
+        """
+        return _StageTimer(self, labels)
+
+    def _render_series(self, key, series):
+        counts, total, count = series
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labelnames, key, [('le', _format_value(float(bound)))])
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f'{self.name}_sum{labels} {_format_value(float(total))}')
+        lines.append(f'{self.name}_count{labels} {count}')
+        return '\n'.join(lines)
+
+
+class MetricsRegistry:
+    """
+    Conjunto de métricas que se exportan juntas
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        Todas las métricas en el formato de exposición de texto de Prometheus
+        """
+        return '\n'.join(metric.render() for metric in self._metrics) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    'ml_http_requests_total', 'Peticiones HTTP atendidas',
+    ('endpoint', 'method', 'status', 'model_type'))
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'ml_http_request_duration_seconds', 'Latencia de las peticiones HTTP',
+    ('endpoint', 'model_type'))
+PREDICTION_STAGE_SECONDS = REGISTRY.histogram(
+    'ml_prediction_stage_seconds', 'Tiempo de cada etapa de la predicción',
+    ('stage', 'model_type'))
+PREDICTED_DISHES = REGISTRY.counter(
+    'ml_predicted_dishes_total', 'Platos clasificados', ('model_type',))
+PREDICTION_CACHE_LOOKUPS = REGISTRY.counter(
+    'ml_prediction_cache_lookups_total', 'Consultas a la caché de predicciones',
+    ('model_type', 'result'))
+
+
+def time_stage(stage, model_type=''):
+    """
+    Mide una etapa de la predicción: with time_stage('forward', model_type): ...
+    """
+    return PREDICTION_STAGE_SECONDS.time(stage=stage, model_type=model_type)
+
+
+def observe_stage(stage, model_type, seconds):
+    """
+    Registra una etapa ya medida (p. ej. el parseo, antes de conocer el model_type)
+    """
+    PREDICTION_STAGE_SECONDS.observe(seconds, stage=stage, model_type=model_type)
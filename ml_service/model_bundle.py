@@ -0,0 +1,231 @@
+"""
+Paquete versionado con todo lo necesario para servir el modelo de nutrición
+
+Un único archivo .npz (sin pickle) contiene los pesos de la red neuronal, los
+preprocesadores ajustados (clases del LabelEncoder, mínimos/máximos del
+MinMaxScaler), el orden de las características, las etiquetas de salida y las
+constantes de normalización, junto con un manifiesto JSON que incluye la versión
+del formato y un checksum SHA-256 de todos los arrays.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import numpy as np
+from numpy_mlp import NumpyMLP
+
+BUNDLE_FORMAT_VERSION = 1
+BUNDLE_FILENAME = 'nutrition_bundle.npz'
+MANIFEST_KEY = '__manifest__'
+
+
+class MinMaxStats:
+    """
+    Sustituto ligero de un MinMaxScaler ya ajustado (sin importar sklearn)
+    """
+
+    def __init__(self, data_min, data_max):
+        self.data_min_ = np.asarray(data_min, dtype=np.float64)
+        self.data_max_ = np.asarray(data_max, dtype=np.float64)
+        self.data_range_ = self.data_max_ - self.data_min_
+
+    def transform(self, X):
+        data_range = np.where(self.data_range_ == 0, 1.0, self.data_range_)
+        return (np.asarray(X, dtype=np.float64) - self.data_min_) / data_range
+
+
+class LabelClasses:
+    """
+    Sustituto ligero de un LabelEncoder ya ajustado (sin importar sklearn)
+    """
+
+    def __init__(self, classes):
+        self.classes_ = np.asarray(classes)
+
+    def transform(self, labels):
+        index = {label: i for i, label in enumerate(self.classes_.tolist())}
+        return np.array([index[label] for label in labels])
+
+    def inverse_transform(self, indices):
+        return self.classes_[np.asarray(indices, dtype=int)]
+
+
+class ModelBundle:
+    """
+    Contenido deserializado de un paquete de modelo
+    """
+
+    def __init__(self, manifest, neural_network, feature_cols, class_labels,
+                 normalization_max_values, label_encoder, scaler, scaler_feature_cols, arrays):
+        self.manifest = manifest
+        self.neural_network = neural_network
+        self.feature_cols = feature_cols
+        self.class_labels = class_labels
+        self.normalization_max_values = normalization_max_values
+        self.label_encoder = label_encoder
+        self.scaler = scaler
+        self.scaler_feature_cols = scaler_feature_cols
+        self.arrays = arrays  # Arrays adicionales guardados con extra_arrays
+
+    @property
+    def version(self):
+        return self.manifest['model_version']
+
+
+def _checksum(arrays):
+    """
+    SHA-256 sobre nombre, dtype, forma y contenido de cada array (en orden de nombre)
+    """
+    digest = hashlib.sha256()
+    for name in sorted(arrays):
+        array = np.ascontiguousarray(arrays[name])
+        digest.update(name.encode('utf-8'))
+        digest.update(array.dtype.str.encode('utf-8'))
+        digest.update(str(array.shape).encode('utf-8'))
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def _check_shapes(neural_network, feature_cols, class_labels):
+    """
+    Comprueba que la red coincide con el orden de características y las etiquetas del paquete
+
+    Raises:
+        ValueError si el número de entradas o de salidas de la red no coincide
+    """
+    if neural_network.input_dim != len(feature_cols):
+        raise ValueError(f"El paquete no es coherente: la red espera {neural_network.input_dim} "
+                         f"entradas pero feature_cols tiene {len(feature_cols)} ({feature_cols})")
+    if neural_network.output_dim != len(class_labels):
+        raise ValueError(f"El paquete no es coherente: la red tiene {neural_network.output_dim} "
+                         f"salidas pero class_labels tiene {len(class_labels)} ({class_labels})")
+
+
+def save_bundle(path, neural_network, feature_cols, class_labels, normalization_max_values,
+                label_encoder=None, scaler=None, scaler_feature_cols=None, extra_arrays=None):
+    """
+    Escribe el paquete de modelo de forma atómica (archivo temporal + os.replace)
+
+    Args:
+        path: ruta del archivo .npz de salida
+        neural_network: NumpyMLP o modelo Keras de capas Dense
+        feature_cols: orden de las características de entrada del modelo
+        class_labels: etiqueta de cada salida de la red, en orden
+        normalization_max_values: divisores usados para normalizar la entrada
+        label_encoder: LabelEncoder (o LabelClasses) ajustado, opcional
+        scaler: MinMaxScaler (o MinMaxStats) ajustado, opcional
+        scaler_feature_cols: columnas sobre las que se ajustó el scaler
+        extra_arrays: dict de arrays adicionales a incluir en el paquete
+
+    Returns:
+        dict con el manifiesto escrito
+
+    Raises:
+        ValueError si la red no coincide con feature_cols o class_labels
+    """
+    if not isinstance(neural_network, NumpyMLP):
+        neural_network = NumpyMLP.from_keras(neural_network)
+    _check_shapes(neural_network, list(feature_cols), list(class_labels))
+
+    arrays = {
+        'n_layers': np.array(len(neural_network.weights)),
+        'activations': np.array(neural_network.activations),
+        'feature_cols': np.array(feature_cols),
+        'class_labels': np.array(class_labels),
+        'normalization_max_values': np.asarray(normalization_max_values, dtype=np.float64)
+    }
+    for i, (w, b) in enumerate(zip(neural_network.weights, neural_network.biases)):
+        arrays[f'W{i}'] = w
+        arrays[f'b{i}'] = b
+
+    if label_encoder is not None:
+        arrays['encoder_classes'] = np.asarray(label_encoder.classes_).astype(str)
+    if scaler is not None:
+        arrays['scaler_data_min'] = np.asarray(scaler.data_min_, dtype=np.float64)
+        arrays['scaler_data_max'] = np.asarray(scaler.data_max_, dtype=np.float64)
+        arrays['scaler_feature_cols'] = np.array(scaler_feature_cols or [])
+    for name, array in (extra_arrays or {}).items():
+        arrays[f'extra_{name}'] = np.asarray(array)
+
+    checksum = _checksum(arrays)
+    created_at = datetime.datetime.now(datetime.timezone.utc)
+    manifest = {
+        'format_version': BUNDLE_FORMAT_VERSION,
+        'model_version': f"{created_at.strftime('%Y%m%dT%H%M%S')}-{checksum[:8]}",
+        'created_at': created_at.isoformat(),
+        'sha256': checksum,
+        'architecture': [neural_network.input_dim] + [w.shape[1] for w in neural_network.weights],
+        'arrays': {name: {'dtype': array.dtype.str, 'shape': list(array.shape)}
+                   for name, array in sorted(arrays.items())}
+    }
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f'.{os.path.basename(path)}.{os.getpid()}.tmp')
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays, **{MANIFEST_KEY: np.array(json.dumps(manifest))})
+    os.replace(tmp_path, path)
+
+    return manifest
+
+
+def read_manifest(path):
+    """
+    Lee solo el manifiesto del paquete, sin cargar los pesos
+    """
+    with np.load(path, allow_pickle=False) as data:
+        return json.loads(str(data[MANIFEST_KEY]))
+
+
+def load_bundle(path, verify=True):
+    """
+    Deserializa el paquete completo en un solo paso
+
+    Raises:
+        ValueError si la versión de formato no es compatible, el checksum no coincide
+        o la red no coincide con feature_cols o class_labels
+    """
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {name: data[name] for name in data.files}
+
+    manifest = json.loads(str(arrays.pop(MANIFEST_KEY)))
+    if manifest.get('format_version') != BUNDLE_FORMAT_VERSION:
+        raise ValueError(f"Versión de paquete no soportada: {manifest.get('format_version')}")
+    if verify and _checksum(arrays) != manifest['sha256']:
+        raise ValueError(f"Checksum inválido en el paquete de modelo: {path}")
+
+    n_layers = int(arrays['n_layers'])
+    neural_network = NumpyMLP(
+        [arrays[f'W{i}'] for i in range(n_layers)],
+        [arrays[f'b{i}'] for i in range(n_layers)],
+        [str(a) for a in arrays['activations']]
+    )
+
+    label_encoder = None
+    if 'encoder_classes' in arrays:
+        label_encoder = LabelClasses(arrays['encoder_classes'])
+
+    scaler = None
+    scaler_feature_cols = None
+    if 'scaler_data_min' in arrays:
+        scaler = MinMaxStats(arrays['scaler_data_min'], arrays['scaler_data_max'])
+        scaler_feature_cols = arrays['scaler_feature_cols'].tolist()
+
+    feature_cols = arrays['feature_cols'].tolist()
+    class_labels = arrays['class_labels'].tolist()
+    _check_shapes(neural_network, feature_cols, class_labels)
+
+    extra = {name[len('extra_'):]: array for name, array in arrays.items() if name.startswith('extra_')}
+
+    return ModelBundle(
+        manifest=manifest,
+        neural_network=neural_network,
+        feature_cols=feature_cols,
+        class_labels=class_labels,
+        normalization_max_values=arrays['normalization_max_values'],
+        label_encoder=label_encoder,
+        scaler=scaler,
+        scaler_feature_cols=scaler_feature_cols,
+        arrays=extra
+    )
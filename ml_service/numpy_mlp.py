@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Backend de inferencia en NumPy puro para la red neuronal densa de ComidaVentura
+
+Permite servir predicciones de la red 9 → 32 → 16 → 8 → 4 sin importar TensorFlow:
+los pesos y sesgos de cada capa Dense se exportan una vez desde model.h5 a un
+archivo .npz y el forward pass se calcula con multiplicaciones de matrices.
+
+Uso:
+    python numpy_mlp.py model.h5 model.npz
+"""
+
+import argparse
+import numpy as np
+
+
+def _relu(x):
+    return np.maximum(x, 0)
+
+
+def _softmax(x):
+    # Restar el máximo por fila para evitar desbordamientos numéricos
+    e = np.exp(x - np.max(x, axis=1, keepdims=True))
+    return e / np.sum(e, axis=1, keepdims=True)
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def _linear(x):
+    return x
+
+
+ACTIVATIONS = {
+    'relu': _relu,
+    'softmax': _softmax,
+    'sigmoid': _sigmoid,
+    'tanh': np.tanh,
+    'linear': _linear
+}
+
+
+class NumpyMLP:
+    """
+    Red neuronal densa (perceptrón multicapa) evaluada con NumPy
+    """
+
+    def __init__(self, weights, biases, activations):
+        """
+        Args:
+            weights: lista de matrices (n_entrada, n_salida), una por capa
+            biases: lista de vectores (n_salida,), una por capa
+            activations: lista con el nombre de la activación de cada capa
+        """
+        if not (len(weights) == len(biases) == len(activations)):
+            raise ValueError("weights, biases y activations deben tener la misma longitud")
+
+        for activation in activations:
+            if activation not in ACTIVATIONS:
+                raise ValueError(f"Activación no soportada: {activation}")
+
+        self.weights = [np.asarray(w, dtype=np.float32) for w in weights]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+        self.activations = list(activations)
+
+    @property
+    def input_dim(self):
+        return self.weights[0].shape[0]
+
+    @property
+    def output_dim(self):
+        return self.weights[-1].shape[1]
+
+    @classmethod
+    def from_keras(cls, keras_model):
+        """
+        Extrae los pesos de un modelo Keras compuesto solo por capas Dense
+        """
+        weights, biases, activations = [], [], []
+
+        for layer in keras_model.layers:
+            layer_weights = layer.get_weights()
+            if not layer_weights:
+                # Capas sin parámetros (p. ej. InputLayer) no afectan el forward pass
+                continue
+
+            config = layer.get_config()
+            if 'units' not in config or len(layer_weights) != 2:
+                raise ValueError(f"Capa no soportada para exportar: {layer.name}")
+
+            weights.append(layer_weights[0])
+            biases.append(layer_weights[1])
+            activations.append(config.get('activation', 'linear'))
+
+        return cls(weights, biases, activations)
+
+    @classmethod
+    def load(cls, npz_path):
+        """
+        Carga los pesos desde un archivo .npz generado por save()
+        """
+        with np.load(npz_path, allow_pickle=False) as data:
+            n_layers = int(data['n_layers'])
+            weights = [data[f'W{i}'] for i in range(n_layers)]
+            biases = [data[f'b{i}'] for i in range(n_layers)]
+            activations = [str(a) for a in data['activations']]
+
+        return cls(weights, biases, activations)
+
+    def save(self, npz_path):
+        """
+        Guarda los pesos y sesgos de cada capa en un archivo .npz
+        """
+        arrays = {'n_layers': np.array(len(self.weights)),
+                  'activations': np.array(self.activations)}
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            arrays[f'W{i}'] = w
+            arrays[f'b{i}'] = b
+
+        np.savez(npz_path, **arrays)
+
+    def predict(self, X, verbose=0):
+        """
+        Calcula las probabilidades de salida para un batch de entradas
+
+        Mantiene la firma de keras Model.predict para poder usarse como reemplazo directo.
+
+        Args:
+            X: array de forma (N, input_dim)
+
+        Returns:
+            np.ndarray de forma (N, output_dim)
+        """
+        output = np.asarray(X, dtype=np.float32)
+        for w, b, activation in zip(self.weights, self.biases, self.activations):
+            output = ACTIVATIONS[activation](output @ w + b)
+
+        return output
+
+
+def export_keras_model(h5_path='model.h5', npz_path='model.npz'):
+    """
+    Exporta las capas Dense de un modelo Keras (.h5) a un archivo .npz
+
+    Es el único paso que necesita TensorFlow; el servicio puede luego servir
+    cargando solo el .npz.
+
+    Returns:
+        NumpyMLP con los pesos exportados
+    """
+    from tensorflow.keras.models import load_model
+
+    keras_model = load_model(h5_path)
+    mlp = NumpyMLP.from_keras(keras_model)
+    mlp.save(npz_path)
+
+    print(f"✅ Pesos exportados de {h5_path} a {npz_path} "
+          f"({' → '.join(str(w.shape[0]) for w in mlp.weights)} → {mlp.output_dim})")
+
+    return mlp
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta model.h5 a un archivo .npz para servir sin TensorFlow")
+    parser.add_argument('h5_path', nargs='?', default='model.h5', help="Modelo Keras de entrada")
+    parser.add_argument('npz_path', nargs='?', default='model.npz', help="Archivo .npz de salida")
+    args = parser.parse_args()
+
+    export_keras_model(args.h5_path, args.npz_path)
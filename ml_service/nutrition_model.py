@@ -1,29 +1,122 @@
-import pandas as pd
+import logging
 import numpy as np
-from sklearn.preprocessing import LabelEncoder, MinMaxScaler
-from sklearn.model_selection import train_test_split
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.svm import SVC
-from sklearn.metrics import classification_report, confusion_matrix
-from tensorflow.keras.layers import Dense
-from tensorflow.keras.models import Sequential, load_model
-from imblearn.over_sampling import SMOTE
-import joblib
 import os
+import time
+from numpy_mlp import NumpyMLP, export_keras_model
+from model_bundle import BUNDLE_FILENAME, LabelClasses, MinMaxStats, load_bundle, save_bundle
+from prediction_cache import PredictionCache
+from knn_index import KNN_INDEX_FILENAME
+from quantization import NEURAL_VARIANTS, QUANTIZATION_REPORT_FILENAME, QuantizedMLP
+from food_aggregation import default_aggregator
+from food_catalog import get_default_catalog, is_id_plate
+from override_rules import OverrideRules
+from ensemble import ENSEMBLE_MODEL_TYPE, combine, default_weights, expand_classes, parse_weights, run_backends
+from metrics import PREDICTED_DISHES, PREDICTION_CACHE_LOOKUPS, time_stage
+
+# Las dependencias pesadas (pandas, sklearn, tensorflow, imblearn, joblib) se importan
+# dentro de los métodos que las usan: servir predicciones no debe pagar su tiempo de carga
+
+# Las trazas por predicción van a nivel DEBUG (ML_LOG_LEVEL=DEBUG para verlas)
+logger = logging.getLogger(__name__)
+
+# Orden de las 9 características que espera el modelo
+EXPECTED_FEATURE_COLS = ['Edad_Niño', 'Total_Calorias', 'Total_Proteinas_g',
+                         'Total_Carbs_g', 'Total_Azucares_g', 'Total_Grasas_g',
+                         'Total_Grasas_Sat_g', 'Total_Fibra_g', 'Total_Sodio_mg']
+
+# Rangos usados para normalizar la entrada de la red neuronal
+# Ajustados para que solo alimentos muy poco saludables sean "Poco Saludable"
+NORMALIZATION_MAX_VALUES = np.array([12, 1200, 80, 150, 60, 80, 25, 20, 1500], dtype=np.float64)
+
+# Etiquetas en el orden de salida del modelo entrenado
+CLASS_LABELS = ['Excelente', 'Bueno', 'Puede Mejorar', 'Poco Saludable']
+
+# model_type aceptados por las predicciones
+MODEL_TYPES = tuple(NEURAL_VARIANTS) + ('knn', 'svm', ENSEMBLE_MODEL_TYPE)
+
+
+def model_type_label(model_type):
+    """
+    model_type para las etiquetas de las métricas: los valores desconocidos que envíe un
+    cliente se agrupan en 'invalid' para no crear una serie nueva por cada uno
+    """
+    return model_type if model_type in MODEL_TYPES else 'invalid'
+
+
+class TrainingCancelled(Exception):
+    """
+    Se lanza cuando un entrenamiento se cancela antes de terminar
+    """
+
+
+def _train_backend(name, model_path, data_dir, epoch_queue=None, cancel_event=None):
+    """
+    Entrena un único modelo dentro de un proceso del pool de entrenamiento
+    
+    Returns:
+        tupla (artefacto entrenado, segundos de entrenamiento); la red neuronal se
+        devuelve como NumpyMLP para no transferir objetos de TensorFlow entre procesos
+    """
+    start = time.perf_counter()
+    model = NutritionModel(model_path=model_path, cache_size=0)
+    y = np.asarray(np.load(os.path.join(data_dir, 'y.npy'), mmap_mode='r'))
+    
+    if name == 'neural':
+        X = np.asarray(np.load(os.path.join(data_dir, 'X_scaled.npy'), mmap_mode='r'))
+        progress_callback = None
+        if epoch_queue is not None:
+            progress_callback = lambda epoch, epochs: epoch_queue.put((epoch, epochs))
+        model.train_neural_network(X, y, progress_callback=progress_callback, cancel_event=cancel_event)
+        artifact = NumpyMLP.from_keras(model.neural_network)
+    else:
+        X = np.asarray(np.load(os.path.join(data_dir, 'X.npy'), mmap_mode='r'))
+        artifact = model.train_knn(X, y) if name == 'knn' else model.train_svm(X, y)
+    
+    return artifact, time.perf_counter() - start
+
+
+def _dump_atomic(obj, path):
+    """
+    Guarda obj con joblib sin que un lector concurrente vea el archivo a medio escribir
+    """
+    import joblib
+    
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(obj, tmp_path)
+    os.replace(tmp_path, path)
+
 
 class NutritionModel:
-    def __init__(self, model_path="models/"):
+    def __init__(self, model_path="models/", cache_size=4096, cache_precision=2, ensemble_weights=None):
         """
         Inicializa el modelo de nutrición
+        
+        Args:
+            model_path: directorio de los modelos entrenados
+            cache_size: máximo de predicciones en la caché LRU (0 la desactiva)
+            cache_precision: decimales a los que se redondean las características en la clave de caché
+            ensemble_weights: pesos del model_type 'ensemble' (dict o "neural=0.5,knn=0.25,svm=0.25");
+                              por defecto ML_ENSEMBLE_WEIGHTS o los de ensemble.py
         """
         self.model_path = model_path
         self.neural_network = None
+        self.quantized_networks = {}  # Variantes 'int8' / 'fp16' de la red neuronal
         self.knn_model = None
+        self.knn_index = None  # Índice espacial del backend KNN (knn_index.pkl)
         self.svm_model = None
         self.label_encoder = None
         self.scaler = None
         self.features_cols = None  # Para almacenar el orden de las columnas
         self.target_col = None     # Para almacenar la columna objetivo
+        self.class_labels = list(CLASS_LABELS)
+        self.normalization_max_values = NORMALIZATION_MAX_VALUES
+        self.model_version = None  # Versión del paquete de modelo cargado
+        self.bundle_mtime = None   # Fecha de modificación del paquete cargado
+        self.prediction_cache = PredictionCache(maxsize=cache_size, precision=cache_precision)
+        self.training_report = None  # Segundos por etapa del último entrenamiento
+        self.override_rules = OverrideRules()  # Reglas de ajuste de override_rules.json
+        self._rule_table = None
+        self.ensemble_weights = parse_weights(ensemble_weights) if ensemble_weights is not None else default_weights()
         
         # Crear directorio de modelos si no existe
         if not os.path.exists(model_path):
@@ -34,6 +127,8 @@ class NutritionModel:
         Carga el dataset desde CSV
         """
         try:
+            import pandas as pd
+            
             df = pd.read_csv(csv_path)
             print(f"Dataset cargado exitosamente: {df.shape[0]} filas, {df.shape[1]} columnas")
             return df
@@ -44,45 +139,30 @@ class NutritionModel:
     def preprocess_data(self, df):
         """
         Preprocesa los datos para el entrenamiento
+        
+        Las etiquetas se codifican y SMOTE se aplica una sola vez; los tres modelos
+        comparten los mismos arrays (la red neuronal usa además su versión escalada).
         """
-        # Crear copias del dataframe para cada modelo
-        df_neural = df.copy()
-        df_knn = df.copy()
-        df_svm = df.copy()
+        from sklearn.preprocessing import LabelEncoder, MinMaxScaler
+        from imblearn.over_sampling import SMOTE
         
         # Eliminar ID_Plato ya que no influye en la clasificación
-        df_neural = df_neural.drop(['ID_Plato'], axis=1)
-        df_knn = df_knn.drop(['ID_Plato'], axis=1)
-        df_svm = df_svm.drop(['ID_Plato'], axis=1)
+        feature_cols = [col for col in df.columns if col not in ['ID_Plato', 'Clasificacion_Nutricional']]
+        X = df[feature_cols].to_numpy(dtype=np.float64)
         
         # Codificar las etiquetas
         self.label_encoder = LabelEncoder()
-        df_neural['Clasificacion_Nutricional'] = self.label_encoder.fit_transform(df_neural['Clasificacion_Nutricional'])
-        df_knn['Clasificacion_Nutricional'] = self.label_encoder.transform(df_knn['Clasificacion_Nutricional'])
-        df_svm['Clasificacion_Nutricional'] = self.label_encoder.transform(df_svm['Clasificacion_Nutricional'])
-        
-        # Separar características y etiquetas
-        X_neural = df_neural.drop(['Clasificacion_Nutricional'], axis=1)
-        y_neural = df_neural['Clasificacion_Nutricional']
-        
-        X_knn = df_knn.drop(['Clasificacion_Nutricional'], axis=1)
-        y_knn = df_knn['Clasificacion_Nutricional']
-        
-        X_svm = df_svm.drop(['Clasificacion_Nutricional'], axis=1)
-        y_svm = df_svm['Clasificacion_Nutricional']
+        y = self.label_encoder.fit_transform(df['Clasificacion_Nutricional'])
         
         # Aplicar SMOTE para balancear las clases (solo si hay suficientes muestras)
         try:
             # Verificar si hay suficientes muestras por clase para aplicar SMOTE
-            class_counts = y_neural.value_counts()
-            min_samples = class_counts.min()
+            min_samples = np.bincount(y).min()
             
             if min_samples >= 2:  # SMOTE necesita al menos 2 muestras por clase
                 smote = SMOTE(random_state=42, k_neighbors=min(5, min_samples-1))
-                X_neural, y_neural = smote.fit_resample(X_neural, y_neural)
-                X_knn, y_knn = smote.fit_resample(X_knn, y_knn)
-                X_svm, y_svm = smote.fit_resample(X_svm, y_svm)
-                print(f"✅ SMOTE aplicado. Muestras balanceadas: {len(X_neural)}")
+                X, y = smote.fit_resample(X, y)
+                print(f"✅ SMOTE aplicado. Muestras balanceadas: {len(X)}")
             else:
                 print(f"⚠️ SMOTE omitido - muy pocas muestras por clase (mín: {min_samples})")
         except Exception as e:
@@ -91,18 +171,66 @@ class NutritionModel:
         
         # Escalar características para la red neuronal
         self.scaler = MinMaxScaler()
-        X_neural_scaled = self.scaler.fit_transform(X_neural)
+        X_scaled = self.scaler.fit_transform(X)
         
         return {
-            'neural': (X_neural_scaled, y_neural),
-            'knn': (X_knn, y_knn),
-            'svm': (X_svm, y_svm)
+            'neural': (X_scaled, y),
+            'knn': (X, y),
+            'svm': (X, y)
         }
     
-    def train_neural_network(self, X, y):
+    @staticmethod
+    def _build_neural_network(input_dim, n_classes):
+        """
+        Crea y compila la red neuronal (misma arquitectura para el entrenamiento en memoria y por bloques)
+        """
+        from tensorflow.keras.layers import Dense
+        from tensorflow.keras.models import Sequential
+        
+        model = Sequential([
+            Dense(units=32, activation='relu', input_shape=(input_dim,)),
+            Dense(units=16, activation='relu'),
+            Dense(units=8, activation='relu'),
+            Dense(units=n_classes, activation='softmax')
+        ])
+        model.compile(
+            optimizer='adam',
+            loss='categorical_crossentropy',
+            metrics=['accuracy']
+        )
+        return model
+    
+    @staticmethod
+    def _epoch_callback(epochs, progress_callback=None, cancel_event=None):
+        """
+        Callback de Keras que informa cada época y detiene el entrenamiento si se cancela
+        """
+        from tensorflow.keras.callbacks import Callback
+        
+        class EpochProgress(Callback):
+            def on_epoch_end(self, epoch, logs=None):
+                if progress_callback is not None:
+                    progress_callback(epoch + 1, epochs)
+                if cancel_event is not None and cancel_event.is_set():
+                    self.model.stop_training = True
+        
+        return EpochProgress()
+    
+    def train_neural_network(self, X, y, epochs=100, progress_callback=None, cancel_event=None):
         """
         Entrena la red neuronal
+        
+        Args:
+            X, y: características escaladas y etiquetas codificadas
+            epochs: número de épocas
+            progress_callback: función opcional (época_completada, total_épocas) llamada al final de cada época
+            cancel_event: threading/multiprocessing.Event opcional; si se activa, el entrenamiento
+                          se detiene al final de la época en curso y se lanza TrainingCancelled
         """
+        import pandas as pd
+        from sklearn.model_selection import train_test_split
+        from sklearn.metrics import classification_report
+        
         # Convertir etiquetas a formato categórico
         y_categorical = pd.get_dummies(y)
         
@@ -111,30 +239,22 @@ class NutritionModel:
             X, y_categorical, test_size=0.3, random_state=42
         )
         
-        # Crear modelo de red neuronal
-        self.neural_network = Sequential([
-            Dense(units=32, activation='relu', input_shape=(X.shape[1],)),
-            Dense(units=16, activation='relu'),
-            Dense(units=8, activation='relu'),
-            Dense(units=y_categorical.shape[1], activation='softmax')
-        ])
-        
-        # Compilar modelo
-        self.neural_network.compile(
-            optimizer='adam',
-            loss='categorical_crossentropy',
-            metrics=['accuracy']
-        )
+        # Crear y compilar el modelo de red neuronal
+        self.neural_network = self._build_neural_network(X.shape[1], y_categorical.shape[1])
         
         # Entrenar modelo
         history = self.neural_network.fit(
             X_train, y_train,
             validation_data=(X_test, y_test),
-            epochs=100,
+            epochs=epochs,
             batch_size=32,
-            verbose=1
+            verbose=1,
+            callbacks=[self._epoch_callback(epochs, progress_callback, cancel_event)]
         )
         
+        if cancel_event is not None and cancel_event.is_set():
+            raise TrainingCancelled("Entrenamiento de la red neuronal cancelado")
+        
         # Evaluar modelo
         y_pred = self.neural_network.predict(X_test)
         y_pred_binary = y_pred > 0.5
@@ -144,13 +264,126 @@ class NutritionModel:
         
         # Guardar modelo
         self.neural_network.save('model.h5')  # Guardar en la raíz como model.h5
+        NumpyMLP.from_keras(self.neural_network).save('model.npz')  # Pesos para servir sin TensorFlow
+        
+        return history
+    
+    def train_neural_network_chunked(self, dataset, stats, epochs=100, batch_size=32,
+                                     progress_callback=None, cancel_event=None):
+        """
+        Entrena la red neuronal leyendo el dataset por bloques en cada época
+        
+        Los batches salen de un generador (training_data.ChunkedDataset.batches) envuelto
+        en un tf.data.Dataset, y el desbalance de clases se compensa con pesos de clase
+        en lugar de SMOTE, así que nunca se materializa el dataset completo.
+        
+        Args:
+            dataset: ChunkedDataset
+            stats: DatasetStats de la primera pasada (escalado, clases y pesos)
+        """
+        import tensorflow as tf
+        
+        n_features, n_classes = len(stats.feature_cols), len(stats.classes)
+        signature = (tf.TensorSpec(shape=(None, n_features), dtype=tf.float32),
+                     tf.TensorSpec(shape=(None, n_classes), dtype=tf.float32))
+        
+        def stream(validation):
+            return tf.data.Dataset.from_generator(
+                lambda: dataset.batches(stats, batch_size=batch_size, validation=validation,
+                                        shuffle=not validation),
+                output_signature=signature
+            ).prefetch(2)
+        
+        self.neural_network = self._build_neural_network(n_features, n_classes)
+        
+        history = self.neural_network.fit(
+            stream(validation=False),
+            validation_data=stream(validation=True) if stats.n_validation else None,
+            epochs=epochs,
+            class_weight=stats.class_weights(),
+            verbose=2,
+            callbacks=[self._epoch_callback(epochs, progress_callback, cancel_event)]
+        )
+        
+        if cancel_event is not None and cancel_event.is_set():
+            raise TrainingCancelled("Entrenamiento de la red neuronal cancelado")
+        
+        # Evaluar modelo acumulando la matriz de confusión bloque a bloque
+        confusion = np.zeros((n_classes, n_classes), dtype=np.int64)
+        for X_batch, y_batch in dataset.batches(stats, batch_size=4096, validation=True, shuffle=False):
+            y_pred = np.argmax(self.neural_network.predict(X_batch, verbose=0), axis=1)
+            np.add.at(confusion, (np.argmax(y_batch, axis=1), y_pred), 1)
+        
+        if confusion.sum():
+            print("Matriz de confusión - Red Neuronal (filas: real, columnas: predicha):")
+            print(f"Clases: {stats.classes.tolist()}")
+            print(confusion)
+            print(f"Exactitud en validación: {np.trace(confusion) / confusion.sum():.3f}")
+        
+        # Guardar modelo
+        self.neural_network.save('model.h5')  # Guardar en la raíz como model.h5
+        NumpyMLP.from_keras(self.neural_network).save('model.npz')  # Pesos para servir sin TensorFlow
         
         return history
     
+    def quantize_neural_network(self, X, y=None):
+        """
+        Genera las variantes int8 y float16 de la red neuronal y su informe de precisión
+        
+        Args:
+            X: entradas de entrenamiento ya escaladas (calibran las escalas int8)
+            y: etiquetas codificadas opcionales (para comparar la exactitud)
+        
+        El informe (coincidencia con float32, exactitud, diferencia de probabilidades y
+        tamaño de los parámetros) se guarda en models/quantization_report.json.
+        """
+        import json
+        from quantization import as_numpy_mlp, quantization_report, quantize_float16, quantize_int8
+        
+        base = as_numpy_mlp(self.neural_network)
+        self.quantized_networks = {
+            'int8': quantize_int8(base, X),
+            'fp16': quantize_float16(base)
+        }
+        
+        report = quantization_report(base, self.quantized_networks, X, y)
+        report_path = os.path.join(self.model_path, QUANTIZATION_REPORT_FILENAME)
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        
+        print("📉 Cuantización de la red neuronal (comparada con float32):")
+        for kind in ('int8', 'fp16'):
+            entry = report[kind]
+            print(f"   {kind:<5} coincidencia {entry['agreement_with_float32']:.4f}, "
+                  f"{entry['parameter_bytes']} bytes ({entry['compression']:.1f}x menos)")
+        
+        return report
+    
+    def _neural_variant(self, model_type):
+        """
+        Red a usar para un model_type 'neural', 'neural_int8' o 'neural_fp16'
+        """
+        if self.neural_network is None:
+            raise ValueError("Red neuronal no está cargada")
+        
+        kind = NEURAL_VARIANTS[model_type]
+        if kind is None:
+            return self.neural_network
+        
+        network = self.quantized_networks.get(kind)
+        if network is None:
+            raise ValueError(f"La variante {model_type} no está disponible; reentrena los modelos para generarla")
+        return network
+    
     def train_knn(self, X, y):
         """
         Entrena el modelo KNN
         """
+        from sklearn.model_selection import train_test_split
+        from sklearn.neighbors import KNeighborsClassifier
+        from sklearn.metrics import classification_report
+        from knn_index import KNNIndex
+        
         X_train, X_test, y_train, y_test = train_test_split(
             X, y, test_size=0.3, random_state=42
         )
@@ -164,14 +397,19 @@ class NutritionModel:
         self.knn_model = KNeighborsClassifier(n_neighbors=n_neighbors)
         self.knn_model.fit(X_train, y_train)
         
+        # Índice espacial para consultar por batches sin recorrer todas las muestras
+        self.knn_index = KNNIndex(X_train, y_train, n_neighbors=n_neighbors)
+        print(f"📊 KNN: índice {self.knn_index.algorithm} construido")
+        
         # Evaluar modelo
-        y_pred = self.knn_model.predict(X_test)
+        y_pred = self.knn_index.predict(X_test)
         
         print("Reporte de clasificación - KNN:")
         print(classification_report(y_test, y_pred))
         
-        # Guardar modelo
-        joblib.dump(self.knn_model, os.path.join(self.model_path, 'knn_model.pkl'))
+        # Guardar modelo e índice
+        _dump_atomic(self.knn_model, os.path.join(self.model_path, 'knn_model.pkl'))
+        _dump_atomic(self.knn_index, os.path.join(self.model_path, KNN_INDEX_FILENAME))
         
         return self.knn_model
     
@@ -179,11 +417,16 @@ class NutritionModel:
         """
         Entrena el modelo SVM
         """
+        from sklearn.model_selection import train_test_split
+        from sklearn.svm import SVC
+        from sklearn.metrics import classification_report
+        
         X_train, X_test, y_train, y_test = train_test_split(
             X, y, test_size=0.3, random_state=42
         )
         
-        self.svm_model = SVC(kernel='rbf', random_state=42)
+        # probability=True: calibración de Platt para tener probabilidades por clase (confianza y ensemble)
+        self.svm_model = SVC(kernel='rbf', probability=True, random_state=42)
         self.svm_model.fit(X_train, y_train)
         
         # Evaluar modelo
@@ -193,55 +436,342 @@ class NutritionModel:
         print(classification_report(y_test, y_pred))
         
         # Guardar modelo
-        joblib.dump(self.svm_model, os.path.join(self.model_path, 'svm_model.pkl'))
+        _dump_atomic(self.svm_model, os.path.join(self.model_path, 'svm_model.pkl'))
         
         return self.svm_model
     
-    def train_all_models(self, csv_path='comidaventura_dataset.csv'):
+    def train_all_models(self, csv_path='comidaventura_dataset.csv', progress_callback=None,
+                         cancel_event=None, parallel=True, chunksize=None):
         """
         Entrena todos los modelos
+        
+        Los datos se preprocesan y balancean una sola vez; con parallel=True la red neuronal,
+        KNN y SVM se entrenan a la vez en un pool de procesos que lee los mismos arrays
+        (memoria compartida vía archivos .npy mapeados), de modo que el tiempo total se
+        acerca al del modelo más lento. El tiempo de cada etapa queda en self.training_report.
+        
+        Args:
+            csv_path: dataset de entrenamiento
+            progress_callback: función opcional (progreso 0-100, mensaje) para informar el avance
+            cancel_event: Event opcional; se comprueba en cada época y entre etapas
+            parallel: entrenar los tres modelos en procesos separados
+            chunksize: si se indica, leer el dataset por bloques de ese número de filas
+                       (datasets que no caben en memoria): la red neuronal se entrena con un
+                       generador y pesos de clase, y KNN/SVM con una muestra uniforme acotada;
+                       en este modo los modelos se entrenan de forma secuencial
+        
+        Raises:
+            TrainingCancelled si cancel_event se activa antes de terminar
         """
-        # Cargar datos
-        df = self.load_data(csv_path)
-        if df is None:
-            return False
+        def report(progress, message):
+            if progress_callback is not None:
+                progress_callback(progress, message)
         
-        # Preprocesar datos
-        data = self.preprocess_data(df)
+        def check_cancelled():
+            if cancel_event is not None and cancel_event.is_set():
+                raise TrainingCancelled("Entrenamiento cancelado")
         
-        # Entrenar modelos
-        print("Entrenando Red Neuronal...")
-        self.train_neural_network(data['neural'][0], data['neural'][1])
+        stage_times = {}
+        total_start = time.perf_counter()
         
-        print("\nEntrenando KNN...")
-        self.train_knn(data['knn'][0], data['knn'][1])
+        # La red neuronal ocupa del 10% al 90% del progreso
+        def report_epoch(epoch, epochs):
+            report(10 + int(80 * epoch / epochs), f'Entrenando red neuronal (época {epoch}/{epochs})...')
         
-        print("\nEntrenando SVM...")
-        self.train_svm(data['svm'][0], data['svm'][1])
+        if chunksize:
+            # Primera pasada por bloques: escalado, clases y muestra para KNN/SVM
+            from training_data import ChunkedDataset
+            
+            report(5, 'Analizando dataset por bloques...')
+            stage_start = time.perf_counter()
+            try:
+                dataset = ChunkedDataset(csv_path, chunksize=chunksize)
+                stats = dataset.scan()
+            except (OSError, ValueError) as e:
+                print(f"Error al cargar el dataset: {e}")
+                return False
+            print(f"Dataset analizado por bloques: {stats.n_rows} filas, {len(stats.feature_cols)} características, "
+                  f"muestra de {len(stats.sample_X)} filas para KNN/SVM")
+            self.label_encoder = LabelClasses(stats.classes)
+            self.scaler = MinMaxStats(stats.data_min, stats.data_max)
+            feature_cols = stats.feature_cols
+            calibration = (self.scaler.transform(stats.sample_X), stats.sample_y)
+            stage_times['scan'] = time.perf_counter() - stage_start
+            check_cancelled()
+            
+            print("Entrenando Red Neuronal por bloques...")
+            stage_start = time.perf_counter()
+            self.train_neural_network_chunked(dataset, stats, progress_callback=report_epoch,
+                                              cancel_event=cancel_event)
+            stage_times['neural'] = time.perf_counter() - stage_start
+            check_cancelled()
+            
+            # KNN y SVM se entrenan con la muestra uniforme, que sí cabe en memoria
+            print("\nEntrenando KNN...")
+            stage_start = time.perf_counter()
+            self.train_knn(stats.sample_X, stats.sample_y)
+            stage_times['knn'] = time.perf_counter() - stage_start
+            check_cancelled()
+            
+            print("\nEntrenando SVM...")
+            stage_start = time.perf_counter()
+            self.train_svm(stats.sample_X, stats.sample_y)
+            stage_times['svm'] = time.perf_counter() - stage_start
+        else:
+            # Cargar datos
+            report(5, 'Cargando datos...')
+            stage_start = time.perf_counter()
+            df = self.load_data(csv_path)
+            if df is None:
+                return False
+            stage_times['load'] = time.perf_counter() - stage_start
+            feature_cols = [col for col in df.columns if col not in ['ID_Plato', 'Clasificacion_Nutricional']]
+            
+            # Preprocesar datos
+            report(10, 'Preprocesando datos...')
+            stage_start = time.perf_counter()
+            data = self.preprocess_data(df)
+            del df
+            calibration = data['neural']
+            stage_times['preprocess'] = time.perf_counter() - stage_start
+            check_cancelled()
+            
+            if parallel:
+                print("Entrenando Red Neuronal, KNN y SVM en paralelo...")
+                report(10, 'Entrenando modelos en paralelo...')
+                artifacts, model_times = self._train_models_parallel(data, report_epoch, cancel_event)
+                self.neural_network = artifacts['neural']
+                self.knn_model = artifacts['knn']
+                self.knn_index = None  # El proceso de KNN guardó el índice nuevo; se carga al usarse
+                self.svm_model = artifacts['svm']
+                stage_times.update(model_times)
+            else:
+                print("Entrenando Red Neuronal...")
+                stage_start = time.perf_counter()
+                self.train_neural_network(data['neural'][0], data['neural'][1],
+                                          progress_callback=report_epoch, cancel_event=cancel_event)
+                stage_times['neural'] = time.perf_counter() - stage_start
+                check_cancelled()
+            
+                print("\nEntrenando KNN...")
+                stage_start = time.perf_counter()
+                self.train_knn(data['knn'][0], data['knn'][1])
+                stage_times['knn'] = time.perf_counter() - stage_start
+                check_cancelled()
+            
+                print("\nEntrenando SVM...")
+                stage_start = time.perf_counter()
+                self.train_svm(data['svm'][0], data['svm'][1])
+                stage_times['svm'] = time.perf_counter() - stage_start
+        check_cancelled()
         
-        # Guardar preprocessors
-        joblib.dump(self.label_encoder, os.path.join(self.model_path, 'label_encoder.pkl'))
-        joblib.dump(self.scaler, os.path.join(self.model_path, 'scaler.pkl'))
+        # Los pesos en memoria cambiaron: descartar predicciones anteriores
+        self.prediction_cache.clear()
+        
+        # Variantes int8/float16 de la red, calibradas y evaluadas con los datos de entrenamiento
+        report(92, 'Cuantizando red neuronal...')
+        stage_start = time.perf_counter()
+        self.quantize_neural_network(*calibration)
+        stage_times['quantize'] = time.perf_counter() - stage_start
+        
+        # Guardar pesos y preprocessors en un único paquete versionado
+        report(95, 'Guardando paquete de modelo...')
+        stage_start = time.perf_counter()
+        self.save_bundle(feature_cols=feature_cols, scaler_feature_cols=feature_cols)
+        stage_times['bundle'] = time.perf_counter() - stage_start
+        stage_times['total'] = time.perf_counter() - total_start
+        self.training_report = stage_times
+        
+        print("\n⏱️  Tiempo por etapa:")
+        for stage, seconds in stage_times.items():
+            print(f"   {stage:<12}{seconds:>9.2f} s")
         
         print("\nTodos los modelos entrenados y guardados exitosamente!")
         return True
     
+    def _train_models_parallel(self, data, report_epoch, cancel_event=None):
+        """
+        Entrena la red neuronal, KNN y SVM a la vez en un pool de procesos
+        
+        Returns:
+            tupla (dict de artefactos entrenados por modelo, dict de segundos por modelo)
+        
+        Raises:
+            la primera excepción real de un modelo; TrainingCancelled solo si la
+            cancelación vino de cancel_event y no de un fallo en otro modelo
+        """
+        import multiprocessing
+        import tempfile
+        from concurrent.futures import ProcessPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+        
+        context = multiprocessing.get_context('spawn')
+        artifacts, model_times = {}, {}
+        error = None
+        
+        with tempfile.TemporaryDirectory(prefix='comidaventura_train_') as data_dir, \
+                context.Manager() as manager:
+            # Guardar los arrays una vez; cada proceso los mapea en memoria en lugar de recibir una copia
+            np.save(os.path.join(data_dir, 'X.npy'), data['knn'][0])
+            np.save(os.path.join(data_dir, 'X_scaled.npy'), data['neural'][0])
+            np.save(os.path.join(data_dir, 'y.npy'), data['knn'][1])
+            
+            epoch_queue = manager.Queue()
+            pool_cancel = manager.Event()
+            
+            with ProcessPoolExecutor(max_workers=3, mp_context=context) as pool:
+                names = {
+                    pool.submit(_train_backend, name, self.model_path, data_dir, epoch_queue, pool_cancel): name
+                    for name in ('neural', 'knn', 'svm')
+                }
+                
+                pending = set(names)
+                while pending:
+                    try:
+                        for future in as_completed(pending, timeout=0.2):
+                            pending.discard(future)
+                            if future.cancelled():
+                                continue
+                            
+                            exception = future.exception()
+                            if exception is None:
+                                artifacts[names[future]], model_times[names[future]] = future.result()
+                                continue
+                            
+                            # La red neuronal lanza TrainingCancelled cuando se detiene por el fallo
+                            # de otro modelo: se conserva el error que provocó la cancelación
+                            if error is None or (isinstance(error, TrainingCancelled)
+                                                 and not isinstance(exception, TrainingCancelled)):
+                                error = exception
+                            pool_cancel.set()
+                            for other in pending:
+                                other.cancel()
+                    except FuturesTimeout:
+                        pass
+                    
+                    while not epoch_queue.empty():
+                        report_epoch(*epoch_queue.get())
+                    
+                    if cancel_event is not None and cancel_event.is_set():
+                        pool_cancel.set()
+        
+        if error is not None:
+            raise error
+        return artifacts, model_times
+    
+    def save_bundle(self, feature_cols=None, scaler_feature_cols=None):
+        """
+        Guarda la red neuronal y los preprocesadores en el paquete versionado de models/
+        
+        Args:
+            feature_cols: columnas con las que se entrenó la red, en orden; por defecto
+                EXPECTED_FEATURE_COLS (la entrada de model.h5/model.npz al servir)
+            scaler_feature_cols: columnas sobre las que se ajustó el scaler
+        
+        Returns:
+            dict con el manifiesto del paquete
+        """
+        feature_cols = list(feature_cols or EXPECTED_FEATURE_COLS)
+        if feature_cols != EXPECTED_FEATURE_COLS:
+            print(f"⚠️ La red se entrenó con {feature_cols}; al servir se esperan {EXPECTED_FEATURE_COLS}, "
+                  f"así que el paquete no podrá cargarse para predecir")
+        
+        bundle_path = os.path.join(self.model_path, BUNDLE_FILENAME)
+        manifest = save_bundle(
+            bundle_path,
+            self.neural_network,
+            feature_cols=feature_cols,
+            class_labels=self.class_labels,
+            normalization_max_values=self.normalization_max_values,
+            label_encoder=self.label_encoder,
+            scaler=self.scaler,
+            scaler_feature_cols=scaler_feature_cols or self.features_cols,
+            extra_arrays={name: array
+                          for network in self.quantized_networks.values()
+                          for name, array in network.to_arrays().items()}
+        )
+        self.model_version = manifest['model_version']
+        self.bundle_mtime = os.path.getmtime(bundle_path)
+        print(f"✅ Paquete de modelo guardado en {bundle_path} (versión {self.model_version})")
+        
+        return manifest
+    
+    def _load_bundle(self, bundle_path):
+        """
+        Carga pesos, preprocesadores y metadatos desde el paquete en un solo paso
+        """
+        bundle = load_bundle(bundle_path)
+        
+        # load_bundle ya comprobó que la red coincide con feature_cols; al servir
+        # la entrada se construye siempre con EXPECTED_FEATURE_COLS
+        if bundle.feature_cols != EXPECTED_FEATURE_COLS:
+            raise ValueError(f"El paquete se entrenó con otras características: {bundle.feature_cols} "
+                             f"(se esperan {EXPECTED_FEATURE_COLS})")
+        
+        self.neural_network = bundle.neural_network
+        self.quantized_networks = {}
+        for kind in ('int8', 'fp16'):
+            network = QuantizedMLP.from_arrays(kind, bundle.arrays, bundle.neural_network)
+            if network is not None:
+                self.quantized_networks[kind] = network
+        self.class_labels = bundle.class_labels
+        self.normalization_max_values = bundle.normalization_max_values
+        self.label_encoder = bundle.label_encoder
+        self.scaler = bundle.scaler
+        self.features_cols = bundle.scaler_feature_cols
+        self.target_col = 'Clasificacion_Nutricional'
+        self.model_version = bundle.version
+        self.bundle_mtime = os.path.getmtime(bundle_path)
+        
+        return bundle
+    
     def load_models(self):
         """
-        Carga los modelos entrenados usando la lógica del ejemplo proporcionado
+        Carga los modelos entrenados
+        
+        Usa el paquete versionado de models/ si existe. Si no, carga model.npz/model.h5,
+        ajusta los preprocesadores con el dataset original y escribe el paquete para que
+        los siguientes arranques no necesiten leer el CSV.
         """
         try:
             print("🔄 Cargando modelo y preparando preprocesadores...")
             
+            # Las predicciones guardadas corresponden a los pesos anteriores
+            self.prediction_cache.clear()
+            
+            # KNN y SVM se cargan la primera vez que se piden (ver _ensure_backend),
+            # así que se descartan las instancias anteriores para releer los archivos nuevos
+            self.knn_model = None
+            self.knn_index = None
+            self.svm_model = None
+            self.quantized_networks = {}
+            
+            bundle_path = os.path.join(self.model_path, BUNDLE_FILENAME)
+            if os.path.exists(bundle_path):
+                try:
+                    self._load_bundle(bundle_path)
+                    print(f"✅ Paquete de modelo cargado desde: {bundle_path} (versión {self.model_version})")
+                    print(f"Clases de salida: {self.class_labels}")
+                    return True
+                except Exception as e:
+                    print(f"⚠️ No se pudo cargar el paquete de modelo ({e}), reconstruyéndolo...")
+            
             # Intentar cargar el modelo neural network desde model.h5
             model_path = os.path.join(self.model_path, '../model.h5')  # El modelo está en la raíz de ml_service
             if not os.path.exists(model_path):
                 # Si no está ahí, intentar en la ruta directa
                 model_path = 'model.h5'
             
-            if os.path.exists(model_path):
-                self.neural_network = load_model(model_path)
-                print(f"✅ Modelo neural cargado correctamente desde: {model_path}")
+            # Los pesos exportados a .npz permiten servir sin TensorFlow
+            npz_path = os.path.splitext(model_path)[0] + '.npz'
+            
+            if os.path.exists(npz_path) or os.path.exists(model_path):
+                if os.path.exists(npz_path):
+                    self.neural_network = NumpyMLP.load(npz_path)
+                    print(f"✅ Modelo neural (NumPy) cargado correctamente desde: {npz_path}")
+                else:
+                    # Exportar una sola vez; los siguientes arranques usan el .npz
+                    self.neural_network = export_keras_model(model_path, npz_path)
+                    print(f"✅ Modelo neural cargado correctamente desde: {model_path}")
                 
                 # Cargar el dataset original para ajustar los preprocesadores
                 df_original = self.load_data()
@@ -253,6 +783,8 @@ class NutritionModel:
                 self.features_cols = [col for col in df_original.columns if col not in ['ID_Plato', 'Clasificacion_Nutricional']]
                 self.target_col = 'Clasificacion_Nutricional'
                 
+                from sklearn.preprocessing import LabelEncoder, MinMaxScaler
+                
                 # Crear y ajustar el LabelEncoder para decodificar las predicciones
                 self.label_encoder = LabelEncoder()
                 self.label_encoder.fit(df_original[self.target_col])
@@ -265,19 +797,11 @@ class NutritionModel:
                 print(f"Clases decodificadas: {list(self.label_encoder.classes_)}")
                 print(f"Características esperadas: {self.features_cols}")
                 
-                # Intentar cargar otros modelos si existen
+                # Guardar el paquete para no volver a leer el CSV al servir
                 try:
-                    knn_path = os.path.join(self.model_path, 'knn_model.pkl')
-                    if os.path.exists(knn_path):
-                        self.knn_model = joblib.load(knn_path)
-                        print("✅ Modelo KNN cargado")
-                        
-                    svm_path = os.path.join(self.model_path, 'svm_model.pkl')
-                    if os.path.exists(svm_path):
-                        self.svm_model = joblib.load(svm_path)
-                        print("✅ Modelo SVM cargado")
+                    self.save_bundle()
                 except Exception as e:
-                    print(f"⚠️ Advertencia al cargar KNN/SVM: {e}")
+                    print(f"⚠️ No se pudo guardar el paquete de modelo: {e}")
                 
                 return True
             else:
@@ -288,134 +812,326 @@ class NutritionModel:
             print(f"❌ Error al cargar modelos: {e}")
             return False
     
-    def predict_dish_health(self, nutrition_data, model_type='neural'):
+    def _ensure_backend(self, model_type):
         """
-        Predice la clasificación nutricional usando la lógica del ejemplo proporcionado
+        Carga bajo demanda el backend de inferencia de model_type (KNN/SVM)
+        
+        La red neuronal se carga en load_models; KNN y SVM (que importan sklearn)
+        solo se deserializan la primera vez que se usan.
+        """
+        backend_files = {
+            # KNN: primero el índice espacial; knn_model.pkl queda para modelos anteriores al índice
+            'knn': (('knn_index', KNN_INDEX_FILENAME), ('knn_model', 'knn_model.pkl')),
+            'svm': (('svm_model', 'svm_model.pkl'),)
+        }
+        if model_type not in backend_files:
+            return
+        
+        # En orden de preferencia: se usa el primero que ya esté en memoria o exista en disco
+        for attribute, filename in backend_files[model_type]:
+            if getattr(self, attribute) is not None:
+                return
+            
+            path = os.path.join(self.model_path, filename)
+            if os.path.exists(path):
+                import joblib
+                
+                setattr(self, attribute, joblib.load(path))
+                print(f"✅ Modelo {model_type.upper()} cargado ({filename})")
+                return
+    
+    def build_feature_matrix(self, nutrition_list):
+        """
+        Construye la matriz (N, 9) de características que espera el modelo
         
         Args:
-            nutrition_data: dict con keys que coinciden con el dataset CSV:
-                          Calorias, Proteinas, Carbohidratos, Grasas, Fibra, Azucar
-            model_type: 'neural', 'knn', o 'svm'
+            nutrition_list: lista de dicts con keys del dataset CSV:
+                            Calorias, Proteinas, Carbohidratos, Grasas, Fibra, Azucar
         
         Returns:
-            dict con predicción y confianza
+            np.ndarray de forma (N, 9) en el orden de EXPECTED_FEATURE_COLS
         """
-        try:
-            print(f"📊 Datos de entrada al modelo: {nutrition_data}")
-            
-            # Convertir datos del formato CSV a las 9 características que espera el modelo
-            # El modelo espera: ['Edad_Niño', 'Total_Calorias', 'Total_Proteinas_g', 
-            #                    'Total_Carbs_g', 'Total_Azucares_g', 'Total_Grasas_g',
-            #                    'Total_Grasas_Sat_g', 'Total_Fibra_g', 'Total_Sodio_mg']
-            
-            model_data = {
-                'Edad_Niño': 5,  # Valor por defecto, podríamos hacer esto configurable
-                'Total_Calorias': nutrition_data.get('Calorias', 0),
-                'Total_Proteinas_g': nutrition_data.get('Proteinas', 0),
-                'Total_Carbs_g': nutrition_data.get('Carbohidratos', 0),
-                'Total_Azucares_g': nutrition_data.get('Azucar', 0),
-                'Total_Grasas_g': nutrition_data.get('Grasas', 0),
-                'Total_Grasas_Sat_g': nutrition_data.get('Grasas', 0) * 0.3,  # Aproximación: 30% de grasas saturadas
-                'Total_Fibra_g': nutrition_data.get('Fibra', 0),
-                'Total_Sodio_mg': 300  # Valor por defecto, podríamos estimarlo basado en otros valores
-            }
-            
-            print(f"📊 Datos convertidos para el modelo: {model_data}")
-            
-            # Crear DataFrame con los datos de prueba en el formato correcto para el modelo
-            datos_prueba = pd.DataFrame([model_data])
-            
-            # Definir el orden de columnas que espera el modelo
-            expected_cols_for_model = ['Edad_Niño', 'Total_Calorias', 'Total_Proteinas_g', 
-                                     'Total_Carbs_g', 'Total_Azucares_g', 'Total_Grasas_g',
-                                     'Total_Grasas_Sat_g', 'Total_Fibra_g', 'Total_Sodio_mg']
-            
-            # Reordenar las columnas según el orden que espera el modelo
-            datos_prueba = datos_prueba.reindex(columns=expected_cols_for_model, fill_value=0)
-            
-            print(f"📊 DataFrame de prueba (9 características):\n{datos_prueba}")
+        return self.totals_to_features(default_aggregator.to_matrix(nutrition_list))
+    
+    @staticmethod
+    def totals_to_features(totals):
+        """
+        Convierte una matriz (N, 6) de totales en el orden de NUTRIENT_KEYS
+        (Calorias, Proteinas, Carbohidratos, Grasas, Fibra, Azucar) en la matriz (N, 9)
+        de características, sin recorrer los platos uno a uno
+        """
+        totals = np.asarray(totals, dtype=np.float64).reshape(-1, 6)
+        calorias, proteinas, carbohidratos, grasas, fibra, azucar = totals.T
+        
+        features = np.empty((len(totals), len(EXPECTED_FEATURE_COLS)), dtype=np.float64)
+        features[:, 0] = 5  # Edad_Niño: valor por defecto, podríamos hacer esto configurable
+        features[:, 1] = calorias
+        features[:, 2] = proteinas
+        features[:, 3] = carbohidratos
+        features[:, 4] = azucar
+        features[:, 5] = grasas
+        features[:, 6] = grasas * 0.3  # Aproximación: 30% de grasas saturadas
+        features[:, 7] = fibra
+        features[:, 8] = 300  # Total_Sodio_mg: valor por defecto, podríamos estimarlo basado en otros valores
+        
+        return features
+    
+    def _current_rule_table(self):
+        """
+        Tabla de reglas compilada; si el archivo de reglas cambió, invalida la caché
+        (las predicciones guardadas ya tienen aplicadas las reglas anteriores)
+        """
+        table = self.override_rules.table(EXPECTED_FEATURE_COLS, self.class_labels)
+        if table is not self._rule_table:
+            if self._rule_table is not None:
+                self.prediction_cache.clear()
+            self._rule_table = table
+        return table
+    
+    def _apply_override_rules(self, features, label_indices, confidences):
+        """
+        Aplica las reglas de ajuste de clasificación (override_rules.json) sobre todo el batch
+        
+        Returns:
+            tupla (label_indices, confidences) ajustadas
+        """
+        return self._current_rule_table().apply(features, label_indices, confidences)
+    
+    def _uses_override_rules(self, model_type):
+        return model_type in NEURAL_VARIANTS or model_type == ENSEMBLE_MODEL_TYPE
+    
+    def _svm_has_probabilities(self):
+        # Los SVM entrenados antes de probability=True solo tienen predict
+        return getattr(self.svm_model, 'probability', False)
+    
+    def _class_probabilities(self, features, backend):
+        """
+        Probabilidades (N, n_clases) de un backend, con las columnas en el orden de class_labels
+        """
+        n_classes = len(self.class_labels)
+        
+        if backend in NEURAL_VARIANTS:
+            network = self._neural_variant(backend)
+            datos_normalizados = np.clip(features / self.normalization_max_values, 0, 1)
+            return np.asarray(network.predict(datos_normalizados, verbose=0), dtype=np.float64)
+        
+        elif backend == 'knn':
+            model = self.knn_index if self.knn_index is not None else self.knn_model
+            if model is None:
+                raise ValueError("Modelo KNN no está cargado")
+            # Fracción de los vecinos que votan por cada clase
+            return expand_classes(model.predict_proba(features), model.classes_, n_classes)
+        
+        elif backend == 'svm':
+            if self.svm_model is None:
+                raise ValueError("Modelo SVM no está cargado")
+            if self._svm_has_probabilities():
+                return expand_classes(self.svm_model.predict_proba(features), self.svm_model.classes_, n_classes)
+            # SVM sin calibrar: voto duro (reentrena para tener probabilidades)
+            label_indices = np.asarray(self.svm_model.predict(features), dtype=int)
+            return np.eye(n_classes, dtype=np.float64)[label_indices]
+        
+        raise ValueError("Tipo de modelo no válido")
+    
+    def _predict_ensemble(self, features):
+        """
+        Pasa la misma matriz por los backends del ensemble en paralelo y combina sus probabilidades
+        """
+        backends = list(self.ensemble_weights)
+        for backend in backends:
+            self._ensure_backend(backend)
+        
+        with time_stage('forward', ENSEMBLE_MODEL_TYPE):
+            probabilities = run_backends(lambda backend: self._class_probabilities(features, backend), backends)
+        
+        with time_stage('combine', ENSEMBLE_MODEL_TYPE):
+            label_indices, confidences, combined = combine(probabilities, self.ensemble_weights)
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Probabilidades (ensemble %s): %s", self.ensemble_weights, combined.tolist())
+        
+        with time_stage('rules', ENSEMBLE_MODEL_TYPE):
+            return self._apply_override_rules(features, label_indices, confidences)
+    
+    def _predict_matrix(self, features, model_type='neural'):
+        """
+        Ejecuta un único forward pass sobre la matriz de características
+        
+        Returns:
+            tupla (label_indices, confidences) como arrays de NumPy
+        """
+        if model_type == ENSEMBLE_MODEL_TYPE:
+            return self._predict_ensemble(features)
+        
+        self._ensure_backend(model_type)
+        
+        if model_type in NEURAL_VARIANTS:
+            network = self._neural_variant(model_type)
             
-            if model_type == 'neural':
-                if self.neural_network is None:
-                    raise ValueError("Red neuronal no está cargada")
-                
+            with time_stage('forward', model_type):
                 # Normalizar los datos usando rangos más amplios para clasificaciones más realistas
-                # Ajustados para que solo alimentos muy poco saludables sean "Poco Saludable"
-                max_values = np.array([12, 1200, 80, 150, 60, 80, 25, 20, 1500])  # Rangos más amplios
-                datos_normalizados = np.clip(datos_prueba.values / max_values, 0, 1)
-                
-                print(f"📊 Datos normalizados (9 características): {datos_normalizados}")
-                
-                # Realizar la predicción
-                predicciones_prob = self.neural_network.predict(datos_normalizados, verbose=0)
-                print(f"📊 Probabilidades de predicción: {predicciones_prob}")
-                
-                # Obtener la clase con la probabilidad más alta
-                predicted_class_index = np.argmax(predicciones_prob, axis=1)[0]
-                confidence = np.max(predicciones_prob)
-                
-                # Mapear índices a etiquetas (basado en el modelo entrenado)
-                # Asumiendo que las clases son: ['Excelente', 'Bueno', 'Puede Mejorar', 'Poco Saludable']
-                class_labels = ['Excelente', 'Bueno', 'Puede Mejorar', 'Poco Saludable']
-                predicted_label = class_labels[predicted_class_index]
+                datos_normalizados = np.clip(features / self.normalization_max_values, 0, 1)
                 
-                # Ajuste especial: clasificar como "Poco Saludable" solo si realmente es muy poco saludable
-                # Criterios más estrictos para "Poco Saludable"
-                calorias = model_data['Total_Calorias']
-                grasas = model_data['Total_Grasas_g']
-                grasas_sat = model_data['Total_Grasas_Sat_g']
-                proteinas = model_data['Total_Proteinas_g']
-                azucar = model_data['Total_Azucares_g']
+                # Realizar la predicción de todo el batch en una sola llamada
+                predicciones_prob = network.predict(datos_normalizados, verbose=0)
                 
-                # Solo es "Poco Saludable" si cumple criterios más estrictos (como papas fritas)
-                if (calorias > 600 and grasas > 25) or \
-                   (calorias > 500 and grasas > 30) or \
-                   (grasas > 30 and grasas_sat > 8) or \
-                   (azucar > 40 and calorias > 400) or \
-                   (calorias > 400 and grasas > 20 and proteinas < 10) or \
-                   (grasas > 25 and proteinas < 5):  # Criterio específico para papas fritas (alta grasa, poca proteína)
-                    predicted_label = 'Poco Saludable'
-                    confidence = max(confidence, 0.85)  # Alta confianza para casos obvios
-                # Si tenía "Poco Saludable" pero no cumple criterios estrictos, cambiar a "Puede Mejorar"
-                elif predicted_label == 'Poco Saludable':
-                    predicted_label = 'Puede Mejorar'
-                # Promover a "Excelente" si tiene buena proteína, baja grasa y pocas calorías
-                elif proteinas > 30 and grasas < 15 and calorias < 500:
-                    predicted_label = 'Excelente'
-                    confidence = max(confidence, 0.80)
-                # Promover a "Bueno" si es razonablemente saludable
-                elif proteinas > 20 and grasas < 25 and calorias < 650:
-                    if predicted_label == 'Puede Mejorar':
-                        predicted_label = 'Bueno'
+                label_indices = np.argmax(predicciones_prob, axis=1)
+                confidences = np.max(predicciones_prob, axis=1).astype(np.float64)
+            
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Probabilidades (%s): %s", model_type, predicciones_prob.tolist())
+            
+            with time_stage('rules', model_type):
+                return self._apply_override_rules(features, label_indices, confidences)
+        
+        elif model_type == 'knn':
+            with time_stage('forward', model_type):
+                if self.knn_index is not None:
+                    # Consulta por batches al índice; la confianza es la fracción de vecinos que votan por la clase
+                    label_indices, confidences = self.knn_index.query(features)
+                    return np.asarray(label_indices, dtype=int), confidences
                 
-            elif model_type == 'knn':
                 if self.knn_model is None:
                     raise ValueError("Modelo KNN no está cargado")
                 
-                predicted_class_index = self.knn_model.predict(datos_prueba)[0]
-                class_labels = ['Excelente', 'Bueno', 'Puede Mejorar', 'Poco Saludable']
-                predicted_label = class_labels[predicted_class_index]
-                confidence = 0.8
-                
-            elif model_type == 'svm':
-                if self.svm_model is None:
-                    raise ValueError("Modelo SVM no está cargado")
-                
-                predicted_class_index = self.svm_model.predict(datos_prueba)[0]
-                class_labels = ['Excelente', 'Bueno', 'Puede Mejorar', 'Poco Saludable']
-                predicted_label = class_labels[predicted_class_index]
-                confidence = 0.8
+                probabilities = self.knn_model.predict_proba(features)
+                winners = np.argmax(probabilities, axis=1)
+                label_indices = np.asarray(self.knn_model.classes_[winners], dtype=int)
+                return label_indices, probabilities[np.arange(len(features)), winners]
+        
+        elif model_type == 'svm':
+            if self.svm_model is None:
+                raise ValueError("Modelo SVM no está cargado")
+            
+            with time_stage('forward', model_type):
+                if self._svm_has_probabilities():
+                    # Probabilidad calibrada de la clase ganadora
+                    probabilities = self._class_probabilities(features, model_type)
+                    label_indices = np.argmax(probabilities, axis=1)
+                    return label_indices, probabilities[np.arange(len(features)), label_indices]
                 
-            else:
-                raise ValueError("Tipo de modelo no válido")
+                label_indices = np.asarray(self.svm_model.predict(features), dtype=int)
+            return label_indices, np.full(len(features), 0.8)  # SVM entrenado sin probability=True
+        
+        else:
+            raise ValueError("Tipo de modelo no válido")
+    
+    def predict_features(self, features, model_type='neural'):
+        """
+        Predice una matriz de características (N, 9), consultando primero la caché
+        
+        Solo las filas que no están en la caché pasan por el modelo, en un único forward pass.
+        
+        Returns:
+            lista de dicts con predicción y confianza, en el mismo orden de entrada
+        
+        Raises:
+            ValueError si model_type no es uno de MODEL_TYPES (antes de tocar caché o métricas)
+        """
+        if model_type not in MODEL_TYPES:
+            raise ValueError("Tipo de modelo no válido")
+        if self._uses_override_rules(model_type):
+            self._current_rule_table()
+        
+        with time_stage('cache', model_type):
+            keys = self.prediction_cache.make_keys(model_type, features)
+            results = [self.prediction_cache.get(key) for key in keys]
+        
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            label_indices, confidences = self._predict_matrix(features[missing], model_type)
+            for i, label_index, confidence in zip(missing, label_indices, confidences):
+                results[i] = {
+                    'classification': self.class_labels[label_index],
+                    'confidence': float(confidence),
+                    'model_used': model_type
+                }
+                self.prediction_cache.put(keys[i], results[i])
+        
+        # Solo se cuentan los platos que el modelo aceptó
+        PREDICTED_DISHES.inc(len(results), model_type=model_type)
+        PREDICTION_CACHE_LOOKUPS.inc(len(results) - len(missing), model_type=model_type, result='hit')
+        PREDICTION_CACHE_LOOKUPS.inc(len(missing), model_type=model_type, result='miss')
+        return results
+    
+    def classify_features(self, features, model_type='neural'):
+        """
+        Clasifica una matriz de características sin pasar por la caché de predicciones
+        
+        Pensado para puntuación masiva (score_dishes.py): evita construir un dict por
+        plato y no llena la caché con platos que no se volverán a consultar.
+        
+        Returns:
+            tupla (labels, confidences) como arrays de NumPy
+        """
+        if self._uses_override_rules(model_type):
+            self._current_rule_table()
+        
+        label_indices, confidences = self._predict_matrix(features, model_type)
+        PREDICTED_DISHES.inc(len(features), model_type=model_type)
+        return np.asarray(self.class_labels, dtype=object)[label_indices], confidences
+    
+    def predict_batch(self, nutrition_list, model_type='neural'):
+        """
+        Predice la clasificación nutricional de N platos con un único forward pass
+        
+        Args:
+            nutrition_list: lista de dicts con el mismo formato que acepta predict_dish_health
+            model_type: 'neural', 'neural_int8', 'neural_fp16', 'knn', 'svm' o 'ensemble'
+        
+        Returns:
+            lista de dicts con predicción y confianza, en el mismo orden de entrada
+        """
+        try:
+            if not nutrition_list:
+                return []
             
-            print(f"✅ Predicción: {predicted_label} (confianza: {confidence:.3f})")
+            with time_stage('aggregate', model_type_label(model_type)):
+                totals = default_aggregator.to_matrix(nutrition_list)
+            with time_stage('featurize', model_type_label(model_type)):
+                features = self.totals_to_features(totals)
+            return self.predict_features(features, model_type)
             
-            return {
-                'classification': predicted_label,
-                'confidence': float(confidence),
-                'model_used': model_type
-            }
+        except Exception as e:
+            print(f"❌ Error en predicción batch: {e}")
+            return [
+                {
+                    'classification': 'Error',
+                    'confidence': 0.0,
+                    'model_used': model_type,
+                    'error': str(e)
+                }
+                for _ in nutrition_list
+            ]
+    
+    def predict_dish_health(self, nutrition_data, model_type='neural'):
+        """
+        Predice la clasificación nutricional usando la lógica del ejemplo proporcionado
+        
+        Args:
+            nutrition_data: dict con keys que coinciden con el dataset CSV:
+                          Calorias, Proteinas, Carbohidratos, Grasas, Fibra, Azucar
+            model_type: 'neural', 'neural_int8', 'neural_fp16', 'knn', 'svm' o 'ensemble'
+        
+        Returns:
+            dict con predicción y confianza
+        """
+        try:
+            logger.debug("Datos de entrada al modelo: %s", nutrition_data)
+            
+            # Convertir datos del formato CSV a las 9 características que espera el modelo
+            with time_stage('aggregate', model_type_label(model_type)):
+                totals = default_aggregator.to_matrix([nutrition_data])
+            with time_stage('featurize', model_type_label(model_type)):
+                features = self.totals_to_features(totals)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Datos convertidos para el modelo: %s", dict(zip(EXPECTED_FEATURE_COLS, features[0])))
+            
+            prediction = self.predict_features(features, model_type)[0]
+            
+            logger.debug("Predicción: %s (confianza: %.3f)", prediction['classification'], prediction['confidence'])
+            
+            return prediction
             
         except Exception as e:
             print(f"❌ Error en predicción: {e}")
@@ -426,61 +1142,109 @@ class NutritionModel:
                 'error': str(e)
             }
     
+    def calculate_total_nutrition(self, foods):
+        """
+        Calcula los totales nutricionales de una lista de alimentos
+        
+        Args:
+            foods: lista de diccionarios con información nutricional (formato del servidor),
+                   lista de ids del catálogo de alimentos o dict id -> cantidad
+        
+        Returns:
+            dict con totales usando las claves del dataset CSV
+        
+        Raises:
+            UnknownFoodError si algún id no está en el catálogo
+        """
+        logger.debug("Recibidos %d alimentos para análisis", len(foods))
+        
+        if is_id_plate(foods):
+            # Ids del catálogo: cantidades @ tabla de nutrientes
+            totals = get_default_catalog().totals(foods)
+        else:
+            # Cada alimento se lee con las claves que traiga (CSV o frontend) y se suman todos a la vez
+            totals = default_aggregator.aggregate(foods)
+        total_nutrition = default_aggregator.totals_to_dict(totals)
+        
+        logger.debug("Total nutrition calculado: %s", total_nutrition)
+        
+        return total_nutrition
+    
     def predict_from_food_list(self, foods, model_type='neural'):
         """
         Predice la clasificación nutricional basada en una lista de alimentos
         
         Args:
-            foods: lista de diccionarios con información nutricional (formato del servidor)
-            model_type: 'neural', 'knn', o 'svm'
+            foods: lista de diccionarios con información nutricional (formato del servidor),
+                   lista de ids del catálogo de alimentos o dict id -> cantidad
+            model_type: 'neural', 'neural_int8', 'neural_fp16', 'knn', 'svm' o 'ensemble'
         
         Returns:
             dict con predicción y confianza
         """
-        print(f"🔍 Recibidos {len(foods)} alimentos para análisis:")
-        for i, food in enumerate(foods):
-            print(f"  Alimento {i+1}: {food}")
-        
-        # Calcular totales nutricionales usando las claves exactas del dataset CSV
-        total_nutrition = {
-            'Calorias': sum(food.get('Calorias', 0) for food in foods),
-            'Proteinas': sum(food.get('Proteinas', 0) for food in foods),
-            'Carbohidratos': sum(food.get('Carbohidratos', 0) for food in foods),
-            'Grasas': sum(food.get('Grasas', 0) for food in foods),
-            'Fibra': sum(food.get('Fibra', 0) for food in foods),
-            'Azucar': sum(food.get('Azucar', 0) for food in foods)
-        }
+        total_nutrition = self.calculate_total_nutrition(foods)
         
-        # Si todos los valores son 0, intentar usar otras claves posibles
-        if all(v == 0 for v in total_nutrition.values()):
-            print("⚠️ Todos los valores nutricionales son 0, intentando claves alternativas...")
-            total_nutrition = {
-                'Calorias': sum(food.get('calories', food.get('calorie', 0)) for food in foods),
-                'Proteinas': sum(food.get('protein', food.get('proteins', 0)) for food in foods),
-                'Carbohidratos': sum(food.get('carbs', food.get('carbohydrates', food.get('carbohidratos', 0))) for food in foods),
-                'Grasas': sum(food.get('fat', food.get('fats', food.get('grasas', 0))) for food in foods),
-                'Fibra': sum(food.get('fiber', food.get('fibra', 0)) for food in foods),
-                'Azucar': sum(food.get('sugar', food.get('azucar', 0)) for food in foods)
-            }
+        return self.predict_dish_health(total_nutrition, model_type)
+    
+    def predict_totals(self, totals, model_type='neural'):
+        """
+        Predice N platos a partir de su matriz (N, 6) de totales nutricionales
+        
+        Returns:
+            lista de dicts con predicción y confianza, en el mismo orden de entrada
+        """
+        try:
+            if len(totals) == 0:
+                return []
             
-            # Si aún son 0, usar valores por defecto basados en el número de alimentos
-            if all(v == 0 for v in total_nutrition.values()):
-                print("⚠️ Aún son 0, usando valores por defecto basados en número de alimentos...")
-                num_foods = len(foods)
-                total_nutrition = {
-                    'Calorias': num_foods * 200,  # ~200 cal por alimento promedio
-                    'Proteinas': num_foods * 10,   # ~10g proteína por alimento
-                    'Carbohidratos': num_foods * 30, # ~30g carbohidratos por alimento
-                    'Grasas': num_foods * 8,       # ~8g grasas por alimento
-                    'Fibra': num_foods * 3,        # ~3g fibra por alimento
-                    'Azucar': num_foods * 5        # ~5g azúcar por alimento
+            with time_stage('featurize', model_type_label(model_type)):
+                features = self.totals_to_features(totals)
+            return self.predict_features(features, model_type)
+            
+        except Exception as e:
+            print(f"❌ Error en predicción batch: {e}")
+            return [
+                {
+                    'classification': 'Error',
+                    'confidence': 0.0,
+                    'model_used': model_type,
+                    'error': str(e)
                 }
+                for _ in range(len(totals))
+            ]
+    
+    def plate_totals(self, plates):
+        """
+        Matriz (n_platos, 6) de totales de platos dados como listas de alimentos,
+        listas de ids o dicts id -> cantidad (pueden mezclarse entre platos)
+        """
+        totals = np.empty((len(plates), 6), dtype=np.float64)
+        id_mask = np.array([is_id_plate(plate) for plate in plates], dtype=bool)
         
-        print(f"📊 Total nutrition calculado: {total_nutrition}")
+        if id_mask.any():
+            totals[id_mask] = get_default_catalog().plate_totals(
+                [plate for plate, by_id in zip(plates, id_mask) if by_id])
+        if not id_mask.all():
+            totals[~id_mask] = default_aggregator.aggregate_plates(
+                [plate for plate, by_id in zip(plates, id_mask) if not by_id])
         
-        return self.predict_dish_health(total_nutrition, model_type)
+        return totals
+    
+    def predict_plates(self, plates, model_type='neural'):
+        """
+        Predice varios platos con una sola agregación vectorizada y un único forward pass
+        """
+        return self.predict_totals(self.plate_totals(plates), model_type)
 
 # Función para entrenar modelos si se ejecuta directamente
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Entrena los modelos de nutrición')
+    parser.add_argument('--csv', default='comidaventura_dataset.csv', help='Dataset de entrenamiento')
+    parser.add_argument('--chunksize', type=int,
+                        help='Leer el dataset por bloques de N filas (datasets que no caben en memoria)')
+    args = parser.parse_args()
+    
     model = NutritionModel()
-    model.train_all_models() 
\ No newline at end of file
+    model.train_all_models(args.csv, chunksize=args.chunksize) 
\ No newline at end of file
@@ -0,0 +1,200 @@
+"""
+Tabla declarativa de reglas de ajuste de la clasificación
+
+Las reglas que corrigen la salida de la red neuronal (umbrales de calorías,
+grasas, proteínas...) viven en override_rules.json en lugar de en el código.
+La tabla se compila una sola vez en predicados NumPy: cada condición distinta
+se evalúa una vez por batch sobre todas las filas y cada regla combina las
+condiciones que usa, así que las reglas corren igual sobre un plato que sobre
+millones. Cada plato queda con la primera regla que cumple y se cuentan los
+aciertos de cada regla.
+
+El archivo se vuelve a leer cuando cambia (como mucho una vez por segundo), de
+modo que las reglas pueden ajustarse sin redesplegar el servicio. La variable de
+entorno ML_OVERRIDE_RULES permite usar otro archivo.
+"""
+
+import json
+import operator
+import os
+import threading
+import time
+import numpy as np
+
+RULES_ENV = 'ML_OVERRIDE_RULES'
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'override_rules.json')
+
+# Segundos entre comprobaciones de cambios en el archivo de reglas
+RELOAD_CHECK_INTERVAL = 1.0
+
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne
+}
+
+
+class RuleTableError(ValueError):
+    """
+    El archivo de reglas no es válido para las características o clases del modelo
+    """
+
+
+class RuleTable:
+    """
+    Reglas compiladas en predicados vectorizados, con contadores de aciertos
+    """
+
+    def __init__(self, rules, feature_cols, class_labels, source=None):
+        """
+        Args:
+            rules: lista de reglas (dicts con name, all/any, label_in, set_label, min_confidence)
+            feature_cols: nombres de las columnas de la matriz de características
+            class_labels: etiquetas en el orden de los índices que devuelve el modelo
+            source: ruta de la que se leyeron las reglas (informativo)
+        """
+        self.source = source
+        self.class_labels = list(class_labels)
+        self.rule_names = []
+        self._conditions = []  # condiciones distintas: (columna, operador, valor)
+        self._rules = []       # (índices de 'all', índices de 'any', máscara de clases, clase destino, confianza mínima)
+        self.hits = np.zeros(len(rules), dtype=np.int64)
+        self._lock = threading.Lock()
+
+        condition_index = {}
+        for position, rule in enumerate(rules):
+            name = rule.get('name', f'regla_{position}')
+            try:
+                all_ids = [self._compile_condition(c, feature_cols, condition_index) for c in rule.get('all', [])]
+                any_ids = [self._compile_condition(c, feature_cols, condition_index) for c in rule.get('any', [])]
+
+                label_mask = None
+                if 'label_in' in rule:
+                    label_mask = np.zeros(len(self.class_labels), dtype=bool)
+                    label_mask[[self.class_labels.index(label) for label in rule['label_in']]] = True
+
+                target = self.class_labels.index(rule['set_label'])
+                min_confidence = rule.get('min_confidence')
+            except (KeyError, ValueError, TypeError) as e:
+                raise RuleTableError(f"Regla '{name}' inválida: {e}")
+
+            self.rule_names.append(name)
+            self._rules.append((all_ids, any_ids, label_mask, target, min_confidence))
+
+    def _compile_condition(self, condition, feature_cols, condition_index):
+        feature, op, value = condition
+        key = (list(feature_cols).index(feature), op, float(value))
+        if op not in OPERATORS:
+            raise ValueError(f"operador desconocido '{op}'")
+        if key not in condition_index:
+            condition_index[key] = len(self._conditions)
+            self._conditions.append((key[0], OPERATORS[op], key[2]))
+        return condition_index[key]
+
+    @classmethod
+    def load(cls, path, feature_cols, class_labels):
+        with open(path, encoding='utf-8') as f:
+            document = json.load(f)
+        rules = document['rules'] if isinstance(document, dict) else document
+        return cls(rules, feature_cols, class_labels, source=path)
+
+    def __len__(self):
+        return len(self._rules)
+
+    def apply(self, features, label_indices, confidences):
+        """
+        Aplica las reglas a todo el batch; cada fila queda con la primera regla que cumple
+
+        Returns:
+            tupla (label_indices, confidences) ajustadas
+        """
+        label_indices = np.asarray(label_indices)
+        new_labels = label_indices.copy()
+        new_confidences = np.asarray(confidences, dtype=np.float64).copy()
+
+        # Cada condición distinta se evalúa una sola vez para todo el batch
+        conditions = [op(features[:, column], value) for column, op, value in self._conditions]
+
+        pending = np.ones(len(features), dtype=bool)
+        hits = np.zeros(len(self._rules), dtype=np.int64)
+        for position, (all_ids, any_ids, label_mask, target, min_confidence) in enumerate(self._rules):
+            if not pending.any():
+                break
+
+            matched = pending.copy()
+            for condition_id in all_ids:
+                matched &= conditions[condition_id]
+            if any_ids:
+                matched &= np.logical_or.reduce([conditions[condition_id] for condition_id in any_ids])
+            if label_mask is not None:
+                matched &= label_mask[label_indices]  # Clase que predijo el modelo, no la ya ajustada
+
+            new_labels[matched] = target
+            if min_confidence is not None:
+                new_confidences[matched] = np.maximum(new_confidences[matched], min_confidence)
+
+            hits[position] = np.count_nonzero(matched)
+            pending &= ~matched
+
+        with self._lock:
+            self.hits += hits
+
+        return new_labels, new_confidences
+
+    def stats(self):
+        with self._lock:
+            return {
+                'source': self.source,
+                'rules': len(self._rules),
+                'conditions': len(self._conditions),
+                'hits': {name: int(count) for name, count in zip(self.rule_names, self.hits)}
+            }
+
+
+class OverrideRules:
+    """
+    Mantiene la tabla compilada al día con el archivo de reglas
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.environ.get(RULES_ENV) or DEFAULT_RULES_PATH
+        self._table = None
+        self._key = None  # (mtime del archivo, columnas, clases) con los que se compiló la tabla
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def table(self, feature_cols, class_labels):
+        """
+        Devuelve la tabla compilada, recompilándola si el archivo o las clases cambiaron
+
+        Si el archivo modificado no es válido se sigue usando la tabla anterior.
+        """
+        now = time.monotonic()
+        if self._table is not None and now - self._last_check < RELOAD_CHECK_INTERVAL \
+                and self._key[1:] == (tuple(feature_cols), tuple(class_labels)):
+            return self._table
+
+        with self._lock:
+            self._last_check = now
+            schema = (tuple(feature_cols), tuple(class_labels))
+            key = None
+            try:
+                key = (os.path.getmtime(self.path),) + schema
+                if key != self._key:
+                    self._table = RuleTable.load(self.path, feature_cols, class_labels)
+                    self._key = key
+                    print(f"📏 Reglas de ajuste cargadas: {len(self._table)} reglas ({self.path})")
+            except (OSError, ValueError, KeyError) as e:
+                # Un archivo roto no debe tumbar el servicio si la tabla anterior sigue siendo válida
+                if self._table is None or self._key[1:] != schema:
+                    raise
+                print(f"⚠️ No se pudieron recargar las reglas ({e}); se mantienen las anteriores")
+                if key is not None:
+                    self._key = key  # No volver a intentarlo hasta que el archivo cambie de nuevo
+            return self._table
+
+    def stats(self):
+        return self._table.stats() if self._table is not None else None
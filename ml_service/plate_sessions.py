@@ -0,0 +1,224 @@
+"""
+Sesiones de plato para la puntuación incremental
+
+En el juego el plato cambia de a un alimento. En vez de reenviar y volver a
+sumar la lista completa en cada cambio, cada sesión guarda los totales
+nutricionales acumulados, las cantidades por alimento y el último vector de
+características; añadir o quitar un alimento cuesta una suma de una fila más
+una inferencia (que además pasa por la caché de predicciones). Las sesiones
+inactivas caducan tras un TTL.
+
+Las sesiones viven en la memoria de cada proceso: con varios workers (serve.py)
+las peticiones de un mismo plato deben llegar al mismo worker.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+import numpy as np
+from food_aggregation import default_aggregator
+from food_catalog import UnknownFoodError, get_default_catalog
+from nutrition_model import MODEL_TYPES
+
+
+def validate_model_type(model_type):
+    """
+    Raises:
+        ValueError si model_type no es uno de MODEL_TYPES
+    """
+    if model_type not in MODEL_TYPES:
+        raise ValueError(f"model_type no válido: {model_type!r} (disponibles: {', '.join(MODEL_TYPES)})")
+
+
+def _effective_totals(totals, n_foods):
+    # Igual que en la agregación por lista: sin datos reconocibles, estimación por alimento
+    if not totals.any() and n_foods > 0:
+        return default_aggregator.default_per_food * n_foods
+    return totals
+
+
+class PlateSession:
+    """
+    Estado de un plato en construcción
+    """
+
+    def __init__(self, model_type='neural'):
+        self.id = uuid.uuid4().hex
+        self.model_type = model_type
+        self.totals = np.zeros(len(default_aggregator.nutrient_keys), dtype=np.float64)
+        self.food_counts = {}  # id del catálogo -> cantidad
+        self.extra_foods = 0   # alimentos enviados con su información nutricional completa
+        self.features = None
+        self.prediction = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.lock = threading.Lock()
+
+    @property
+    def n_foods(self):
+        return sum(self.food_counts.values()) + self.extra_foods
+
+    def effective_totals(self):
+        return _effective_totals(self.totals, self.n_foods)
+
+    def to_dict(self, ttl=None):
+        data = {
+            'plate_id': self.id,
+            'model_type': self.model_type,
+            'foods': dict(self.food_counts),
+            'extra_foods': self.extra_foods,
+            'n_foods': self.n_foods,
+            'nutrition': default_aggregator.totals_to_dict(self.effective_totals()),
+            'prediction': self.prediction,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
+        if ttl is not None:
+            data['expires_in'] = max(0.0, self.updated_at + ttl - time.time())
+        return data
+
+
+class PlateSessionStore:
+    """
+    Sesiones de plato en memoria con caducidad por inactividad
+    """
+
+    def __init__(self, model_getter, ttl=1800, max_sessions=10000):
+        """
+        Args:
+            model_getter: función sin argumentos que devuelve el NutritionModel que está sirviendo
+            ttl: segundos de inactividad tras los que se descarta una sesión
+            max_sessions: máximo de sesiones vivas; al superarlo se descartan las menos recientes
+        """
+        self.model_getter = model_getter
+        self.ttl = ttl
+        self.max_sessions = max(1, max_sessions)
+        self._sessions = OrderedDict()  # de la menos a la más recientemente usada
+        self._lock = threading.Lock()
+        self.expired = 0
+
+    def _evict(self, now):
+        # Las sesiones están ordenadas por último uso: las caducadas están al principio
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.updated_at <= self.ttl and len(self._sessions) <= self.max_sessions:
+                break
+            self._sessions.popitem(last=False)
+            self.expired += 1
+
+    def create(self, model_type='neural'):
+        """
+        Raises:
+            ValueError si model_type no es válido
+        """
+        validate_model_type(model_type)
+        session = PlateSession(model_type)
+        with self._lock:
+            self._sessions[session.id] = session
+            self._evict(session.created_at)
+        return session
+
+    def get(self, plate_id, touch=True):
+        """
+        Devuelve la sesión o None si no existe o caducó
+        """
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            session = self._sessions.get(plate_id)
+            if session is not None and touch:
+                session.updated_at = now
+                self._sessions.move_to_end(plate_id)
+            return session
+
+    def delete(self, plate_id):
+        with self._lock:
+            return self._sessions.pop(plate_id, None) is not None
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def update(self, session, food_id=None, food=None, delta=1, model_type=None, score=True):
+        """
+        Añade (delta > 0) o quita (delta < 0) un alimento y vuelve a clasificar el plato
+
+        Args:
+            session: PlateSession obtenida con get()
+            food_id: id del catálogo de alimentos
+            food: dict con la información nutricional (si el alimento no está en el catálogo)
+            delta: cantidad que se añade o se quita
+            model_type: cambia el modelo de la sesión si se indica
+            score: False para acumular varios cambios y clasificar después con rescore()
+
+        Raises:
+            UnknownFoodError si food_id no está en el catálogo
+            ValueError si se quita más cantidad de la que hay en el plato, si model_type
+            no es válido o si la clasificación falla; en ese caso la sesión no cambia
+        """
+        if model_type is not None:
+            validate_model_type(model_type)
+
+        with session.lock:
+            # Los cambios se calculan aparte y solo se guardan si la clasificación funciona
+            food_counts, extra_foods = session.food_counts, session.extra_foods
+            if food_id is not None:
+                catalog = get_default_catalog()
+                if food_id not in catalog:
+                    raise UnknownFoodError([food_id])
+                row = catalog.nutrients[catalog.index[food_id]]
+                count = food_counts.get(food_id, 0) + delta
+                if count < 0:
+                    raise ValueError(f"El plato solo tiene {count - delta} de '{food_id}'")
+                food_counts = dict(food_counts)
+                if count:
+                    food_counts[food_id] = count
+                else:
+                    food_counts.pop(food_id, None)
+            elif food is not None:
+                row = default_aggregator.to_matrix([food])[0]
+                if extra_foods + delta < 0:
+                    raise ValueError('El plato no tiene tantos alimentos sin id')
+                extra_foods += delta
+            else:
+                raise ValueError('Debe indicar "food_id" o "food"')
+
+            totals = session.totals + delta * row
+            n_foods = sum(food_counts.values()) + extra_foods
+            if n_foods == 0:
+                totals[:] = 0  # Evitar restos de redondeo al vaciar el plato
+            model_type = model_type if model_type is not None else session.model_type
+
+            if score:
+                session.features, session.prediction = self._score(totals, n_foods, model_type)
+            session.food_counts, session.extra_foods = food_counts, extra_foods
+            session.totals, session.model_type = totals, model_type
+            session.updated_at = time.time()
+            return session
+
+    def rescore(self, session):
+        with session.lock:
+            session.features, session.prediction = self._score(session.totals, session.n_foods,
+                                                               session.model_type)
+            return session
+
+    def _score(self, totals, n_foods, model_type):
+        """
+        Returns:
+            tupla (features, prediction) del plato, (None, None) si está vacío
+        """
+        if n_foods == 0:
+            return None, None
+
+        model = self.model_getter()
+        features = model.totals_to_features(_effective_totals(totals, n_foods))
+        return features, model.predict_features(features, model_type)[0]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'active': len(self._sessions),
+                'max_sessions': self.max_sessions,
+                'ttl_seconds': self.ttl,
+                'expired': self.expired
+            }
@@ -0,0 +1,89 @@
+"""
+Caché LRU de predicciones del modelo de nutrición
+
+Las claves combinan el model_type con el vector de 9 características redondeado
+a una precisión configurable, de modo que platos con la misma composición
+nutricional reutilizan la predicción sin volver a ejecutar el modelo.
+"""
+
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+class PredictionCache:
+    """
+    Caché en memoria con tamaño máximo y expulsión LRU, segura entre hilos
+    """
+
+    def __init__(self, maxsize=4096, precision=2):
+        """
+        Args:
+            maxsize: número máximo de predicciones guardadas (0 desactiva la caché)
+            precision: decimales a los que se redondean las características en la clave
+        """
+        self.maxsize = maxsize
+        self.precision = precision
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def make_keys(self, model_type, features):
+        """
+        Construye una clave por fila de la matriz de características
+        """
+        rounded = np.round(np.asarray(features, dtype=np.float64), self.precision) + 0.0  # +0.0 normaliza -0.0
+        return [(model_type, row.tobytes()) for row in rounded]
+
+    def get(self, key):
+        """
+        Devuelve una copia de la predicción guardada o None si no está
+        """
+        if self.maxsize <= 0:
+            return None
+
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(value)
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = dict(value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Invalida todas las predicciones (p. ej. al cargar pesos nuevos)
+        """
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'precision': self.precision,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,212 @@
+"""
+Cuantización post-entrenamiento de la red neuronal
+
+A partir de los pesos float32 (NumpyMLP) se generan dos variantes más ligeras:
+
+  - int8: pesos simétricos por canal de salida (una escala por neurona) y
+    activaciones de entrada de cada capa cuantizadas con una escala calibrada
+    sobre los datos de entrenamiento. El producto se acumula en int32 y se
+    reescala a float32 antes de sumar el sesgo y aplicar la activación.
+  - float16: pesos guardados en media precisión; el cálculo se hace en float32.
+
+Las variantes se guardan dentro del paquete de modelo y se sirven como los
+model_type 'neural_int8' y 'neural_fp16'. quantization_report() compara sus
+predicciones con las de float32 sobre los datos de entrenamiento.
+"""
+
+import numpy as np
+from numpy_mlp import ACTIVATIONS, NumpyMLP
+
+QUANTIZATION_REPORT_FILENAME = 'quantization_report.json'
+
+# model_type del servicio -> variante cuantizada (None = pesos float32 originales)
+NEURAL_VARIANTS = {
+    'neural': None,
+    'neural_int8': 'int8',
+    'neural_fp16': 'fp16'
+}
+
+INT8_MAX = 127
+
+
+class QuantizedMLP:
+    """
+    Red densa con pesos int8 (escalas calibradas) o float16
+    """
+
+    def __init__(self, kind, weights, biases, activations, weight_scales=None, input_scales=None):
+        """
+        Args:
+            kind: 'int8' o 'fp16'
+            weights: matrices (n_entrada, n_salida) en int8 o float16
+            biases: vectores (n_salida,) en float32
+            activations: nombre de la activación de cada capa
+            weight_scales: (int8) escala por canal de salida de cada capa
+            input_scales: (int8) escala de las activaciones de entrada de cada capa
+        """
+        if kind not in ('int8', 'fp16'):
+            raise ValueError(f"Tipo de cuantización no soportado: {kind}")
+
+        self.kind = kind
+        self.weights = [np.asarray(w, dtype=np.int8 if kind == 'int8' else np.float16) for w in weights]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+        self.activations = list(activations)
+        if kind == 'int8':
+            self.weight_scales = [np.asarray(s, dtype=np.float32) for s in weight_scales]
+            self.input_scales = np.asarray(input_scales, dtype=np.float32)
+
+    @property
+    def input_dim(self):
+        return self.weights[0].shape[0]
+
+    @property
+    def output_dim(self):
+        return self.weights[-1].shape[1]
+
+    @property
+    def nbytes(self):
+        """
+        Bytes de todos los arrays que la variante mantiene en memoria (pesos, sesgos y escalas)
+        """
+        total = sum(w.nbytes for w in self.weights) + sum(b.nbytes for b in self.biases)
+        if self.kind == 'int8':
+            total += sum(s.nbytes for s in self.weight_scales) + self.input_scales.nbytes
+        return total
+
+    def predict(self, X, verbose=0):
+        """
+        Probabilidades de salida para un batch, con la misma firma que NumpyMLP.predict
+        """
+        output = np.asarray(X, dtype=np.float32)
+
+        for i, (b, activation) in enumerate(zip(self.biases, self.activations)):
+            if self.kind == 'int8':
+                scale = self.input_scales[i]
+                quantized = np.clip(np.rint(output / scale), -INT8_MAX, INT8_MAX).astype(np.int32)
+                # Solo se guardan los pesos int8: se amplían en cada llamada (int16 @ int32 acumula
+                # en int32 sin desbordamiento) y la copia temporal se libera al terminar la capa
+                accumulated = quantized @ self.weights[i].astype(np.int16)
+                linear = accumulated.astype(np.float32) * (scale * self.weight_scales[i])
+            else:
+                linear = output @ self.weights[i].astype(np.float32)
+            output = ACTIVATIONS[activation](linear + b)
+
+        return output
+
+    def to_arrays(self):
+        """
+        Arrays para guardar en el paquete de modelo (sin pickle)
+        """
+        arrays = {f'{self.kind}_W{i}': w for i, w in enumerate(self.weights)}
+        if self.kind == 'int8':
+            arrays.update({f'int8_scale{i}': s for i, s in enumerate(self.weight_scales)})
+            arrays['int8_input_scales'] = self.input_scales
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, kind, arrays, base):
+        """
+        Reconstruye la variante desde los arrays del paquete; None si el paquete no la incluye
+
+        Args:
+            base: NumpyMLP float32 del mismo paquete (aporta sesgos y activaciones)
+        """
+        n_layers = len(base.weights)
+        if f'{kind}_W0' not in arrays:
+            return None
+
+        weights = [arrays[f'{kind}_W{i}'] for i in range(n_layers)]
+        if kind == 'int8':
+            return cls(kind, weights, base.biases, base.activations,
+                       weight_scales=[arrays[f'int8_scale{i}'] for i in range(n_layers)],
+                       input_scales=arrays['int8_input_scales'])
+        return cls(kind, weights, base.biases, base.activations)
+
+
+def _layer_inputs(network, X):
+    """
+    Entrada de cada capa de la red float32 al evaluar X (para calibrar las escalas)
+    """
+    inputs = []
+    output = np.asarray(X, dtype=np.float32)
+    for w, b, activation in zip(network.weights, network.biases, network.activations):
+        inputs.append(output)
+        output = ACTIVATIONS[activation](output @ w + b)
+    return inputs
+
+
+def quantize_int8(network, calibration_X, percentile=99.99):
+    """
+    Cuantiza los pesos a int8 por canal y calibra la escala de entrada de cada capa
+
+    Args:
+        network: NumpyMLP float32
+        calibration_X: entradas representativas (datos de entrenamiento ya escalados)
+        percentile: percentil de |activación| que se toma como máximo (recorta valores atípicos)
+    """
+    weights, weight_scales = [], []
+    for w in network.weights:
+        max_abs = np.max(np.abs(w), axis=0)
+        scale = np.where(max_abs > 0, max_abs / INT8_MAX, 1.0).astype(np.float32)
+        weights.append(np.clip(np.rint(w / scale), -INT8_MAX, INT8_MAX).astype(np.int8))
+        weight_scales.append(scale)
+
+    input_scales = []
+    for layer_input in _layer_inputs(network, calibration_X):
+        max_abs = np.percentile(np.abs(layer_input), percentile) if layer_input.size else 0.0
+        input_scales.append(max_abs / INT8_MAX if max_abs > 0 else 1.0)
+
+    return QuantizedMLP('int8', weights, network.biases, network.activations,
+                        weight_scales=weight_scales, input_scales=input_scales)
+
+
+def quantize_float16(network):
+    return QuantizedMLP('fp16', network.weights, network.biases, network.activations)
+
+
+def quantization_report(network, variants, X, y=None):
+    """
+    Compara cada variante cuantizada con la red float32 sobre X
+
+    Args:
+        network: NumpyMLP float32
+        variants: dict nombre -> QuantizedMLP
+        X: entradas (datos de entrenamiento ya escalados)
+        y: etiquetas codificadas opcionales para calcular la exactitud de cada variante
+
+    Returns:
+        dict serializable en JSON
+    """
+    reference = network.predict(X)
+    reference_labels = np.argmax(reference, axis=1)
+    float_bytes = sum(w.nbytes for w in network.weights) + sum(b.nbytes for b in network.biases)
+
+    report = {
+        'samples': int(len(X)),
+        'float32': {'parameter_bytes': int(float_bytes)}
+    }
+    if y is not None:
+        report['float32']['accuracy'] = float(np.mean(reference_labels == y))
+
+    for name, variant in variants.items():
+        probabilities = variant.predict(X)
+        labels = np.argmax(probabilities, axis=1)
+        entry = {
+            'parameter_bytes': int(variant.nbytes),
+            'compression': float(float_bytes / variant.nbytes),
+            'agreement_with_float32': float(np.mean(labels == reference_labels)),
+            'max_abs_probability_diff': float(np.max(np.abs(probabilities - reference))) if len(X) else 0.0,
+            'mean_abs_probability_diff': float(np.mean(np.abs(probabilities - reference))) if len(X) else 0.0
+        }
+        if y is not None:
+            entry['accuracy'] = float(np.mean(labels == y))
+        report[name] = entry
+
+    return report
+
+
+def as_numpy_mlp(network):
+    """
+    NumpyMLP float32 a partir de un NumpyMLP o de un modelo Keras de capas Dense
+    """
+    return network if isinstance(network, NumpyMLP) else NumpyMLP.from_keras(network)
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Puntuación masiva de platos desde un archivo CSV o Parquet
+
+Lee el archivo por bloques de tamaño fijo, clasifica cada bloque con una sola
+llamada batch al modelo y escribe los resultados a medida que avanza, así que la
+memoria no depende del tamaño del archivo. Con --workers los bloques se reparten
+entre un pool de procesos (cada uno carga el modelo una vez) manteniendo el
+orden de salida.
+
+El archivo de entrada necesita las columnas de nutrientes del dataset
+(Calorias, Proteinas, Carbohidratos, Grasas, Fibra, Azucar) o sus equivalentes
+del frontend (calories, protein, carbs, fat, fiber, sugar). Las columnas que
+falten cuentan como 0.
+
+El esquema de salida se fija antes del primer bloque (nutrientes y confianza en
+float64, el resto de columnas de un CSV como texto), así que todos los bloques
+escriben los mismos tipos aunque pandas infiera otros en cada uno. Los resultados
+se escriben en un archivo temporal que solo se renombra a la salida al terminar.
+
+Uso:
+    python score_dishes.py menu.csv resultados.csv
+    python score_dishes.py menu.parquet resultados.parquet --model-type knn --workers 4
+"""
+
+import argparse
+import collections
+import multiprocessing
+import os
+import sys
+import time
+import numpy as np
+from food_aggregation import NUTRIENT_ALIASES, NUTRIENT_KEYS
+
+# Modelo cargado una vez por proceso worker del pool
+_worker_model = None
+
+
+def resolve_nutrient_columns(columns):
+    """
+    Columna del archivo que corresponde a cada nutriente (o None si no está)
+
+    Raises:
+        ValueError si el archivo no tiene ninguna columna de nutrientes
+    """
+    present = set(columns)
+    resolved = [next((alias for alias in NUTRIENT_ALIASES[key] if alias in present), None)
+                for key in NUTRIENT_KEYS]
+    if not any(resolved):
+        raise ValueError('El archivo no tiene columnas de nutrientes '
+                         f'({", ".join(NUTRIENT_KEYS)} o sus equivalentes en inglés)')
+    return resolved
+
+
+def chunk_totals(chunk, nutrient_columns):
+    """
+    Matriz (n_platos, 6) de totales de un bloque; valores vacíos o no numéricos cuentan como 0
+    """
+    import pandas as pd
+
+    totals = np.zeros((len(chunk), len(NUTRIENT_KEYS)), dtype=np.float64)
+    for j, column in enumerate(nutrient_columns):
+        if column is not None:
+            totals[:, j] = pd.to_numeric(chunk[column], errors='coerce').to_numpy(dtype=np.float64, na_value=0.0)
+    return np.nan_to_num(totals, copy=False)
+
+
+def _require_pyarrow(action):
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise SystemExit(f'❌ Para {action} Parquet instala pyarrow: pip install pyarrow')
+
+
+def input_columns(path):
+    """
+    Columnas del archivo de entrada y, si es Parquet, su esquema de Arrow (None para CSV)
+    """
+    if path.endswith('.parquet'):
+        _require_pyarrow('leer')
+        import pyarrow.parquet as pq
+
+        schema = pq.ParquetFile(path).schema_arrow
+        return list(schema.names), schema
+
+    import pandas as pd
+
+    return list(pd.read_csv(path, nrows=0).columns), None
+
+
+def iter_chunks(path, chunksize):
+    """
+    Recorre el archivo de entrada en DataFrames de como mucho chunksize filas
+
+    Las columnas de un CSV se leen como texto (dtype=str): los nutrientes se convierten
+    después a float64 y el resto se copia tal cual, con el mismo tipo en todos los bloques.
+    """
+    if path.endswith('.parquet'):
+        _require_pyarrow('leer')
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        import pandas as pd
+
+        yield from pd.read_csv(path, chunksize=chunksize, dtype=str)
+
+
+def output_schema(columns, nutrient_columns, input_schema=None):
+    """
+    Esquema de Arrow fijo para la salida Parquet
+
+    Args:
+        columns: columnas de entrada que se copian a la salida
+        nutrient_columns: columnas de nutrientes del archivo (se escriben como float64)
+        input_schema: esquema del Parquet de entrada (None: CSV, las demás columnas son texto)
+    """
+    import pyarrow as pa
+
+    nutrients = set(column for column in nutrient_columns if column is not None)
+    fields = []
+    for column in columns:
+        if column in nutrients:
+            fields.append(pa.field(column, pa.float64()))
+        elif input_schema is not None:
+            fields.append(input_schema.field(column))
+        else:
+            fields.append(pa.field(column, pa.string()))
+    fields += [pa.field('classification', pa.string()), pa.field('confidence', pa.float64()),
+               pa.field('model_used', pa.string())]
+    return pa.schema(fields)
+
+
+class ResultWriter:
+    """
+    Escribe los bloques de resultados en CSV o Parquet según la extensión de salida
+
+    Los bloques van a un archivo temporal junto a la salida: close() lo renombra al
+    terminar y abort() lo borra, así que un error nunca deja una salida truncada.
+    """
+
+    def __init__(self, path, columns, schema=None):
+        """
+        Args:
+            columns: columnas de la salida, en orden
+            schema: esquema de Arrow de la salida (obligatorio para Parquet)
+        """
+        self.path = path
+        self.tmp_path = f"{path}.{os.getpid()}.tmp"
+        self.columns = list(columns)
+        self.schema = schema
+        self._parquet_writer = None
+        self._csv_header = True
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def write(self, frame):
+        if self.path.endswith('.parquet'):
+            _require_pyarrow('escribir')
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(frame[self.columns], preserve_index=False)
+            table = table.cast(self.schema)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.tmp_path, self.schema)
+            self._parquet_writer.write_table(table)
+        else:
+            frame[self.columns].to_csv(self.tmp_path, mode='a', header=self._csv_header, index=False)
+            self._csv_header = False
+
+    def _close_writer(self):
+        writer, self._parquet_writer = self._parquet_writer, None
+        if writer is not None:
+            writer.close()
+
+    def close(self):
+        self._close_writer()
+        if not os.path.exists(self.tmp_path):
+            # Entrada sin filas: salida con solo las columnas
+            if self.path.endswith('.parquet'):
+                import pyarrow.parquet as pq
+
+                pq.ParquetWriter(self.tmp_path, self.schema).close()
+            else:
+                with open(self.tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(','.join(self.columns) + '\n')
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        try:
+            self._close_writer()
+        finally:
+            if os.path.exists(self.tmp_path):
+                os.remove(self.tmp_path)
+
+
+def load_model(model_path):
+    from nutrition_model import NutritionModel
+
+    model = NutritionModel(model_path=model_path, cache_size=0)
+    if not model.load_models():
+        raise RuntimeError(f'No se encontraron modelos entrenados en {model_path}')
+    return model
+
+
+def _init_worker(model_path):
+    global _worker_model
+    _worker_model = load_model(model_path)
+
+
+def _score_in_worker(totals, model_type):
+    return _score(_worker_model, totals, model_type)
+
+
+def _score(model, totals, model_type):
+    return model.classify_features(model.totals_to_features(totals), model_type)
+
+
+def attach_results(chunk, keep_columns, nutrient_columns, labels, confidences, model_type):
+    import pandas as pd
+
+    frame = chunk[keep_columns] if keep_columns is not None else chunk
+    # Nutrientes como float64 en todos los bloques (valores no numéricos -> vacío)
+    numeric = {column: pd.to_numeric(frame[column], errors='coerce').astype(np.float64)
+               for column in nutrient_columns if column is not None and column in frame.columns}
+    return frame.assign(**numeric, classification=labels,
+                        confidence=np.asarray(confidences, dtype=np.float64), model_used=model_type)
+
+
+def score_file(input_path, output_path, model_type='neural', chunksize=50000, workers=1,
+               model_path='models/', keep_columns=None):
+    """
+    Clasifica todos los platos de input_path y escribe los resultados en output_path
+
+    Returns:
+        dict con filas procesadas, segundos y recuento por clase
+    """
+    start = time.perf_counter()
+
+    # Columnas y esquema de salida fijados antes de leer el primer bloque
+    columns, input_schema = input_columns(input_path)
+    nutrient_columns = resolve_nutrient_columns(columns)
+    if keep_columns is not None:
+        missing = [column for column in keep_columns if column not in columns]
+        if missing:
+            raise KeyError(f"Columnas de --keep-columns que no están en la entrada: {', '.join(missing)}")
+    copied = keep_columns if keep_columns is not None else columns
+    schema = None
+    if output_path.endswith('.parquet'):
+        _require_pyarrow('escribir')
+        schema = output_schema(copied, nutrient_columns, input_schema)
+
+    writer = ResultWriter(output_path, copied + ['classification', 'confidence', 'model_used'], schema)
+    class_counts = collections.Counter()
+    rows = 0
+
+    def emit(chunk, labels, confidences):
+        nonlocal rows
+        writer.write(attach_results(chunk, keep_columns, nutrient_columns, labels, confidences, model_type))
+        class_counts.update(labels.tolist())
+        rows += len(chunk)
+        elapsed = time.perf_counter() - start
+        print(f"  {rows:>10} platos ({rows / elapsed:,.0f} platos/s)")
+
+    pool = None
+    try:
+        if workers > 1:
+            # Un hilo de BLAS por proceso: los bloques ya se reparten entre los núcleos
+            for variable in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+                os.environ.setdefault(variable, '1')
+
+            from concurrent.futures import ProcessPoolExecutor
+
+            pool = ProcessPoolExecutor(max_workers=workers,
+                                       mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=_init_worker, initargs=(model_path,))
+            # Como mucho 2 bloques en vuelo por worker: la memoria sigue acotada aunque la lectura sea más rápida
+            in_flight = collections.deque()
+            max_in_flight = 2 * workers
+        else:
+            model = load_model(model_path)
+
+        for chunk in iter_chunks(input_path, chunksize):
+            totals = chunk_totals(chunk, nutrient_columns)
+
+            if pool is None:
+                emit(chunk, *_score(model, totals, model_type))
+                continue
+
+            in_flight.append((chunk, pool.submit(_score_in_worker, totals, model_type)))
+            if len(in_flight) >= max_in_flight:
+                done_chunk, future = in_flight.popleft()
+                emit(done_chunk, *future.result())
+
+        while pool is not None and in_flight:
+            done_chunk, future = in_flight.popleft()
+            emit(done_chunk, *future.result())
+    except BaseException:
+        writer.abort()
+        raise
+    else:
+        writer.close()
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return {
+        'rows': rows,
+        'seconds': time.perf_counter() - start,
+        'classes': dict(class_counts)
+    }
+
+
+def main(argv=None):
+    from nutrition_model import MODEL_TYPES
+
+    parser = argparse.ArgumentParser(description='Clasifica en bloque los platos de un archivo CSV o Parquet')
+    parser.add_argument('input', help='Archivo de entrada (.csv o .parquet)')
+    parser.add_argument('output', help='Archivo de resultados (.csv o .parquet)')
+    parser.add_argument('--model-type', default='neural', choices=MODEL_TYPES,
+                        help='Modelo a usar (por defecto: neural)')
+    parser.add_argument('--chunksize', type=int, default=50000, help='Platos por bloque (por defecto: 50000)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Procesos para puntuar bloques en paralelo (por defecto: 1)')
+    parser.add_argument('--model-path', default='models/', help='Directorio de los modelos entrenados')
+    parser.add_argument('--keep-columns',
+                        help='Columnas de entrada que se copian a la salida, separadas por comas (por defecto: todas)')
+    args = parser.parse_args(argv)
+
+    keep_columns = args.keep_columns.split(',') if args.keep_columns else None
+
+    print(f"🍽️ Clasificando {args.input} con el modelo {args.model_type} "
+          f"(bloques de {args.chunksize}, {args.workers} proceso(s))...")
+    try:
+        summary = score_file(args.input, args.output, model_type=args.model_type,
+                             chunksize=args.chunksize, workers=args.workers,
+                             model_path=args.model_path, keep_columns=keep_columns)
+    except (OSError, ValueError, KeyError, RuntimeError) as e:
+        print(f"❌ Error: {e}")
+        return 1
+
+    print(f"✅ {summary['rows']} platos clasificados en {summary['seconds']:.1f} s -> {args.output}")
+    for label, count in sorted(summary['classes'].items(), key=lambda item: -item[1]):
+        print(f"   {label}: {count}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
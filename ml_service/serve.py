@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Modo de servicio de producción para ComidaVentura ML Service
+
+Arranca un pool de workers pre-fork (gunicorn) que comparten el modelo en modo
+copy-on-write: el paquete de modelo se carga una sola vez en el proceso padre
+antes de crear los workers, de modo que todos leen los mismos pesos sin copiarlos
+y el throughput de /predict escala con los núcleos de la máquina.
+
+Uso:
+    python serve.py --workers 4 --bind 0.0.0.0:5000
+
+Requiere gunicorn (Linux/macOS). En Windows usa `python app.py`.
+"""
+
+import argparse
+import gc
+import multiprocessing
+import os
+import sys
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='ComidaVentura ML Service (modo producción, pre-fork)')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(),
+                        help='Número de procesos worker (por defecto: núcleos de CPU)')
+    parser.add_argument('--bind', default='0.0.0.0:5000',
+                        help='Dirección de escucha host:puerto (por defecto: 0.0.0.0:5000)')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='Hilos por worker (por defecto: 1)')
+    parser.add_argument('--timeout', type=int, default=30,
+                        help='Segundos antes de reiniciar un worker bloqueado (por defecto: 30)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # Con varios workers, un hilo de BLAS por proceso evita la sobresuscripción de CPU.
+    # Debe fijarse antes de importar NumPy (lo importa app).
+    if args.workers > 1:
+        for variable in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+            os.environ.setdefault(variable, '1')
+
+    # Un worker sync con un solo hilo atiende las peticiones de una en una: el micro-batching
+    # no tendría nada que agrupar y cada /predict esperaría la ventana entera
+    if args.threads <= 1:
+        os.environ['ML_BATCH_WINDOW_MS'] = '0'
+
+    from gunicorn.app.base import BaseApplication
+    from app import app, nutrition_model
+    from food_catalog import get_default_catalog
+
+    class PreforkApplication(BaseApplication):
+        def __init__(self, application, options):
+            self.application = application
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+    print("🚀 Iniciando ComidaVentura ML Service (modo producción)...")
+    if not nutrition_model.load_models():
+        print("❌ No se encontraron modelos entrenados. Entrena primero con: python nutrition_model.py")
+        sys.exit(1)
+
+    # El catálogo de alimentos también se carga una sola vez y se comparte con los workers
+    try:
+        get_default_catalog()
+    except OSError as e:
+        print(f"⚠️ No se pudo cargar el catálogo de alimentos ({e}); las peticiones con food_ids fallarán")
+
+    # Mover los objetos ya creados a la generación permanente del GC: así los workers
+    # no escriben en sus páginas al recolectar y el modelo sigue compartido tras el fork
+    gc.collect()
+    gc.freeze()
+
+    print(f"✅ Modelo cargado (versión {nutrition_model.model_version}); "
+          f"iniciando {args.workers} workers en {args.bind}")
+
+    PreforkApplication(app, {
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'gthread' if args.threads > 1 else 'sync',
+        'timeout': args.timeout,
+        'preload_app': True
+    }).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Desglose del tiempo de arranque del servicio ML
+
+Usado por `python app.py --profile-startup`. Importa el módulo indicado en un
+intérprete nuevo con `-X importtime` (para medir un arranque en frío real) y
+agrupa el tiempo acumulado por paquete de primer nivel; después mide la carga
+del modelo en el proceso actual.
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+
+def profile_imports(module_name='app', cwd=None):
+    """
+    Mide el tiempo de importación de module_name en un intérprete nuevo
+
+    Returns:
+        tupla (total_segundos, lista de (paquete, segundos) ordenada de mayor a menor)
+    """
+    cwd = cwd or os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module_name}'],
+        cwd=cwd, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"No se pudo importar {module_name}:\n{result.stderr.strip()}")
+
+    per_package = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue  # Encabezado de la tabla
+
+        # Solo las importaciones de primer nivel (sin sangría) para no contar dos veces
+        name = parts[2][1:]
+        if name.startswith(' '):
+            continue
+
+        package = name.split('.')[0]
+        per_package[package] = per_package.get(package, 0) + int(parts[1]) / 1e6
+
+    breakdown = sorted(per_package.items(), key=lambda item: item[1], reverse=True)
+    total = sum(seconds for _, seconds in breakdown)
+    return total, breakdown
+
+
+def print_startup_profile(nutrition_model, module_name='app', top=15):
+    """
+    Imprime el desglose de tiempos de importación y de load_models()
+    """
+    total, breakdown = profile_imports(module_name)
+
+    print(f"⏱️  Importación de '{module_name}' en frío: {total * 1000:.1f} ms")
+    print(f"{'paquete':<30}{'ms':>10}{'%':>8}")
+    for package, seconds in breakdown[:top]:
+        print(f"{package:<30}{seconds * 1000:>10.1f}{100 * seconds / total:>7.1f}%")
+
+    heavy = [name for name in ('tensorflow', 'sklearn', 'imblearn', 'pandas') if name in sys.modules]
+    print(f"📦 Dependencias pesadas importadas en este proceso: {heavy or 'ninguna'}")
+
+    start = time.perf_counter()
+    loaded = nutrition_model.load_models()
+    elapsed = time.perf_counter() - start
+    print(f"⏱️  load_models(): {elapsed * 1000:.1f} ms ({'ok' if loaded else 'sin modelo'})")
+
+    heavy = [name for name in ('tensorflow', 'sklearn', 'imblearn', 'pandas') if name in sys.modules]
+    print(f"📦 Dependencias pesadas tras load_models(): {heavy or 'ninguna'}")
@@ -0,0 +1,72 @@
+"""
+Pruebas de la agregación vectorizada de platos (np.add.reduceat)
+
+Los totales de aggregate_plates deben coincidir con sumar cada plato por
+separado, también cuando hay platos vacíos al principio, en medio o al final
+(reduceat no admite segmentos vacíos, así que esos platos se tratan aparte).
+"""
+
+import numpy as np
+from food_aggregation import DEFAULT_NUTRITION_PER_FOOD, NUTRIENT_ALIASES, NUTRIENT_KEYS, FoodAggregator
+
+
+def sum_plate(plate):
+    """
+    Suma de referencia de un plato, alimento por alimento
+    """
+    totals = np.zeros(len(NUTRIENT_KEYS))
+    for food in plate:
+        for column, key in enumerate(NUTRIENT_KEYS):
+            alias = next((alias for alias in NUTRIENT_ALIASES[key] if alias in food), None)
+            totals[column] += (food[alias] or 0) if alias is not None else 0
+    if not totals.any():
+        totals = DEFAULT_NUTRITION_PER_FOOD * len(plate)
+    return totals
+
+
+CSV_FOOD = {'Calorias': 120, 'Proteinas': 8, 'Carbohidratos': 15, 'Grasas': 3, 'Fibra': 2, 'Azucar': 4}
+FRONT_FOOD = {'calories': 250.5, 'protein': 12, 'carbs': 30, 'fat': 9, 'fiber': 1.5, 'sugar': 10}
+PARTIAL_FOOD = {'calories': 80, 'sugar': None}
+UNKNOWN_FOOD = {'name': 'sin datos'}
+
+
+def test_platos_vacios_en_cualquier_posicion():
+    plates = [[], [CSV_FOOD], [], [], [FRONT_FOOD, CSV_FOOD, PARTIAL_FOOD], [], [PARTIAL_FOOD], []]
+
+    totals = FoodAggregator().aggregate_plates(plates)
+
+    assert totals.shape == (len(plates), len(NUTRIENT_KEYS))
+    np.testing.assert_allclose(totals, [sum_plate(plate) for plate in plates])
+    assert not totals[[0, 2, 3, 5, 7]].any()
+
+
+def test_solo_platos_vacios():
+    totals = FoodAggregator().aggregate_plates([[], [], []])
+
+    np.testing.assert_array_equal(totals, np.zeros((3, len(NUTRIENT_KEYS))))
+
+
+def test_sin_platos():
+    assert FoodAggregator().aggregate_plates([]).shape == (0, len(NUTRIENT_KEYS))
+
+
+def test_platos_sin_datos_usan_la_estimacion_por_alimento():
+    plates = [[UNKNOWN_FOOD, UNKNOWN_FOOD], [], [UNKNOWN_FOOD, CSV_FOOD]]
+
+    totals = FoodAggregator().aggregate_plates(plates)
+
+    np.testing.assert_allclose(totals[0], DEFAULT_NUTRITION_PER_FOOD * 2)
+    np.testing.assert_allclose(totals, [sum_plate(plate) for plate in plates])
+
+
+def test_platos_aleatorios_igual_que_plato_a_plato():
+    rng = np.random.default_rng(0)
+    foods = [CSV_FOOD, FRONT_FOOD, PARTIAL_FOOD, UNKNOWN_FOOD]
+    plates = [[foods[i] for i in rng.integers(0, len(foods), size=size)]
+              for size in rng.integers(0, 6, size=200)]
+    aggregator = FoodAggregator()
+
+    totals = aggregator.aggregate_plates(plates)
+
+    np.testing.assert_allclose(totals, [sum_plate(plate) for plate in plates])
+    np.testing.assert_allclose(totals, [aggregator.aggregate(plate) for plate in plates])
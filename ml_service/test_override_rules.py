@@ -0,0 +1,83 @@
+"""
+Pruebas de override_rules.json frente a la cascada if/elif original
+
+Recorre valores justo por debajo, en y por encima de cada umbral de las reglas
+y comprueba que la tabla compilada da la misma etiqueta y confianza que la
+cascada que había en NutritionModel.predict antes de mover las reglas a JSON.
+"""
+
+import itertools
+import numpy as np
+from nutrition_model import CLASS_LABELS, EXPECTED_FEATURE_COLS
+from override_rules import DEFAULT_RULES_PATH, RuleTable
+
+# Valores alrededor de cada umbral de las reglas
+CALORIAS = [0, 399, 400, 401, 499, 500, 501, 599, 600, 601, 649, 650, 651, 1200]
+GRASAS = [0, 14, 15, 16, 19, 20, 21, 24, 25, 26, 29, 30, 31]
+GRASAS_SAT = [0, 7.9, 8, 8.1]
+PROTEINAS = [0, 4, 5, 6, 9, 10, 11, 19, 20, 21, 29, 30, 31]
+AZUCAR = [0, 39.9, 40, 40.1]
+CONFIANZAS = [0.3, 0.82, 0.95]
+
+
+def cascada_original(calorias, grasas, grasas_sat, proteinas, azucar, predicted_label, confidence):
+    """
+    Cascada de ajuste tal como estaba en NutritionModel.predict (modelo 'neural')
+    """
+    if (calorias > 600 and grasas > 25) or \
+       (calorias > 500 and grasas > 30) or \
+       (grasas > 30 and grasas_sat > 8) or \
+       (azucar > 40 and calorias > 400) or \
+       (calorias > 400 and grasas > 20 and proteinas < 10) or \
+       (grasas > 25 and proteinas < 5):
+        predicted_label = 'Poco Saludable'
+        confidence = max(confidence, 0.85)
+    elif predicted_label == 'Poco Saludable':
+        predicted_label = 'Puede Mejorar'
+    elif proteinas > 30 and grasas < 15 and calorias < 500:
+        predicted_label = 'Excelente'
+        confidence = max(confidence, 0.80)
+    elif proteinas > 20 and grasas < 25 and calorias < 650:
+        if predicted_label == 'Puede Mejorar':
+            predicted_label = 'Bueno'
+    return predicted_label, confidence
+
+
+def barrido():
+    """
+    Matriz de características y salidas del modelo con todas las combinaciones de umbrales
+    """
+    combinaciones = list(itertools.product(CALORIAS, GRASAS, GRASAS_SAT, PROTEINAS, AZUCAR,
+                                           range(len(CLASS_LABELS)), CONFIANZAS))
+    features = np.zeros((len(combinaciones), len(EXPECTED_FEATURE_COLS)), dtype=np.float64)
+    columnas = [EXPECTED_FEATURE_COLS.index(name) for name in
+                ('Total_Calorias', 'Total_Grasas_g', 'Total_Grasas_Sat_g', 'Total_Proteinas_g', 'Total_Azucares_g')]
+    valores = np.array(combinaciones, dtype=np.float64)
+    features[:, columnas] = valores[:, :5]
+    return combinaciones, features, valores[:, 5].astype(int), valores[:, 6]
+
+
+def test_reglas_igual_que_cascada_original():
+    table = RuleTable.load(DEFAULT_RULES_PATH, EXPECTED_FEATURE_COLS, CLASS_LABELS)
+    combinaciones, features, label_indices, confidences = barrido()
+
+    new_labels, new_confidences = table.apply(features, label_indices, confidences)
+
+    for i, (calorias, grasas, grasas_sat, proteinas, azucar, label_index, confidence) in enumerate(combinaciones):
+        esperado = cascada_original(calorias, grasas, grasas_sat, proteinas, azucar,
+                                    CLASS_LABELS[label_index], confidence)
+        obtenido = (CLASS_LABELS[new_labels[i]], float(new_confidences[i]))
+        assert obtenido == esperado, (
+            f"calorias={calorias} grasas={grasas} grasas_sat={grasas_sat} proteinas={proteinas} "
+            f"azucar={azucar} etiqueta={CLASS_LABELS[label_index]} confianza={confidence}"
+        )
+
+
+def test_barrido_activa_todas_las_reglas():
+    table = RuleTable.load(DEFAULT_RULES_PATH, EXPECTED_FEATURE_COLS, CLASS_LABELS)
+    _, features, label_indices, confidences = barrido()
+
+    table.apply(features, label_indices, confidences)
+
+    sin_aciertos = [name for name, hits in table.stats()['hits'].items() if hits == 0]
+    assert not sin_aciertos, f"El barrido no llega a las reglas: {sin_aciertos}"
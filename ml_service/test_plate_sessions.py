@@ -0,0 +1,113 @@
+"""
+Pruebas de las sesiones de plato: puntuación incremental y rollback
+
+Si la clasificación falla al añadir o quitar un alimento, la sesión debe quedar
+exactamente como estaba (alimentos, totales, modelo y última predicción).
+"""
+
+import numpy as np
+import pytest
+from food_aggregation import default_aggregator
+from food_catalog import UnknownFoodError, get_default_catalog
+from plate_sessions import PlateSessionStore
+
+FOOD = {'calories': 180, 'protein': 9, 'carbs': 20, 'fat': 6, 'fiber': 2, 'sugar': 5}
+
+
+@pytest.fixture
+def store(model):
+    return PlateSessionStore(lambda: model)
+
+
+def snapshot(session):
+    return (dict(session.food_counts), session.extra_foods, session.totals.copy(),
+            session.model_type, session.prediction, session.updated_at)
+
+
+def assert_unchanged(session, before):
+    food_counts, extra_foods, totals, model_type, prediction, updated_at = before
+    assert session.food_counts == food_counts
+    assert session.extra_foods == extra_foods
+    np.testing.assert_array_equal(session.totals, totals)
+    assert session.model_type == model_type
+    assert session.prediction == prediction
+    assert session.updated_at == updated_at
+
+
+def test_incremental_igual_que_lista_completa(store, model):
+    food_id = get_default_catalog().food_ids[0]
+    session = store.create()
+
+    store.update(session, food_id=food_id, delta=2)
+    store.update(session, food=FOOD)
+
+    catalog = get_default_catalog()
+    totals = catalog.nutrients[catalog.index[food_id]] * 2 + default_aggregator.aggregate([FOOD])
+    expected = model.predict_totals(totals[np.newaxis])[0]
+    assert session.prediction['classification'] == expected['classification']
+    assert np.isclose(session.prediction['confidence'], expected['confidence'])
+
+
+def test_rollback_si_falla_la_clasificacion(store, model, monkeypatch):
+    food_id = get_default_catalog().food_ids[0]
+    session = store.create()
+    store.update(session, food_id=food_id)
+    before = snapshot(session)
+
+    def failing_predict(features, model_type='neural'):
+        raise ValueError('modelo no disponible')
+
+    monkeypatch.setattr(model, 'predict_features', failing_predict)
+    with pytest.raises(ValueError):
+        store.update(session, food_id=food_id, delta=3)
+    with pytest.raises(ValueError):
+        store.update(session, food=FOOD)
+
+    assert_unchanged(session, before)
+
+
+def test_rollback_si_el_nuevo_modelo_no_esta_disponible(store):
+    session = store.create()
+    store.update(session, food=FOOD)
+    before = snapshot(session)
+
+    # Sin cuantizar, la variante int8 no existe: la sesión sigue con el modelo anterior
+    with pytest.raises(ValueError):
+        store.update(session, food=FOOD, model_type='neural_int8')
+
+    assert_unchanged(session, before)
+
+
+def test_cambios_invalidos_no_tocan_la_sesion(store):
+    food_id = get_default_catalog().food_ids[0]
+    session = store.create()
+    store.update(session, food_id=food_id)
+    before = snapshot(session)
+
+    with pytest.raises(ValueError):
+        store.update(session, food_id=food_id, delta=-2)
+    with pytest.raises(ValueError):
+        store.update(session, food=FOOD, delta=-1)
+    with pytest.raises(ValueError):
+        store.update(session, food=FOOD, model_type='no_existe')
+    with pytest.raises(UnknownFoodError):
+        store.update(session, food_id='no_existe')
+
+    assert_unchanged(session, before)
+
+
+def test_vaciar_el_plato(store):
+    food_id = get_default_catalog().food_ids[0]
+    session = store.create()
+    store.update(session, food_id=food_id, delta=2)
+    store.update(session, food_id=food_id, delta=-2)
+
+    assert session.n_foods == 0
+    assert session.prediction is None
+    assert not session.totals.any()
+
+
+def test_crear_con_modelo_invalido(store):
+    with pytest.raises(ValueError):
+        store.create('no_existe')
+    assert len(store) == 0
@@ -0,0 +1,59 @@
+"""
+Pruebas de la predicción por lotes frente a la predicción de un solo plato
+
+predict_batch y predict_plates pasan todos los platos por un único forward pass;
+cada resultado debe coincidir con el que da predict_dish_health (o
+predict_from_food_list) para ese plato por separado.
+"""
+
+import numpy as np
+from food_aggregation import NUTRIENT_KEYS
+
+MAX_VALUES = np.array([1200, 80, 150, 60, 20, 80], dtype=np.float64)  # en el orden de NUTRIENT_KEYS
+
+
+def random_dishes(n, seed=1):
+    rng = np.random.default_rng(seed)
+    totals = np.round(rng.uniform(0, 1, size=(n, len(NUTRIENT_KEYS))) * MAX_VALUES, 1)
+    return [dict(zip(NUTRIENT_KEYS, row.tolist())) for row in totals]
+
+
+def assert_same_predictions(batch, single):
+    assert len(batch) == len(single)
+    for i, (got, expected) in enumerate(zip(batch, single)):
+        assert got['classification'] == expected['classification'], f"plato {i}"
+        assert got['model_used'] == expected['model_used'], f"plato {i}"
+        assert np.isclose(got['confidence'], expected['confidence'], rtol=1e-5), f"plato {i}"
+
+
+def test_predict_batch_igual_que_un_plato(uncached_model):
+    dishes = random_dishes(300)
+
+    batch = uncached_model.predict_batch(dishes)
+    single = [uncached_model.predict_dish_health(dish) for dish in dishes]
+
+    assert_same_predictions(batch, single)
+    assert 'Error' not in {prediction['classification'] for prediction in batch}
+    assert len({prediction['classification'] for prediction in batch}) > 1  # el barrido no es trivial
+
+
+def test_predict_plates_igual_que_lista_de_alimentos(uncached_model):
+    foods = random_dishes(60, seed=2)
+    plates = [foods[i:i + size] for i, size in zip(range(0, 60, 6), [1, 2, 3, 4, 5, 6, 1, 2, 3, 4])]
+    plates.append([])
+
+    batch = uncached_model.predict_plates(plates)
+    single = [uncached_model.predict_from_food_list(plate) for plate in plates]
+
+    assert_same_predictions(batch, single)
+
+
+def test_predict_batch_con_cache_igual_que_sin_cache(model, uncached_model):
+    dishes = random_dishes(100, seed=3)
+    dishes += dishes[:20]  # platos repetidos: se sirven desde la caché
+
+    assert_same_predictions(model.predict_batch(dishes), uncached_model.predict_batch(dishes))
+
+
+def test_predict_batch_vacio(model):
+    assert model.predict_batch([]) == []
@@ -0,0 +1,79 @@
+"""
+Pruebas de la caché LRU de predicciones
+"""
+
+import numpy as np
+from prediction_cache import PredictionCache
+
+
+def test_acierto_y_fallo():
+    cache = PredictionCache(maxsize=4)
+    key, = cache.make_keys('neural', np.array([[1.0, 2.0]]))
+
+    assert cache.get(key) is None
+    cache.put(key, {'classification': 'Bueno'})
+    assert cache.get(key) == {'classification': 'Bueno'}
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['hit_rate']) == (1, 1, 0.5)
+
+
+def test_get_devuelve_copia():
+    cache = PredictionCache(maxsize=4)
+    key, = cache.make_keys('neural', np.array([[1.0]]))
+    cache.put(key, {'classification': 'Bueno'})
+
+    cache.get(key)['classification'] = 'Excelente'
+    assert cache.get(key) == {'classification': 'Bueno'}
+
+
+def test_expulsa_la_menos_usada():
+    cache = PredictionCache(maxsize=2)
+    a, b, c = cache.make_keys('neural', np.array([[1.0], [2.0], [3.0]]))
+    cache.put(a, {'value': 'a'})
+    cache.put(b, {'value': 'b'})
+    cache.get(a)  # a pasa a ser la más reciente
+    cache.put(c, {'value': 'c'})
+
+    assert cache.get(b) is None
+    assert cache.get(a) == {'value': 'a'}
+    assert cache.get(c) == {'value': 'c'}
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['size'] == 2
+
+
+def test_claves_redondeadas_y_por_modelo():
+    cache = PredictionCache(maxsize=8, precision=2)
+    keys = cache.make_keys('neural', np.array([[1.001, 0.0], [1.0, -0.0], [1.01, 0.0]]))
+    knn_key, = cache.make_keys('knn', np.array([[1.0, 0.0]]))
+
+    assert keys[0] == keys[1]
+    assert keys[0] != keys[2]
+    assert keys[0] != knn_key
+
+
+def test_tamano_cero_desactiva_la_cache():
+    cache = PredictionCache(maxsize=0)
+    key, = cache.make_keys('neural', np.array([[1.0]]))
+    cache.put(key, {'classification': 'Bueno'})
+
+    assert cache.get(key) is None
+    assert cache.stats()['size'] == 0
+
+
+def test_modelo_reutiliza_y_clear_invalida(model):
+    features = model.totals_to_features(np.array([[300, 25, 40, 10, 4, 6], [650, 5, 80, 35, 1, 30]]))
+
+    first = model.predict_features(features)
+    assert model.prediction_cache.stats()['misses'] == 2
+
+    # Si la red cambia sin limpiar la caché, la respuesta sigue saliendo de la caché
+    network = model.neural_network
+    model.neural_network = None
+    assert model.predict_features(features) == first
+    assert model.prediction_cache.stats()['hits'] == 2
+
+    model.neural_network = network
+    model.prediction_cache.clear()
+    assert model.predict_features(features) == first
+    assert model.prediction_cache.stats()['misses'] == 4
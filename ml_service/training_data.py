@@ -0,0 +1,191 @@
+"""
+Lectura por bloques del dataset de entrenamiento (out-of-core)
+
+Para datasets que no caben en memoria (registros de comedores escolares con
+millones de filas), el CSV se recorre por bloques con tipos explícitos
+(características float32, etiqueta categórica) en lugar de cargarlo entero:
+
+  - una primera pasada calcula los mínimos/máximos del MinMaxScaler de forma
+    incremental, el recuento de cada clase (pesos de clase en lugar de SMOTE) y
+    una muestra uniforme de tamaño fijo para KNN y SVM;
+  - la red neuronal se entrena con un generador que vuelve a leer el CSV en cada
+    época, así que la memoria pico depende del tamaño del bloque y no del dataset.
+
+La partición entrenamiento/validación se decide fila a fila con una semilla por
+bloque, de modo que es la misma en todas las pasadas.
+"""
+
+import numpy as np
+
+ID_COL = 'ID_Plato'
+LABEL_COL = 'Clasificacion_Nutricional'
+
+
+def encode_labels(labels, classes):
+    """
+    Índice de cada etiqueta en classes, vectorizado
+
+    Raises:
+        ValueError si alguna etiqueta falta o no está en classes (pandas le daría el
+        código -1, que como índice se entrenaría como la última clase)
+    """
+    import pandas as pd
+
+    codes = pd.Categorical(labels, categories=classes).codes.astype(np.int64)
+    unknown = codes < 0
+    if unknown.any():
+        examples = sorted({str(label) for label in np.asarray(labels, dtype=object)[unknown]})[:5]
+        raise ValueError(f"{int(unknown.sum())} etiquetas fuera de las clases {np.asarray(classes).tolist()}: {examples}")
+    return codes
+
+
+class DatasetStats:
+    """
+    Resultado de la primera pasada sobre el dataset
+    """
+
+    def __init__(self, feature_cols, classes, class_counts, data_min, data_max,
+                 n_rows, n_train, n_validation, sample_X, sample_y):
+        self.feature_cols = feature_cols
+        self.classes = classes            # etiquetas ordenadas (índice = clase codificada)
+        self.class_counts = class_counts  # filas de entrenamiento por clase
+        self.data_min = data_min
+        self.data_max = data_max
+        self.n_rows = n_rows
+        self.n_train = n_train
+        self.n_validation = n_validation
+        self.sample_X = sample_X          # muestra uniforme (sin escalar) para KNN y SVM
+        self.sample_y = sample_y
+
+    def class_weights(self):
+        """
+        Pesos inversamente proporcionales a la frecuencia de cada clase (como class_weight='balanced')
+        """
+        counts = np.maximum(self.class_counts, 1)
+        weights = self.n_train / (len(self.classes) * counts)
+        return {i: float(weight) for i, weight in enumerate(weights)}
+
+
+class ChunkedDataset:
+    """
+    Dataset CSV recorrido por bloques de tamaño fijo
+    """
+
+    def __init__(self, csv_path, chunksize=100000, validation_fraction=0.3,
+                 sample_size=20000, seed=42):
+        """
+        Args:
+            csv_path: dataset con las columnas de características, ID_Plato y Clasificacion_Nutricional
+            chunksize: filas por bloque leído
+            validation_fraction: fracción de filas reservada para validación
+            sample_size: tamaño de la muestra uniforme para KNN y SVM
+            seed: semilla de la partición, el barajado y el muestreo
+        """
+        import pandas as pd
+
+        self.csv_path = csv_path
+        self.chunksize = chunksize
+        self.validation_fraction = validation_fraction
+        self.sample_size = sample_size
+        self.seed = seed
+
+        header = pd.read_csv(csv_path, nrows=0).columns.tolist()
+        if LABEL_COL not in header:
+            raise ValueError(f"El dataset no tiene la columna {LABEL_COL}")
+        self.feature_cols = [col for col in header if col not in (ID_COL, LABEL_COL)]
+
+    def iter_chunks(self):
+        """
+        Recorre el CSV devolviendo (X float32, etiquetas como strings, máscara de validación)
+
+        Las filas sin etiqueta se descartan (no cuentan para el escalado ni para el
+        entrenamiento); la máscara de validación se sortea antes, así que la partición
+        del resto de filas no depende de ellas.
+        """
+        import pandas as pd
+
+        dtypes = {col: np.float32 for col in self.feature_cols}
+        dtypes[LABEL_COL] = 'category'
+        reader = pd.read_csv(self.csv_path, usecols=self.feature_cols + [LABEL_COL],
+                             dtype=dtypes, chunksize=self.chunksize)
+
+        for chunk_index, chunk in enumerate(reader):
+            X = chunk[self.feature_cols].to_numpy(dtype=np.float32)
+            labels = chunk[LABEL_COL]
+            rng = np.random.default_rng((self.seed, chunk_index))
+            validation = rng.random(len(chunk)) < self.validation_fraction
+
+            labeled = labels.notna().to_numpy()
+            if not labeled.all():
+                X, labels, validation = X[labeled], labels[labeled], validation[labeled]
+            yield X, labels, validation
+
+    def scan(self):
+        """
+        Primera pasada: mínimos/máximos, recuento por clase y muestra uniforme para KNN/SVM
+        """
+        data_min = np.full(len(self.feature_cols), np.inf)
+        data_max = np.full(len(self.feature_cols), -np.inf)
+        label_counts = {}
+        n_rows = n_validation = 0
+
+        # Muestreo por prioridad: cada fila recibe una clave aleatoria y se conservan las
+        # sample_size claves más bajas, lo que da una muestra uniforme sin reemplazo
+        rng = np.random.default_rng(self.seed)
+        sample_X = np.empty((0, len(self.feature_cols)), dtype=np.float32)
+        sample_labels = np.empty(0, dtype=object)
+        sample_keys = np.empty(0)
+
+        for X, labels, validation in self.iter_chunks():
+            n_rows += len(X)
+            n_validation += int(validation.sum())
+            if len(X):
+                data_min = np.minimum(data_min, X.min(axis=0))
+                data_max = np.maximum(data_max, X.max(axis=0))
+
+            for label, count in labels[~validation].value_counts().items():
+                label_counts[label] = label_counts.get(label, 0) + int(count)
+
+            sample_X = np.concatenate([sample_X, X])
+            sample_labels = np.concatenate([sample_labels, labels.to_numpy(dtype=object)])
+            sample_keys = np.concatenate([sample_keys, rng.random(len(X))])
+            if len(sample_keys) > self.sample_size:
+                keep = np.argpartition(sample_keys, self.sample_size)[:self.sample_size]
+                sample_X, sample_labels, sample_keys = sample_X[keep], sample_labels[keep], sample_keys[keep]
+
+        if n_rows == 0:
+            raise ValueError("El dataset no tiene filas con etiqueta")
+
+        classes = np.array(sorted(set(label_counts) | set(sample_labels.tolist())))
+        class_counts = np.array([label_counts.get(label, 0) for label in classes], dtype=np.int64)
+        sample_y = encode_labels(sample_labels, classes)
+
+        return DatasetStats(self.feature_cols, classes, class_counts, data_min, data_max,
+                            n_rows, n_rows - n_validation, n_validation,
+                            sample_X.astype(np.float64), sample_y)
+
+    def batches(self, stats, batch_size=32, validation=False, shuffle=True):
+        """
+        Generador de batches (X escalado, y one-hot) en float32 para Keras
+
+        Cada llamada recorre el CSV una vez; el barajado es dentro de cada bloque.
+
+        Raises:
+            ValueError si aparece una etiqueta que no estaba en stats.classes
+            (el CSV cambió después de scan())
+        """
+        data_range = np.where(stats.data_max - stats.data_min == 0, 1.0, stats.data_max - stats.data_min)
+        data_min = stats.data_min.astype(np.float32)
+        data_range = data_range.astype(np.float32)
+        identity = np.eye(len(stats.classes), dtype=np.float32)
+        rng = np.random.default_rng(self.seed + 1)
+
+        for X, labels, validation_mask in self.iter_chunks():
+            mask = validation_mask if validation else ~validation_mask
+            X = (X[mask] - data_min) / data_range
+            y = encode_labels(labels.to_numpy(dtype=object)[mask], stats.classes)
+
+            order = rng.permutation(len(X)) if shuffle else np.arange(len(X))
+            for start in range(0, len(X), batch_size):
+                index = order[start:start + batch_size]
+                yield X[index], identity[y[index]]
@@ -0,0 +1,262 @@
+"""
+Gestor de trabajos de entrenamiento en segundo plano
+
+Cada entrenamiento corre en un proceso aparte (no bloquea el GIL ni los hilos
+que sirven predicciones), identificado por un job id. El proceso hijo informa su
+progreso real (por época de Keras) a través de una cola, puede cancelarse y, al
+terminar, el proceso servidor carga los modelos nuevos en una instancia nueva de
+NutritionModel y la intercambia de forma atómica con la que está sirviendo.
+"""
+
+import atexit
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+import uuid
+from nutrition_model import NutritionModel, TrainingCancelled
+
+# Segundos que se espera a que el proceso hijo atienda una cancelación antes de terminarlo
+CANCEL_GRACE_PERIOD = 10
+
+
+def _run_training_job(csv_path, model_path, progress_queue, cancel_event, chunksize=None):
+    """
+    Punto de entrada del proceso hijo de entrenamiento
+    """
+    # Grupo de procesos propio: el pool de entrenamiento en paralelo y el Manager lo
+    # heredan, así que al cancelar se terminan todos de una vez con os.killpg
+    if hasattr(os, 'setsid'):
+        os.setsid()
+
+    def report(progress, message):
+        progress_queue.put({'status': 'training', 'progress': progress, 'message': message})
+
+    try:
+        model = NutritionModel(model_path=model_path, cache_size=0)
+        success = model.train_all_models(csv_path, progress_callback=report, cancel_event=cancel_event,
+                                         chunksize=chunksize)
+        if success:
+            progress_queue.put({'status': 'trained', 'progress': 98,
+                                'message': 'Cargando modelos entrenados...',
+                                'model_version': model.model_version,
+                                'stage_times': model.training_report})
+        else:
+            progress_queue.put({'status': 'failed', 'progress': 0,
+                                'message': 'Error durante el entrenamiento'})
+    except TrainingCancelled:
+        progress_queue.put({'status': 'cancelled', 'progress': 0, 'message': 'Entrenamiento cancelado'})
+    except Exception as e:
+        progress_queue.put({'status': 'failed', 'progress': 0, 'message': f'Error: {str(e)}'})
+
+
+def _kill_process_group(process, sig=signal.SIGTERM):
+    """
+    Envía sig al proceso de entrenamiento y a todos sus procesos hijos
+    """
+    if hasattr(os, 'killpg'):
+        try:
+            os.killpg(process.pid, sig)
+            return
+        except (ProcessLookupError, PermissionError):
+            pass  # El hijo aún no creó su grupo (o ya terminó): solo queda el proceso
+    if sig == signal.SIGTERM:
+        process.terminate()
+    else:
+        process.kill()
+
+
+class TrainingJob:
+    """
+    Estado de un trabajo de entrenamiento
+    """
+
+    def __init__(self, csv_path, chunksize=None):
+        self.id = uuid.uuid4().hex
+        self.csv_path = csv_path
+        self.chunksize = chunksize
+        self.status = 'queued'
+        self.progress = 0
+        self.message = 'En cola...'
+        self.model_version = None
+        self.stage_times = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.process = None
+        self.cancel_event = None
+
+    @property
+    def active(self):
+        return self.status in ('queued', 'training', 'trained', 'cancelling')
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'model_version': self.model_version,
+            'stage_times': self.stage_times,
+            'chunksize': self.chunksize,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at
+        }
+
+
+class TrainingJobManager:
+    """
+    Lanza, sigue y cancela entrenamientos; un solo entrenamiento activo a la vez
+    """
+
+    def __init__(self, model_factory, on_model_ready, model_path='models/'):
+        """
+        Args:
+            model_factory: función sin argumentos que crea un NutritionModel vacío
+            on_model_ready: función (nutrition_model) que publica el modelo recién cargado
+            model_path: directorio donde el proceso hijo guarda los modelos
+        """
+        self.model_factory = model_factory
+        self.on_model_ready = on_model_ready
+        self.model_path = model_path
+        self._context = multiprocessing.get_context('spawn')  # No heredar hilos ni TensorFlow del servidor
+        self._jobs = {}
+        self._latest = None
+        self._lock = threading.Lock()
+
+        # El proceso de entrenamiento no es daemon (necesita su propio pool de procesos),
+        # así que se termina explícitamente al salir para no bloquear el cierre del servidor
+        atexit.register(self._terminate_active)
+
+    def start(self, csv_path='comidaventura_dataset.csv', chunksize=None):
+        """
+        Inicia un entrenamiento en un proceso nuevo
+
+        Args:
+            csv_path: dataset de entrenamiento
+            chunksize: filas por bloque para entrenar sin cargar el dataset entero (opcional)
+
+        Raises:
+            RuntimeError si ya hay un entrenamiento en curso
+        """
+        with self._lock:
+            if self._latest is not None and self._latest.active:
+                raise RuntimeError('El entrenamiento ya está en progreso')
+
+            job = TrainingJob(csv_path, chunksize)
+            progress_queue = self._context.Queue()
+            job.cancel_event = self._context.Event()
+            job.process = self._context.Process(
+                target=_run_training_job,
+                args=(csv_path, self.model_path, progress_queue, job.cancel_event, chunksize),
+                name=f'training-{job.id[:8]}'
+            )
+            job.status = 'training'
+            job.message = 'Iniciando entrenamiento...'
+            job.process.start()
+
+            self._jobs[job.id] = job
+            self._latest = job
+
+        threading.Thread(target=self._monitor, args=(job, progress_queue),
+                         name=f'training-monitor-{job.id[:8]}', daemon=True).start()
+        return job
+
+    def _terminate_active(self):
+        # Todos los trabajos vivos, no solo el último (un trabajo cancelado puede seguir
+        # terminando mientras ya corre otro)
+        for job in list(self._jobs.values()):
+            if job.process is not None and job.process.is_alive():
+                _kill_process_group(job.process)
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def latest(self):
+        return self._latest
+
+    def is_training(self):
+        return self._latest is not None and self._latest.active
+
+    def cancel(self, job_id):
+        """
+        Pide la cancelación de un trabajo; devuelve False si no existe o ya terminó
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job.status not in ('queued', 'training'):
+            return False
+
+        job.cancel_event.set()
+        job.status = 'cancelling'
+        job.message = 'Cancelando entrenamiento...'
+        return True
+
+    def _monitor(self, job, progress_queue):
+        cancel_requested_at = None
+        final_update = None
+
+        while True:
+            try:
+                update = progress_queue.get(timeout=0.5)
+            except queue.Empty:
+                update = None
+
+            if update is not None:
+                if update['status'] == 'training':
+                    if job.status != 'cancelling':
+                        job.progress = update['progress']
+                        job.message = update['message']
+                else:
+                    final_update = update
+                    break
+            elif not job.process.is_alive():
+                break
+
+            # Si el hijo no atiende la cancelación (p. ej. en medio de SMOTE o SVM), terminarlo
+            if job.cancel_event.is_set():
+                cancel_requested_at = cancel_requested_at or time.time()
+                if time.time() - cancel_requested_at > CANCEL_GRACE_PERIOD:
+                    _kill_process_group(job.process)
+                    final_update = {'status': 'cancelled', 'message': 'Entrenamiento cancelado'}
+                    break
+
+        job.process.join(timeout=CANCEL_GRACE_PERIOD)
+        if job.process.is_alive():
+            _kill_process_group(job.process, signal.SIGKILL)
+            job.process.join()
+
+        if final_update is None:
+            final_update = {'status': 'failed', 'message': 'El proceso de entrenamiento terminó inesperadamente'}
+
+        if final_update['status'] == 'trained':
+            job.progress = final_update['progress']
+            job.message = final_update['message']
+            job.model_version = final_update.get('model_version')
+            job.stage_times = final_update.get('stage_times')
+            self._publish(job)
+        else:
+            job.status = final_update['status']
+            job.progress = 0
+            job.message = final_update['message']
+
+        job.finished_at = time.time()
+
+    def _publish(self, job):
+        """
+        Carga los modelos nuevos en una instancia aparte y la intercambia con la que sirve
+        """
+        try:
+            new_model = self.model_factory()
+            if not new_model.load_models():
+                raise RuntimeError('No se pudieron cargar los modelos entrenados')
+
+            self.on_model_ready(new_model)
+            job.status = 'completed'
+            job.progress = 100
+            job.message = 'Entrenamiento completado exitosamente'
+            job.model_version = new_model.model_version
+        except Exception as e:
+            job.status = 'failed'
+            job.progress = 0
+            job.message = f'Error: {str(e)}'
@@ -1,32 +1,188 @@
 import json
-import pandas as pd
-import matplotlib.pyplot as plt
 import sys
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')  # Solo se generan archivos PNG: sin backend de ventanas
+import matplotlib.pyplot as plt
+
+# Emociones que devuelve face-api, en el orden en que se guardan
+EMOTION_KEYS = ['neutral', 'happy', 'sad', 'angry', 'fearful', 'disgusted', 'surprised']
+
+# Puntos como máximo por emoción en la gráfica; las sesiones más largas se reducen
+DEFAULT_MAX_POINTS = 1000
+DOWNSAMPLING_METHODS = ('lttb', 'minmax')
+
+# Por encima de estos puntos por serie no se dibujan marcadores (solo la línea)
+MARKER_MAX_POINTS = 200
+
+# Valor mínimo al pasar a escala logarítmica (las probabilidades pueden ser 0)
+LOG_FLOOR = 1e-12
+
+
+def emotions_to_array(data):
+    """
+    Convierte la lista de diccionarios de emociones en una matriz (n_mediciones, n_emociones)
+
+    Las columnas son las emociones que aparecen en los datos (primero las de
+    EMOTION_KEYS, en su orden); una emoción que falte en una medición queda como NaN.
+    """
+    present = []
+    for frame in data:
+        for key in frame:
+            if key not in present:
+                present.append(key)
+    columns = [key for key in EMOTION_KEYS if key in present] + [key for key in present if key not in EMOTION_KEYS]
+
+    values = np.array([[frame.get(key, np.nan) for key in columns] for frame in data], dtype=np.float32)
+    return values.reshape(len(data), len(columns)), columns
+
+
+def load_emotions(json_path):
+    # Leer el JSON desde el archivo (una lista de diccionarios)
+    with open(json_path, 'r', encoding='utf-8') as f:
+        return emotions_to_array(json.load(f))
+
+
+def lttb_indices(values, max_points, log_scale=True):
+    """
+    Largest-Triangle-Three-Buckets sobre todas las columnas a la vez
+
+    Conserva el primer y el último punto y, de cada uno de los max_points - 2 buckets
+    intermedios, el punto que forma el triángulo de mayor área con el punto elegido
+    en el bucket anterior y la media del siguiente: se mantienen los picos y la forma
+    de la curva. El recorrido de los buckets es secuencial (cada elección depende de
+    la anterior) pero cada paso está vectorizado sobre las emociones.
+
+    Args:
+        values: matriz (n, n_series)
+        max_points: puntos que se conservan por serie (>= 3)
+        log_scale: calcular las áreas sobre log10(valor), como se ve en la gráfica
+
+    Returns:
+        matriz de índices (max_points, n_series), creciente en cada columna
+    """
+    n, n_series = values.shape
+    y = np.log10(np.clip(values, LOG_FLOOR, None)) if log_scale else values.astype(np.float64)
+    y = np.nan_to_num(y, nan=np.log10(LOG_FLOOR) if log_scale else 0.0)  # Mediciones sin valor
+
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    series = np.arange(n_series)
+    selected = np.empty((max_points, n_series), dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    previous = np.zeros(n_series, dtype=np.int64)
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start, next_end = (edges[bucket + 1], edges[bucket + 2]) if bucket + 2 < len(edges) else (n - 1, n)
+
+        average_x = (next_start + next_end - 1) / 2.0
+        average_y = y[next_start:next_end].mean(axis=0)
+        previous_x = previous.astype(np.float64)
+        previous_y = y[previous, series]
+
+        candidates_x = np.arange(start, end, dtype=np.float64)[:, None]
+        area = np.abs((previous_x - average_x) * (y[start:end] - previous_y)
+                      - (previous_x - candidates_x) * (average_y - previous_y))
+        previous = start + np.argmax(area, axis=0)
+        selected[bucket + 1] = previous
+
+    return selected
+
+
+def minmax_indices(values, max_points):
+    """
+    Mínimo y máximo de cada bucket de todas las columnas a la vez
+
+    Returns:
+        matriz de índices (2 * n_buckets, n_series), creciente en cada columna
+    """
+    n, n_series = values.shape
+    n_buckets = max(1, max_points // 2)
+    bucket_size = -(-n // n_buckets)
+    n_buckets = -(-n // bucket_size)
+
+    # Relleno hasta completar el último bucket; los NaN no ganan ni el mínimo ni el máximo
+    padded = np.full((n_buckets * bucket_size, n_series), np.nan)
+    padded[:n] = values
+    padded = padded.reshape(n_buckets, bucket_size, n_series)
+    lowest = np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1)
+    highest = np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1)
+
+    starts = (np.arange(n_buckets) * bucket_size)[:, None]
+    pairs = np.stack([starts + np.minimum(lowest, highest), starts + np.maximum(lowest, highest)], axis=1)
+    return np.minimum(pairs.reshape(2 * n_buckets, n_series), n - 1)
+
+
+def downsample(values, max_points=DEFAULT_MAX_POINTS, method='lttb'):
+    """
+    Reduce cada serie a como mucho max_points puntos
+
+    Returns:
+        tupla (x, y) de matrices (n_puntos, n_series): índice de medición y valor de cada punto
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n, n_series = values.shape
+
+    if not max_points or n <= max_points or max_points < 3:
+        x = np.broadcast_to(np.arange(n)[:, None], (n, n_series))
+    elif method == 'lttb':
+        x = lttb_indices(values, max_points)
+    elif method == 'minmax':
+        x = minmax_indices(values, max_points)
+    else:
+        raise ValueError(f"Método de reducción desconocido: {method}")
+
+    return x, np.take_along_axis(values, x, axis=0)
+
+
+def draw_expressions(values, columns, output_path, max_points=DEFAULT_MAX_POINTS, method='lttb'):
+    """
+    Grafica la evolución de cada emoción y la guarda en output_path
+
+    Args:
+        values: matriz (n_mediciones, n_emociones)
+        columns: nombre de cada columna de values
+        max_points: puntos como máximo por emoción (None o 0 dibuja todas las mediciones)
+        method: 'lttb' (forma de la curva) o 'minmax' (mínimo y máximo de cada bucket)
+    """
+    values = np.asarray(values).reshape(len(values), len(columns))
+    x, y = downsample(values, max_points, method)
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+    try:
+        # Una sola llamada dibuja todas las emociones (una línea por columna)
+        ax.plot(x, y, marker='o' if len(x) <= MARKER_MAX_POINTS else None, label=list(columns))
+
+        ax.set_title("Evolución de emociones")
+        ax.set_xlabel("Índice de medición")
+        ax.set_ylabel("Probabilidad")
+        ax.set_yscale("log")  # Escala logarítmica para diferenciar valores pequeños
+        ax.legend()
+        ax.grid(True, which="both", linestyle="--", linewidth=0.5)
+        fig.tight_layout()
+        fig.savefig(output_path)
+    finally:
+        # Liberar la figura: el proceso puede seguir vivo generando más gráficas
+        plt.close(fig)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Grafica la evolución de las emociones de una sesión')
+    parser.add_argument('json_path', help='JSON con la lista de mediciones de face-api')
+    parser.add_argument('output_path', help='PNG de salida')
+    parser.add_argument('--max-points', type=int, default=DEFAULT_MAX_POINTS,
+                        help=f'Puntos como máximo por emoción; 0 dibuja todos (por defecto: {DEFAULT_MAX_POINTS})')
+    parser.add_argument('--method', choices=DOWNSAMPLING_METHODS, default='lttb',
+                        help='Reducción de puntos: lttb o minmax (por defecto: lttb)')
+    args = parser.parse_args(argv)
+
+    values, columns = load_emotions(args.json_path)
+    draw_expressions(values, columns, args.output_path, args.max_points, args.method)
+    return 0
+
 
-if len(sys.argv) < 3:
-    print("Uso: python draw_expressions.py <ruta_json> <ruta_salida_png>")
-    sys.exit(1)
-
-json_path = sys.argv[1]
-output_path = sys.argv[2]
-
-# Leer el JSON desde el archivo
-with open(json_path, 'r', encoding='utf-8') as f:
-    data = json.load(f)  # Esto devuelve una lista de diccionarios
-
-# Convertimos la lista en un DataFrame
-df = pd.DataFrame(data)
-
-# Graficamos
-plt.figure(figsize=(10, 6))
-for column in df.columns:
-    plt.plot(df.index, df[column], marker='o', label=column)
-
-plt.title("Evolución de emociones")
-plt.xlabel("Índice de medición")
-plt.ylabel("Probabilidad")
-plt.yscale("log")  # Escala logarítmica para diferenciar valores pequeños
-plt.legend()
-plt.grid(True, which="both", linestyle="--", linewidth=0.5)
-plt.tight_layout()
-plt.savefig(output_path)
+if __name__ == '__main__':
+    sys.exit(main())
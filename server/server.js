@@ -533,8 +533,8 @@ app.post('/api/ml/predict-current', async (req, res) => {
       });
     }
     
-    // Convert current dish foods to ML format with better nutrition mapping
-    const mlFoods = currentDish.foods.map(food => {
+    // Resolve current dish foods against foodMapping to get their full nutrition data
+    const resolvedFoods = currentDish.foods.map(food => {
       console.log('🔍 Processing food from currentDish:', { 
         id: food.id, 
         name: food.name, 
@@ -552,21 +552,36 @@ app.post('/api/ml/predict-current', async (req, res) => {
         hasNutrition: !!fullFoodData.nutrition 
       } : null);
       
-      if (fullFoodData && fullFoodData.nutrition) {
-        console.log('✅ Using fullFoodData with nutrition');
-        return convertFoodToMLFormat(fullFoodData);
-      }
-      
-      // Si no se encuentra, usar los datos disponibles del plato actual
-      console.log('❌ Using food from currentDish (fallback)');
-      return convertFoodToMLFormat(food);
+      return { food, fullFoodData: fullFoodData && fullFoodData.nutrition ? fullFoodData : null };
     });
     
+    let mlPayload;
+    if (resolvedFoods.every(({ fullFoodData }) => fullFoodData)) {
+      // Todos los alimentos están en el catálogo que comparte el ML service (src/data/foods.ts):
+      // basta con enviar sus ids y cantidades en lugar de la información nutricional completa
+      const foodIds = {};
+      resolvedFoods.forEach(({ fullFoodData }) => {
+        foodIds[fullFoodData.id] = (foodIds[fullFoodData.id] || 0) + 1;
+      });
+      console.log('✅ Using catalog food ids:', foodIds);
+      mlPayload = { food_ids: foodIds, model_type };
+    } else {
+      // Convert current dish foods to ML format with better nutrition mapping
+      const mlFoods = resolvedFoods.map(({ food, fullFoodData }) => {
+        if (fullFoodData) {
+          console.log('✅ Using fullFoodData with nutrition');
+          return convertFoodToMLFormat(fullFoodData);
+        }
+        
+        // Si no se encuentra, usar los datos disponibles del plato actual
+        console.log('❌ Using food from currentDish (fallback)');
+        return convertFoodToMLFormat(food);
+      });
+      mlPayload = { foods: mlFoods, model_type };
+    }
+    
     // Call ML service
-    const prediction = await callMLService('/predict', {
-      foods: mlFoods,
-      model_type
-    }, 'POST');
+    const prediction = await callMLService('/predict', mlPayload, 'POST');
     
     res.json({
       ...prediction,